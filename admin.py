@@ -0,0 +1,250 @@
+"""
+Admin dashboard, its JSON feeds (metrics, work queue, map, search), issue
+updates and analytics exports.
+"""
+from datetime import datetime
+
+from flask import (
+    Blueprint, current_app, flash, jsonify, redirect, render_template, request, session, stream_with_context,
+    url_for
+)
+
+import issue_service
+from analytics_export import (
+    EXPORT_FORMATS, EXPORT_TABLES, ExportUnavailable, default_until, parse_watermark, stream_export
+)
+from constants import CHENNAI_AREAS, ISSUE_STATUSES, ISSUE_TYPES
+from extensions import db
+from geo import clusters, issues_near
+from images import allowed_upload
+from issue_service import IssueValidationError
+from metrics import issue_metrics
+from models import Issue
+from pagination import (
+    IssuePage, clamp_page_size, issue_filters_from_args, issue_listing_query, paginate_issues
+)
+from search import search_issues
+from work_queue import next_issues
+
+
+admin = Blueprint('admin', __name__)
+
+
+@admin.route('/admin/dashboard')
+def admin_dashboard():
+    if 'user_id' not in session or session.get('role') != 'admin':
+        flash('Please log in as an admin to access this page.', 'error')
+        return redirect(url_for('auth.login'))
+
+    filters = issue_filters_from_args(request.args)
+    q = (request.args.get('q') or '').strip()
+    limit = clamp_page_size(request.args.get('limit'))
+    if q:
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        results = search_issues(q, filters, limit=limit + 1, offset=offset)
+        page = IssuePage(items=[issue for issue, _ in results[:limit]])
+        next_offset = offset + limit if len(results) > limit else None
+    else:
+        page = paginate_issues(
+            issue_listing_query(filters=filters),
+            cursor=request.args.get('cursor'),
+            limit=limit
+        )
+        next_offset = None
+
+    current_app.extensions['fragment_cache'].prefetch(page.items)
+    metrics = issue_metrics()
+
+    return render_template(
+        'admin_dashboard.html',
+        issues=page.items,
+        page=page,
+        q=q,
+        next_offset=next_offset,
+        filters=filters,
+        areas=CHENNAI_AREAS,
+        issue_types=ISSUE_TYPES,
+        statuses=ISSUE_STATUSES,
+        metrics=metrics,
+        total=metrics['total'],
+        pending=metrics['by_status'].get('Pending', 0),
+        in_progress=metrics['by_status'].get('In Progress', 0),
+        resolved=metrics['by_status'].get('Resolved', 0),
+        queue=next_issues(area=filters.get('area'), limit=5),
+        now=datetime.utcnow()
+    )
+
+
+@admin.route('/admin/metrics.json')
+def admin_metrics():
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify(error='Admin login required.'), 401
+    return jsonify(issue_metrics())
+
+
+@admin.route('/admin/queue.json')
+def admin_queue():
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify(error='Admin login required.'), 401
+    now = datetime.utcnow()
+    issues = next_issues(
+        area=request.args.get('area') or None,
+        limit=clamp_page_size(request.args.get('limit'), default=10)
+    )
+    return jsonify(issues=[
+        {
+            'id': issue.id,
+            'issue_type': issue.issue_type,
+            'area': issue.area,
+            'street': issue.street,
+            'landmark': issue.landmark,
+            'status': issue.current_status,
+            'severity': issue.severity,
+            'priority': issue.priority,
+            'department': issue.department,
+            'created_at': issue.created_at.isoformat() if issue.created_at else None,
+            'sla_due_at': issue.sla_due_at.isoformat() if issue.sla_due_at else None,
+            'sla_breached': issue.sla_due_at is not None and issue.sla_due_at < now
+        }
+        for issue in issues
+    ])
+
+
+@admin.route('/admin/map/clusters.json')
+def admin_map_clusters():
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify(error='Admin login required.'), 401
+    bbox = None
+    if request.args.get('bbox'):
+        try:
+            bbox = tuple(float(value) for value in request.args['bbox'].split(','))
+        except ValueError:
+            bbox = ()
+        if len(bbox) != 4:
+            return jsonify(error='bbox must be west,south,east,north.'), 400
+    zoom = request.args.get('zoom', 12, type=int)
+    return jsonify(
+        zoom=zoom,
+        clusters=clusters(zoom, bbox, open_only=request.args.get('open') == '1')
+    )
+
+
+@admin.route('/admin/map/nearby.json')
+def admin_map_nearby():
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify(error='Admin login required.'), 401
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None:
+        return jsonify(error='lat and lon are required.'), 400
+    results = issues_near(
+        lat, lon,
+        radius_m=request.args.get('radius', 500, type=float),
+        limit=clamp_page_size(request.args.get('limit'), default=50),
+        open_only=request.args.get('all') != '1'
+    )
+    return jsonify(issues=[
+        {
+            'id': issue.id,
+            'issue_type': issue.issue_type,
+            'area': issue.area,
+            'street': issue.street,
+            'status': issue.current_status,
+            'lat': issue.latitude,
+            'lon': issue.longitude,
+            'distance_m': round(distance, 1)
+        }
+        for issue, distance in results
+    ])
+
+
+@admin.route('/admin/search.json')
+def admin_search():
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify(error='Admin login required.'), 401
+    results = search_issues(
+        request.args.get('q', ''),
+        issue_filters_from_args(request.args),
+        limit=clamp_page_size(request.args.get('limit')),
+        offset=max(request.args.get('offset', 0, type=int), 0)
+    )
+    return jsonify(results=[
+        {
+            'id': issue.id,
+            'issue_type': issue.issue_type,
+            'area': issue.area,
+            'street': issue.street,
+            'landmark': issue.landmark,
+            'status': issue.current_status,
+            'description': issue.description,
+            'created_at': issue.created_at.isoformat() if issue.created_at else None,
+            'score': rank
+        }
+        for issue, rank in results
+    ])
+
+
+@admin.route('/admin/exports/<table>')
+def export_analytics(table):
+    """Stream one table as CSV or Parquet: ?format=csv|parquet&since=<watermark of the previous export>."""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify(error='Admin login required.'), 401
+    fmt = request.args.get('format', 'csv')
+    if table not in EXPORT_TABLES or fmt not in EXPORT_FORMATS:
+        return jsonify(error=f"Tables: {', '.join(EXPORT_TABLES)}; formats: {', '.join(EXPORT_FORMATS)}."), 404
+    try:
+        since = parse_watermark(request.args.get('since'))
+    except ValueError:
+        return jsonify(error='since must be an ISO-8601 timestamp.'), 400
+    until = default_until()
+    try:
+        body = stream_export(table, fmt, since=since, until=until)
+    except ExportUnavailable as exc:
+        return jsonify(error=str(exc)), 501
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/vnd.apache.parquet'
+    response = current_app.response_class(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={table}_{until:%Y%m%d_%H%M%S}.{fmt}'
+    # Pass back as ?since= to fetch only what changed after this export
+    response.headers['X-Export-Watermark'] = until.isoformat()
+    return response
+
+
+@admin.route('/admin/issue/<int:issue_id>/update', methods=['POST'])
+def update_issue(issue_id):
+    issue = db.get_or_404(Issue, issue_id)
+    try:
+        issue_service.update_issue(
+            issue,
+            status=request.form.get('status'),
+            remarks=request.form.get('remarks'),
+            duplicate_of=request.form.get('duplicate_of'),
+            image=allowed_upload(request.files.get('after_image'))
+        )
+    except IssueValidationError as exc:
+        flash(str(exc), 'error')
+        return redirect(url_for('admin.admin_dashboard'))
+
+    flash('Issue updated successfully.', 'success')
+    return redirect(url_for('admin.admin_dashboard'))
+
+
+@admin.route('/admin/issues/bulk-update', methods=['POST'])
+def bulk_update_issues():
+    if 'user_id' not in session or session.get('role') != 'admin':
+        flash('Please log in as an admin to access this page.', 'error')
+        return redirect(url_for('auth.login'))
+
+    # The filter fields are the dashboard's own (including 'status'), so the new status is 'new_status'
+    filters = issue_filters_from_args(request.form)
+    try:
+        updated = issue_service.bulk_update_issues(
+            filters=filters,
+            status=request.form.get('new_status'),
+            remarks=(request.form.get('remarks') or '').strip()
+        )
+    except IssueValidationError as exc:
+        flash(str(exc), 'error')
+    else:
+        flash(f'Updated {updated} issue{"" if updated == 1 else "s"}.', 'success')
+    return redirect(url_for('admin.admin_dashboard', **filters))
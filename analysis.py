@@ -0,0 +1,329 @@
+import logging
+import pickle
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from constants import ISSUE_DEPARTMENTS, PRIORITY_LEVELS, SEVERITY_LEVELS
+from extensions import db
+from models import Issue
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEVERITY = 'Moderate'
+DEFAULT_PRIORITY = 'Medium'
+DEFAULT_DEPARTMENT = 'General Administration'
+
+RESCORE_BATCH_SIZE = 500
+
+_SPACE_RE = re.compile(r'\s+')
+
+
+@dataclass
+class Finding:
+    """What one analyzer concluded about one issue; unset fields express no opinion."""
+    severity: Optional[str] = None
+    priority: Optional[str] = None
+    department: Optional[str] = None
+    notes: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Analysis:
+    """Combined result of all registered analyzers for one issue."""
+    issue_type: str
+    severity: str = DEFAULT_SEVERITY
+    priority: str = DEFAULT_PRIORITY
+    department: str = DEFAULT_DEPARTMENT
+    notes: List[str] = field(default_factory=list)
+
+    def merge(self, finding: Finding):
+        # Levels only escalate: the most severe opinion of any analyzer wins
+        if finding.severity and _rank(SEVERITY_LEVELS, finding.severity) > _rank(SEVERITY_LEVELS, self.severity):
+            self.severity = finding.severity
+        if finding.priority and _rank(PRIORITY_LEVELS, finding.priority) > _rank(PRIORITY_LEVELS, self.priority):
+            self.priority = finding.priority
+        if finding.department:
+            self.department = finding.department
+        for note in finding.notes:
+            if note not in self.notes:
+                self.notes.append(note)
+
+    def summary(self) -> str:
+        """The human-readable text stored in Issue.ai_summary."""
+        notes = '; '.join(self.notes) or (
+            'Location and citizen description indicate that field inspection '
+            'by the respective civic department is recommended'
+        )
+        return (
+            f"Automated analysis for issue type '{self.issue_type}':\n"
+            f"- Estimated severity: {self.severity}\n"
+            f"- Suggested resolution priority: {self.priority}\n"
+            f"- Responsible department: {self.department}\n"
+            f"- Notes: {notes}."
+        )
+
+    def columns(self) -> dict:
+        """Issue column values for this analysis."""
+        return {
+            'severity': self.severity,
+            'priority': self.priority,
+            'department': self.department,
+            'ai_summary': self.summary(),
+        }
+
+
+def _rank(levels: Sequence[str], value: str) -> int:
+    try:
+        return levels.index(value)
+    except ValueError:
+        return -1
+
+
+def normalize_text(text: Optional[str]) -> str:
+    return _SPACE_RE.sub(' ', (text or '').lower()).strip()
+
+
+class KeywordAutomaton:
+    """
+    Aho–Corasick automaton over a set of phrases: one pass over the text
+    finds every occurrence of every phrase, however many rules there are.
+    Matches must start at a word boundary, so 'flood' also matches
+    'flooding' but not 'bloodflood'.
+    """
+
+    def __init__(self, phrases: Dict[str, object]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[tuple]] = [[]]
+
+        for phrase, payload in phrases.items():
+            phrase = normalize_text(phrase)
+            node = 0
+            for char in phrase:
+                nxt = self._goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append((len(phrase), payload))
+
+        # Breadth-first failure links; each node inherits the outputs of its fallback
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0) if node else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text: str) -> List[object]:
+        """Payloads of all phrases found in the (normalised) text, in order of occurrence."""
+        found = []
+        node = 0
+        for end, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length, payload in self._out[node]:
+                start = end - length + 1
+                if start == 0 or not text[start - 1].isalnum():
+                    found.append(payload)
+        return found
+
+
+@dataclass(frozen=True)
+class KeywordRule:
+    phrases: tuple
+    severity: Optional[str] = None
+    priority: Optional[str] = None
+    department: Optional[str] = None
+    note: Optional[str] = None
+
+
+KEYWORD_RULES = [
+    KeywordRule(('urgent', 'immediately', 'emergency', 'asap', 'dangerous', 'danger'),
+                severity='High', priority='High', note='Citizen reports the issue as urgent'),
+    KeywordRule(('accident', 'injured', 'injury', 'fell down', 'collapse'),
+                severity='High', priority='High', note='Risk of injury reported'),
+    KeywordRule(('live wire', 'electrocut', 'electric shock', 'sparking', 'exposed wire'),
+                severity='High', priority='High', department='Electrical',
+                note='Electrical hazard reported'),
+    KeywordRule(('school', 'hospital', 'college', 'clinic', 'bus stand', 'railway station'),
+                priority='High', note='Near a school, hospital or transport hub'),
+    KeywordRule(('children', 'elderly', 'senior citizen', 'disabled', 'wheelchair'),
+                priority='High', note='Affects vulnerable residents'),
+    KeywordRule(('sewage', 'overflow', 'stagnant', 'mosquito', 'contaminated', 'dengue'),
+                severity='High', note='Public health risk'),
+    KeywordRule(('flood', 'waterlogg', 'water logg', 'inundat'),
+                severity='High', department='Storm Water Drains', note='Flooding reported'),
+    KeywordRule(('no water', 'drinking water', 'pipeline', 'pipe burst', 'leakage'),
+                department='Water Supply & Sewerage'),
+    KeywordRule(('fallen tree', 'tree fell', 'uprooted', 'tree branch'),
+                department='Parks & Gardens'),
+]
+
+
+class KeywordAnalyzer:
+    """
+    Department from the issue type, escalations from keyword rules matched
+    over the description and landmark in one automaton pass.
+    """
+    name = 'keywords'
+
+    def __init__(self, rules: Iterable[KeywordRule] = KEYWORD_RULES):
+        phrases = {}
+        for rule in rules:
+            for phrase in rule.phrases:
+                phrases[phrase] = rule
+        self.automaton = KeywordAutomaton(phrases)
+
+    def analyze_batch(self, items: Sequence) -> List[Finding]:
+        findings = []
+        for item in items:
+            finding = Finding(department=ISSUE_DEPARTMENTS.get(item.issue_type))
+            text = normalize_text(f"{item.description or ''} {getattr(item, 'landmark', None) or ''}")
+            for rule in dict.fromkeys(self.automaton.find(text)):
+                finding.severity = _max_level(SEVERITY_LEVELS, finding.severity, rule.severity)
+                finding.priority = _max_level(PRIORITY_LEVELS, finding.priority, rule.priority)
+                finding.department = rule.department or finding.department
+                if rule.note:
+                    finding.notes.append(rule.note)
+            findings.append(finding)
+        return findings
+
+
+def _max_level(levels: Sequence[str], current: Optional[str], new: Optional[str]) -> Optional[str]:
+    if new is None:
+        return current
+    if current is None:
+        return new
+    return new if _rank(levels, new) > _rank(levels, current) else current
+
+
+class ClassifierAnalyzer:
+    """
+    Local scikit-learn style text classifiers, loaded once from a joblib or
+    pickle file holding {'severity': model, 'priority': model, 'department':
+    model} (any subset). Each model takes raw text, e.g. a Pipeline of
+    TfidfVectorizer + LogisticRegression, and is called once per batch.
+    Predictions below min_confidence are ignored.
+    """
+    name = 'classifier'
+
+    def __init__(self, models: dict, min_confidence: float = 0.6):
+        self.models = {target: model for target, model in models.items()
+                       if target in ('severity', 'priority', 'department')}
+        self.min_confidence = min_confidence
+
+    @classmethod
+    def load(cls, path: str, min_confidence: float = 0.6) -> 'ClassifierAnalyzer':
+        try:
+            import joblib  # optional, ships with scikit-learn
+            models = joblib.load(path)
+        except ImportError:
+            with open(path, 'rb') as fh:
+                models = pickle.load(fh)
+        return cls(models, min_confidence)
+
+    @staticmethod
+    def _text(item) -> str:
+        return f"{item.issue_type}. {item.description or ''}"
+
+    def _predict(self, model, texts: List[str]) -> List[Optional[str]]:
+        if hasattr(model, 'predict_proba'):
+            labels = list(model.classes_)
+            predictions = []
+            for probabilities in model.predict_proba(texts):
+                best = max(range(len(labels)), key=lambda i: probabilities[i])
+                predictions.append(str(labels[best]) if probabilities[best] >= self.min_confidence else None)
+            return predictions
+        return [str(label) for label in model.predict(texts)]
+
+    def analyze_batch(self, items: Sequence) -> List[Finding]:
+        texts = [self._text(item) for item in items]
+        findings = [Finding() for _ in items]
+        for target, model in self.models.items():
+            for finding, label in zip(findings, self._predict(model, texts)):
+                setattr(finding, target, label)
+        return findings
+
+
+class AnalysisEngine:
+    """Runs every registered analyzer over a batch of issues and merges their findings in order."""
+
+    def __init__(self):
+        self.analyzers = []
+
+    def register(self, analyzer):
+        self.analyzers = [a for a in self.analyzers if a.name != analyzer.name] + [analyzer]
+        return analyzer
+
+    def analyze_batch(self, items: Sequence) -> List[Analysis]:
+        """items need issue_type, description and optionally landmark (Issue rows, query rows, namespaces)."""
+        results = [Analysis(issue_type=item.issue_type) for item in items]
+        for analyzer in self.analyzers:
+            for result, finding in zip(results, analyzer.analyze_batch(items)):
+                result.merge(finding)
+        return results
+
+    def analyze(self, issue_type: str, description: str, landmark: Optional[str] = None) -> Analysis:
+        return self.analyze_batch([_Item(issue_type, description, landmark)])[0]
+
+
+@dataclass
+class _Item:
+    issue_type: str
+    description: str
+    landmark: Optional[str] = None
+
+
+def init_analysis(app) -> AnalysisEngine:
+    """Build the engine: keyword rules always, plus the classifier if ANALYSIS_MODEL_PATH is set."""
+    engine = AnalysisEngine()
+    engine.register(KeywordAnalyzer())
+    model_path = app.config.get('ANALYSIS_MODEL_PATH')
+    if model_path:
+        try:
+            engine.register(ClassifierAnalyzer.load(
+                model_path, app.config.get('ANALYSIS_MIN_CONFIDENCE', 0.6)
+            ))
+        except Exception:  # noqa: BLE001 - keyword analysis still works without the model
+            logger.exception("Could not load analysis model from %s", model_path)
+    app.extensions['analysis'] = engine
+    return engine
+
+
+def rescore_issues(engine: AnalysisEngine, batch_size: int = RESCORE_BATCH_SIZE) -> int:
+    """
+    Re-run the analysis over the whole Issue table in id-ordered batches,
+    one analyzer call and one executemany UPDATE per batch. Returns the
+    number of issues rescored.
+    """
+    rescored = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.session.query(Issue.id, Issue.issue_type, Issue.description, Issue.landmark)
+            .filter(Issue.id > last_id)
+            .order_by(Issue.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return rescored
+        db.session.bulk_update_mappings(Issue, [
+            {'id': row.id, **analysis.columns()}
+            for row, analysis in zip(rows, engine.analyze_batch(rows))
+        ])
+        db.session.commit()
+        rescored += len(rows)
+        last_id = rows[-1].id
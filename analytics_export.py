@@ -0,0 +1,180 @@
+"""
+Streaming table exports for the data team (CSV or Parquet).
+
+Rows are read through a server-side cursor in chunks (yield_per) and
+written out chunk by chunk, so memory stays flat however large the
+tables are. Exports can be incremental: only rows whose watermark column
+(Issue.updated_at; created_at for the append-only status logs and
+feedback) lies after `since`, up to a fixed `until` that the next run
+passes back as its `since`. Each table's archived rows (see archive.py)
+follow its hot rows, so full exports still cover every issue.
+"""
+import csv
+import io
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, or_, select
+
+from extensions import db
+from models import ArchivedFeedback, ArchivedIssue, ArchivedIssueStatusLog, Feedback, Issue, IssueStatusLog
+
+
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_FORMATS = ('csv', 'parquet')
+# Timestamps are set before commit, so rows stamped just before `until` may not be
+# visible yet; exporting up to a minute ago keeps them for the next run instead of losing them
+WATERMARK_LAG = timedelta(minutes=1)
+
+
+@dataclass(frozen=True)
+class ExportTable:
+    model: type
+    watermark: str
+    archive: type
+    exclude: tuple = ()
+
+    @property
+    def columns(self) -> list:
+        return [column for column in self.model.__table__.columns if column.name not in self.exclude]
+
+    @property
+    def archive_columns(self) -> list:
+        """The same columns, in the same order, from the archive table."""
+        return [self.archive.__table__.c[column.name] for column in self.columns]
+
+
+EXPORT_TABLES = {
+    # dedup_signature is a binary MinHash, of no use outside the app
+    'issues': ExportTable(Issue, 'updated_at', ArchivedIssue, exclude=('dedup_signature',)),
+    'status_logs': ExportTable(IssueStatusLog, 'created_at', ArchivedIssueStatusLog),
+    'feedback': ExportTable(Feedback, 'created_at', ArchivedFeedback),
+}
+
+
+class ExportUnavailable(RuntimeError):
+    """The requested format needs an optional dependency that is not installed."""
+
+
+def default_until() -> datetime:
+    return datetime.utcnow() - WATERMARK_LAG
+
+
+def parse_watermark(value: Optional[str]) -> Optional[datetime]:
+    """An ISO-8601 watermark (as printed by a previous export); raises ValueError if malformed."""
+    return datetime.fromisoformat(value) if value else None
+
+
+def iter_chunks(name: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """
+    Rows of one table with since < watermark <= until, in watermark order
+    (hot rows, then archived rows), as lists of up to chunk_size tuples from
+    a server-side cursor. Served by the (watermark, id) indexes.
+    """
+    table = EXPORT_TABLES[name]
+    for model, columns in ((table.model, table.columns), (table.archive, table.archive_columns)):
+        watermark = getattr(model, table.watermark)
+        query = select(*columns).order_by(watermark, model.id)
+        if since:
+            query = query.where(watermark > since)
+        if until:
+            # A full export also takes rows that were never stamped
+            query = query.where(watermark <= until if since else or_(watermark <= until, watermark.is_(None)))
+        result = db.session.execute(query.execution_options(yield_per=chunk_size))
+        try:
+            for partition in result.partitions():
+                yield [tuple(row) for row in partition]
+        finally:
+            result.close()
+
+
+def stream_csv(name: str, chunks: Iterator[List[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.name for column in EXPORT_TABLES[name].columns])
+    for rows in chunks:
+        writer.writerows(
+            [value.isoformat() if isinstance(value, datetime) else value for value in row] for row in rows
+        )
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        super().__init__()
+        self._pending = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._pending.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._pending)
+        self._pending = []
+        return data
+
+
+def _arrow_type(pa, column):
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp('us')
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    return pa.string()
+
+
+def stream_parquet(name: str, chunks: Iterator[List[tuple]]) -> Iterator[bytes]:
+    """One Parquet row group per chunk, sent as soon as it is written (requires pyarrow)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise ExportUnavailable('Parquet export requires pyarrow (pip install pyarrow).') from exc
+
+    columns = EXPORT_TABLES[name].columns
+    schema = pa.schema([(column.name, _arrow_type(pa, column)) for column in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    try:
+        for rows in chunks:
+            writer.write_table(pa.Table.from_pydict(
+                {column.name: [row[i] for row in rows] for i, column in enumerate(columns)}, schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream_export(name: str, fmt: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                  chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """The encoded export of one table. For Parquet the dependency is checked before any row is read."""
+    if name not in EXPORT_TABLES or fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export {name}.{fmt}")
+    if fmt == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as exc:
+            raise ExportUnavailable('Parquet export requires pyarrow (pip install pyarrow).') from exc
+    encode = stream_csv if fmt == 'csv' else stream_parquet
+    return encode(name, iter_chunks(name, since, until, chunk_size))
@@ -0,0 +1,356 @@
+"""
+Versioned JSON API (/api/v1) for the mobile app and ward-office kiosks.
+
+Reads support keyset cursors, `fields=` sparse fieldsets and conditional
+GETs (ETag / Last-Modified from Issue.updated_at, so an unchanged issue
+costs one primary-key lookup and a 304). Single-issue reads fall back to
+the archive for resolved issues that have been archived (see archive.py);
+listings cover the hot issues. Writes go through issue_service, the same
+code path as the HTML forms. In ASGI mode, asgi.py serves the issue reads
+and creation with async views built on the helpers here.
+"""
+import hashlib
+import io
+import json
+from datetime import datetime, timezone
+
+from flask import Blueprint, current_app, request, session, url_for
+
+import issue_service
+from extensions import db
+from importer import IMPORT_FORMATS, import_issues
+from issue_service import IssueValidationError
+from models import (
+    ArchivedFeedback, ArchivedIssue, ArchivedIssueStatusLog, Feedback, Issue, IssueStatusLog, User
+)
+from pagination import apply_issue_filters, clamp_page_size, issue_filters_from_args, paginate_issues
+
+try:
+    import orjson  # optional, several times faster than json for large pages
+except ImportError:
+    orjson = None
+
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def _timestamp(value):
+    return value.isoformat() if value else None
+
+
+def _image_url(key):
+    return current_app.extensions['storage'].url(key) if key else None
+
+
+ISSUE_FIELDS = {
+    'id': lambda issue: issue.id,
+    'issue_type': lambda issue: issue.issue_type,
+    'description': lambda issue: issue.description,
+    'area': lambda issue: issue.area,
+    'street': lambda issue: issue.street,
+    'landmark': lambda issue: issue.landmark,
+    'latitude': lambda issue: issue.latitude,
+    'longitude': lambda issue: issue.longitude,
+    'status': lambda issue: issue.current_status,
+    'severity': lambda issue: issue.severity,
+    'priority': lambda issue: issue.priority,
+    'department': lambda issue: issue.department,
+    'ai_summary': lambda issue: issue.ai_summary,
+    'authority_remarks': lambda issue: issue.authority_remarks,
+    'duplicate_of_id': lambda issue: issue.duplicate_of_id,
+    'sla_due_at': lambda issue: _timestamp(issue.sla_due_at),
+    'sla_breached': lambda issue: issue.sla_breached_at is not None,
+    'before_image_url': lambda issue: _image_url(issue.before_image),
+    'after_image_url': lambda issue: _image_url(issue.after_image),
+    'created_at': lambda issue: _timestamp(issue.created_at),
+    'updated_at': lambda issue: _timestamp(issue.updated_at),
+}
+
+
+def status_log_json(log):
+    return {'status': log.status, 'remarks': log.remarks, 'created_at': _timestamp(log.created_at)}
+
+
+def feedback_json(feedback):
+    return {
+        'id': feedback.id,
+        'rating': feedback.rating,
+        'comments': feedback.comments,
+        'created_at': _timestamp(feedback.created_at),
+    }
+
+
+class APIError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def encode_json(payload):
+    return orjson.dumps(payload) if orjson else json.dumps(payload, separators=(',', ':'))
+
+
+def _json_response(payload, status=200):
+    return current_app.response_class(encode_json(payload), status=status, mimetype='application/json')
+
+
+@api.errorhandler(APIError)
+def _api_error(error):
+    return _json_response({'error': str(error)}, error.status)
+
+
+@api.errorhandler(IssueValidationError)
+def _validation_error(error):
+    return _json_response({'error': str(error)}, 422)
+
+
+@api.errorhandler(404)
+def _not_found(error):
+    return _json_response({'error': 'Not found.'}, 404)
+
+
+@api.errorhandler(413)
+def _too_large(error):
+    return _json_response({'error': 'Uploaded file is too large (maximum 16 MB).'}, 413)
+
+
+@api.errorhandler(429)
+def _too_many_requests(error):
+    response = _json_response({'error': error.description}, 429)
+    if error.retry_after is not None:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+@api.before_request
+def _require_login():
+    if 'user_id' not in session:
+        raise APIError('Login required.', 401)
+
+
+def _require_admin():
+    if session.get('role') != 'admin':
+        raise APIError('Admin login required.', 403)
+
+
+def _selected_fields():
+    return parse_fields(request.args.get('fields'))
+
+
+def parse_fields(requested):
+    """Field names requested with ?fields=a,b,c (all fields by default)."""
+    if not requested:
+        return list(ISSUE_FIELDS)
+    fields = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in ISSUE_FIELDS]
+    if unknown:
+        raise APIError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(ISSUE_FIELDS)}.")
+    return fields
+
+
+def issue_json(issue, fields):
+    return {name: ISSUE_FIELDS[name](issue) for name in fields}
+
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:20]
+
+
+def _conditional(etag, last_modified=None):
+    """A 304 response when the client's copy is current, else None."""
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    else:
+        fresh = bool(
+            last_modified and request.if_modified_since
+            and last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= request.if_modified_since
+        )
+    if not fresh:
+        return None
+    response = current_app.response_class(status=304)
+    return _with_validators(response, etag, last_modified)
+
+
+def _with_validators(response, etag, last_modified=None):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # Revalidate every time, but let clients and proxies keep the copy
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _issue_version(issue_id):
+    """
+    (updated_at, archived) by primary key, without loading the row; 404 if
+    the issue exists neither in the hot tables nor in the archive.
+    """
+    row = db.session.query(Issue.updated_at).filter(Issue.id == issue_id).first()
+    if row is not None:
+        return row.updated_at or datetime.min, False
+    row = db.session.query(ArchivedIssue.updated_at).filter(ArchivedIssue.id == issue_id).first()
+    if row is None:
+        raise APIError('Not found.', 404)
+    return row.updated_at or datetime.min, True
+
+
+def _hot_issue(issue_id):
+    """An issue that can still be written to; archived issues are read-only."""
+    issue = db.session.get(Issue, issue_id)
+    if issue is None:
+        if db.session.get(ArchivedIssue, issue_id) is not None:
+            raise APIError('Archived issues are read-only.', 409)
+        raise APIError('Not found.', 404)
+    return issue
+
+
+def _payload():
+    """Request data from a JSON body, or from form fields for multipart uploads."""
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            raise APIError('Request body must be a JSON object.')
+        return data
+    return request.form
+
+
+@api.route('/issues')
+def list_issues():
+    """Newest first; ?cursor= from the previous page's next_cursor, ?limit=, and the dashboard filters."""
+    fields = _selected_fields()
+    filters = issue_filters_from_args(request.args)
+    page = paginate_issues(
+        apply_issue_filters(Issue.query, filters),
+        cursor=request.args.get('cursor'),
+        limit=clamp_page_size(request.args.get('limit'))
+    )
+    etag = make_etag('issues', fields, page.next_cursor, [(issue.id, issue.updated_at) for issue in page.items])
+    not_modified = _conditional(etag)
+    if not_modified:
+        return not_modified
+
+    payload = {
+        'data': [issue_json(issue, fields) for issue in page.items],
+        'next_cursor': page.next_cursor,
+        'next': url_for(
+            'api.list_issues', cursor=page.next_cursor, limit=request.args.get('limit'),
+            fields=request.args.get('fields'), **filters
+        ) if page.has_more else None,
+    }
+    return _with_validators(_json_response(payload), etag)
+
+
+@api.route('/issues', methods=['POST'])
+def create_issue():
+    data = _payload()
+    issue = issue_service.report_issue(
+        db.session.get(User, session['user_id']),
+        issue_type=data.get('issue_type'),
+        description=data.get('description'),
+        area=data.get('area'),
+        street=data.get('street'),
+        landmark=data.get('landmark'),
+        latitude=data.get('latitude'),
+        longitude=data.get('longitude'),
+        name=data.get('name'),
+        email=data.get('email'),
+        phone=data.get('phone'),
+        image=request.files.get('before_image')
+    )
+    response = _json_response(issue_json(issue, list(ISSUE_FIELDS)), 201)
+    response.headers['Location'] = url_for('api.get_issue', issue_id=issue.id)
+    return _with_validators(response, make_etag('issue', issue.id, issue.updated_at, list(ISSUE_FIELDS)),
+                            issue.updated_at)
+
+
+@api.route('/issues/<int:issue_id>')
+def get_issue(issue_id):
+    fields = _selected_fields()
+    updated_at, archived = _issue_version(issue_id)
+    etag = make_etag('issue', issue_id, updated_at, fields)
+    not_modified = _conditional(etag, updated_at)
+    if not_modified:
+        return not_modified
+    issue = db.session.get(ArchivedIssue if archived else Issue, issue_id)
+    return _with_validators(_json_response(issue_json(issue, fields)), etag, updated_at)
+
+
+@api.route('/issues/<int:issue_id>', methods=['PATCH'])
+def update_issue(issue_id):
+    _require_admin()
+    issue = _hot_issue(issue_id)
+    data = _payload()
+    duplicate_of = data.get('duplicate_of') if 'duplicate_of' in data else None
+    issue_service.update_issue(
+        issue,
+        status=data.get('status'),
+        remarks=data.get('remarks'),
+        # JSON null unlinks, like an empty form field
+        duplicate_of='' if 'duplicate_of' in data and duplicate_of is None else duplicate_of,
+        image=request.files.get('after_image')
+    )
+    fields = list(ISSUE_FIELDS)
+    return _with_validators(_json_response(issue_json(issue, fields)),
+                            make_etag('issue', issue.id, issue.updated_at, fields), issue.updated_at)
+
+
+@api.route('/issues/<int:issue_id>/status-logs')
+def list_status_logs(issue_id):
+    updated_at, archived = _issue_version(issue_id)
+    etag = make_etag('status-logs', issue_id, updated_at)
+    not_modified = _conditional(etag, updated_at)
+    if not_modified:
+        return not_modified
+    model = ArchivedIssueStatusLog if archived else IssueStatusLog
+    logs = model.query.filter_by(issue_id=issue_id).order_by(model.id)
+    return _with_validators(_json_response({'data': [status_log_json(log) for log in logs]}), etag, updated_at)
+
+
+@api.route('/issues/<int:issue_id>/feedback')
+def list_feedback(issue_id):
+    updated_at, archived = _issue_version(issue_id)
+    etag = make_etag('feedback', issue_id, updated_at)
+    not_modified = _conditional(etag, updated_at)
+    if not_modified:
+        return not_modified
+    model = ArchivedFeedback if archived else Feedback
+    feedbacks = model.query.filter_by(issue_id=issue_id).order_by(model.id)
+    return _with_validators(_json_response({'data': [feedback_json(f) for f in feedbacks]}), etag, updated_at)
+
+
+@api.route('/issues/<int:issue_id>/feedback', methods=['POST'])
+def create_feedback(issue_id):
+    issue = _hot_issue(issue_id)
+    data = _payload()
+    feedback = issue_service.add_feedback(issue, rating=data.get('rating'), comments=data.get('comments'))
+    return _json_response(feedback_json(feedback), 201)
+
+
+@api.route('/issues/bulk-update', methods=['POST'])
+def bulk_update_issues():
+    """Admins: {"ids": [...]} and/or {"filters": {...}} plus "status" and/or "remarks", in one transaction."""
+    _require_admin()
+    data = _payload()
+    if not isinstance(data.get('filters') or {}, dict) or not isinstance(data.get('ids') or [], list):
+        raise APIError('"filters" must be an object and "ids" a list.')
+    filters = issue_filters_from_args(data.get('filters') or {})
+    updated = issue_service.bulk_update_issues(
+        filters=filters, ids=data.get('ids'), status=data.get('status'), remarks=data.get('remarks')
+    )
+    return _json_response({'updated': updated})
+
+
+@api.route('/issues/import', methods=['POST'])
+def import_legacy_issues():
+    """
+    Admins: the request body is a CSV (Content-Type: text/csv) or JSON Lines
+    (application/x-ndjson) file, read as a stream and imported in chunks.
+    """
+    _require_admin()
+    fmt = {'text/csv': 'csv', 'application/x-ndjson': 'jsonl', 'application/jsonl': 'jsonl'}.get(request.mimetype)
+    if fmt not in IMPORT_FORMATS:
+        raise APIError('Send the file as text/csv or application/x-ndjson.', 415)
+    stream = io.TextIOWrapper(request.stream, encoding=request.mimetype_params.get('charset', 'utf-8-sig'),
+                              newline='')
+    result = import_issues(stream, fmt, session['user_id'], current_app.extensions['analysis'])
+    return _json_response({'imported': result.imported, 'skipped': result.skipped, 'errors': result.errors})
@@ -0,0 +1,219 @@
+"""
+Hot/cold archival of resolved issues.
+
+Issues resolved more than ARCHIVE_AFTER_DAYS ago move, with their status
+logs and feedback, from the hot tables into the archived_* tables of the
+archive bind. The archive bind is ARCHIVE_DATABASE_URL, a separate database
+file, or the main database when that is unset. The dashboards, their counts
+and the hot indexes then only cover the working set. PDF reports, the API's
+single-issue reads and the analytics exports read through to the archive.
+The dashboard counts and the mean time to resolve include archived issues
+through cached aggregates; the map's clusters cover the hot issues only.
+
+Each batch is copied into the archive in one transaction and deleted from
+the hot tables in another, so the archive can live in another database.
+The delete re-checks eligibility under a row lock, so an issue reopened in
+between stays hot and its archived copy is dropped again. A batch
+interrupted after the copy is copied over by the next run.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, case, delete, func, insert, select
+from sqlalchemy.orm import aliased, selectinload
+
+from extensions import db
+from geo import forget_locations
+from metrics import resolution_totals
+from models import ArchivedFeedback, ArchivedIssue, ArchivedIssueStatusLog, Feedback, Issue, IssueStatusLog
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+# The archive only changes when the archiver runs, so its counts can be a few minutes old
+COUNTS_TTL = 300.0
+
+# (hot model, archive model, column holding the issue id)
+ARCHIVED_TABLES = (
+    (Issue, ArchivedIssue, 'id'),
+    (IssueStatusLog, ArchivedIssueStatusLog, 'issue_id'),
+    (Feedback, ArchivedFeedback, 'issue_id'),
+)
+
+
+def _eligible(cutoff: datetime):
+    duplicate = aliased(Issue)
+    return and_(
+        Issue.current_status == 'Resolved',
+        Issue.updated_at < cutoff,
+        # A hot report linked to this one as a duplicate still points at it. Uncorrelated, so the
+        # (mostly NULL) duplicate links are read once rather than once per candidate
+        Issue.id.notin_(select(duplicate.duplicate_of_id).where(duplicate.duplicate_of_id.isnot(None))),
+        # SQLite hands out max(rowid) + 1, so archiving the newest issue would let its id be reused
+        Issue.id < select(func.max(duplicate.id)).scalar_subquery(),
+    )
+
+
+def _read_rows(model, archive_model, column: str, ids: List[int]) -> List[dict]:
+    hot = model.__table__
+    columns = [hot.c[name] for name in archive_model.__table__.c.keys() if name in hot.c]
+    return [dict(row._mapping) for row in db.session.execute(select(*columns).where(hot.c[column].in_(ids)))]
+
+
+def _delete_archived(conn, ids: List[int]):
+    for _, archive_model, column in ARCHIVED_TABLES:
+        table = archive_model.__table__
+        conn.execute(delete(table).where(table.c[column].in_(ids)))
+
+
+def archive_batch(cutoff: datetime, batch_size: int = BATCH_SIZE) -> int:
+    """Move up to batch_size eligible issues into the archive. Returns how many left the hot tables."""
+    ids = list(db.session.scalars(
+        select(Issue.id).where(_eligible(cutoff)).order_by(Issue.id).limit(batch_size)
+    ))
+    if not ids:
+        return 0
+    rows = [(archive_model, _read_rows(model, archive_model, column, ids))
+            for model, archive_model, column in ARCHIVED_TABLES]
+    # End the read transaction before writing: a SQLite WAL snapshot cannot be upgraded
+    # once another connection (the archive engine, on the same file by default) has committed
+    db.session.rollback()
+
+    now = datetime.utcnow()
+    for row in rows[0][1]:
+        row['archived_at'] = now
+    with db.engines['archive'].begin() as conn:
+        _delete_archived(conn, ids)
+        for archive_model, values in rows:
+            if values:
+                conn.execute(insert(archive_model.__table__), values)
+
+    moved = list(db.session.scalars(
+        select(Issue.id).where(Issue.id.in_(ids), _eligible(cutoff)).with_for_update()
+    ))
+    if moved:
+        # The map's clusters count hot issues only (as rebuild_clusters does)
+        forget_locations(db.session.execute(
+            select(Issue.geohash, Issue.latitude, Issue.longitude, Issue.current_status).where(Issue.id.in_(moved))
+        ))
+        db.session.execute(delete(Feedback).where(Feedback.issue_id.in_(moved)))
+        db.session.execute(delete(IssueStatusLog).where(IssueStatusLog.issue_id.in_(moved)))
+        db.session.execute(delete(Issue).where(Issue.id.in_(moved)))
+    db.session.commit()
+
+    kept = sorted(set(ids) - set(moved))
+    if kept:
+        # Changed since they were copied: they stay hot, so their archived copies go
+        with db.engines['archive'].begin() as conn:
+            _delete_archived(conn, kept)
+    return len(moved)
+
+
+def archive_resolved(after_days: float, batch_size: int = BATCH_SIZE) -> int:
+    """Archive every issue resolved more than after_days ago, batch by batch. Returns the number moved."""
+    cutoff = datetime.utcnow() - timedelta(days=after_days)
+    total = 0
+    while True:
+        moved = archive_batch(cutoff, batch_size)
+        total += moved
+        if not moved:
+            break
+    if total:
+        logger.info("Archived %d issues resolved before %s", total, cutoff.isoformat(timespec='seconds'))
+    return total
+
+
+def load_archived_issue(issue_id: int) -> Optional[ArchivedIssue]:
+    return db.session.get(
+        ArchivedIssue,
+        issue_id,
+        options=[selectinload(ArchivedIssue.status_logs), selectinload(ArchivedIssue.feedbacks)]
+    )
+
+
+class ArchivedCounts:
+    """
+    Archived issue counts per status x area x type and resolution time totals
+    for the dashboard metrics, each cached for `ttl` seconds.
+    """
+
+    def __init__(self, ttl: float = COUNTS_TTL):
+        self.ttl = ttl
+        self._rows = None
+        self._expires = 0.0
+        self._resolution = None
+        self._resolution_expires = 0.0
+        self._lock = threading.Lock()
+
+    def rows(self) -> list:
+        with self._lock:
+            if self._rows is not None and time.monotonic() < self._expires:
+                return self._rows
+        rows = (
+            db.session.query(
+                ArchivedIssue.current_status,
+                ArchivedIssue.area,
+                ArchivedIssue.issue_type,
+                func.count(case((ArchivedIssue.duplicate_of_id.is_(None), 1))),
+                func.count(ArchivedIssue.duplicate_of_id)
+            )
+            .group_by(ArchivedIssue.current_status, ArchivedIssue.area, ArchivedIssue.issue_type)
+            .all()
+        )
+        with self._lock:
+            self._rows, self._expires = rows, time.monotonic() + self.ttl
+        return rows
+
+    def resolution(self) -> Tuple[float, int]:
+        """(total seconds to resolve, resolved issues) over the archive, see metrics.resolution_totals."""
+        with self._lock:
+            if self._resolution is not None and time.monotonic() < self._resolution_expires:
+                return self._resolution
+        resolution = resolution_totals(ArchivedIssue, ArchivedIssueStatusLog)
+        with self._lock:
+            self._resolution, self._resolution_expires = resolution, time.monotonic() + self.ttl
+        return resolution
+
+    def reset(self):
+        with self._lock:
+            self._rows = None
+            self._resolution = None
+
+
+class Archiver(threading.Thread):
+    """Background thread that runs archive_resolved every `interval` seconds."""
+
+    def __init__(self, app, interval: float = 3600.0):
+        super().__init__(name='archiver', daemon=True)
+        self.app = app
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                with self.app.app_context():
+                    if archive_resolved(self.app.config['ARCHIVE_AFTER_DAYS'], self.app.config['ARCHIVE_BATCH_SIZE']):
+                        self.app.extensions['archived_counts'].reset()
+            except Exception:  # noqa: BLE001 - keep the archiver alive
+                logger.exception("Archiving resolved issues failed")
+            self._stop_event.wait(self.interval)
+
+
+def init_archive(app) -> ArchivedCounts:
+    counts = ArchivedCounts(app.config.get('ARCHIVE_COUNTS_TTL', COUNTS_TTL))
+    app.extensions['archived_counts'] = counts
+    return counts
+
+
+def start_archiver(app) -> Archiver:
+    archiver = Archiver(app, interval=app.config.get('ARCHIVE_INTERVAL', 3600.0))
+    archiver.start()
+    return archiver
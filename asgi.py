@@ -0,0 +1,459 @@
+"""
+ASGI serving mode. The I/O-bound endpoints run as async views on an event
+loop, and every other path goes to the Flask app.
+
+Under a WSGI server a request holds a worker thread for its whole life: while
+SQLite answers, while an upload is written and while a PDF renders. An open
+/events stream holds a thread for as long as its dashboard is open. Here:
+
+- GET /api/v1/issues and /api/v1/issues/<id> read through async SQLAlchemy
+  (aiosqlite, or psycopg 3 for PostgreSQL) on the models of models.py.
+- POST /api/v1/issues reads its multipart upload without blocking the loop.
+  The write runs issue_service in one of ASGI_WRITE_THREADS worker threads,
+  the same code path as the forms and the WSGI API.
+- GET /issue/<id>/pdf streams cached reports from disk. A cache miss renders
+  in bulk_export's process pool, under the same PDF_RENDER_CONCURRENCY cap.
+- GET /events costs one coroutine per open dashboard rather than a thread.
+
+The HTML pages, the admin JSON and the rest of the API go to the Flask app,
+which runs in a thread pool through a2wsgi. Both halves share the config,
+the extensions, the session cookie and the rate limits.
+
+    pip install starlette uvicorn a2wsgi aiosqlite python-multipart
+    uvicorn --factory asgi:create_asgi_app --workers 4
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from functools import wraps
+
+from a2wsgi import WSGIMiddleware
+from anyio import CapacityLimiter, to_thread
+from flask import url_for
+from itsdangerous import BadSignature
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import joinedload, selectinload
+from starlette.applications import Starlette
+from starlette.datastructures import UploadFile
+from starlette.responses import FileResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import TooManyRequests
+from werkzeug.http import http_date, parse_date, parse_etags, quote_etag
+
+import issue_service
+from api import ISSUE_FIELDS, APIError, encode_json, issue_json, make_etag, parse_fields
+from app import create_app
+from database import create_async_engine
+from extensions import db
+from instrumentation import REQUEST_SECONDS, REQUESTS
+from issue_service import IssueValidationError
+from models import ArchivedIssue, Issue, User
+from pagination import apply_issue_filters, clamp_page_size, issue_filters_from_args, issue_page, keyset_page_query
+from pdf_cache import archived_version_query, cache_key_for_version, issue_version_query
+
+
+logger = logging.getLogger(__name__)
+
+
+def _json(payload, status=200, headers=None) -> Response:
+    return Response(encode_json(payload), status_code=status, media_type='application/json', headers=headers)
+
+
+def _api_error(request, error):
+    return _json({'error': str(error)}, error.status)
+
+
+def _validation_error(request, error):
+    return _json({'error': str(error)}, 422)
+
+
+def _too_many_requests(request, error):
+    headers = {'Retry-After': str(error.retry_after)} if error.retry_after is not None else None
+    return _json({'error': error.description}, 429, headers)
+
+
+class _HandOver(Response):
+    """Response that passes the request on to the Flask app, e.g. for its flash-and-redirect HTML replies."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.background = None
+
+    async def __call__(self, scope, receive, send):
+        await self.wsgi_app(scope, receive, send)
+
+
+def _instrumented(endpoint: str):
+    """Count and time an async view in the same metrics as the Flask views, under its Flask endpoint name."""
+    def record(method: str, status: int, started: float):
+        REQUESTS.inc(endpoint=endpoint, method=method, status=str(status))
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request):
+            started = time.perf_counter()
+            try:
+                response = await view(request)
+            except IssueValidationError:
+                record(request.method, 422, started)
+                raise
+            except Exception as exc:
+                # APIError.status, werkzeug's HTTPException.code
+                record(request.method, getattr(exc, 'status', None) or getattr(exc, 'code', None) or 500, started)
+                raise
+            # Requests handed over to the Flask app are counted there
+            if not isinstance(response, _HandOver):
+                record(request.method, response.status_code, started)
+            return response
+        return wrapper
+    return decorator
+
+
+def _session(request) -> dict:
+    """The Flask session from the request's cookie. Async views only read it."""
+    state = request.app.state
+    cookie = request.cookies.get(state.flask_app.config['SESSION_COOKIE_NAME'])
+    if not cookie or state.session_serializer is None:
+        return {}
+    try:
+        return state.session_serializer.loads(cookie, max_age=state.session_max_age)
+    except BadSignature:
+        return {}
+
+
+def _require_login(request) -> dict:
+    session = _session(request)
+    if 'user_id' not in session:
+        raise APIError('Login required.', 401)
+    return session
+
+
+async def _enforce_budgets(request, endpoint: str, session: dict):
+    """The rate_limit budgets of the Flask endpoint this view stands in for."""
+    flask_app = request.app.state.flask_app
+    limiter = flask_app.extensions['rate_limits']
+    if not flask_app.config.get('RATE_LIMIT_ENABLED', True) or not limiter.budgets(request.method, endpoint):
+        return
+
+    def identity(scope):
+        if scope == 'ip':
+            return request.client.host if request.client else None
+        if scope == 'session':
+            # Set by the Flask app; sessions without one are covered by their IP budget
+            return session.get('rate_limit_id')
+        return f"id:{session['user_id']}" if 'user_id' in session else None
+
+    # The Redis backend does network I/O
+    await asyncio.to_thread(limiter.enforce, request.method, endpoint, identity)
+
+
+def _flask_context(request):
+    """
+    A Flask request context describing this request (not reading its body),
+    for url_for in the storage backends and API links.
+    """
+    return request.app.state.flask_app.test_request_context(
+        request.url.path, base_url=str(request.base_url), method=request.method
+    )
+
+
+def _validators(etag: str, last_modified=None) -> dict:
+    headers = {'ETag': quote_etag(etag), 'Cache-Control': 'private, no-cache'}
+    if last_modified:
+        headers['Last-Modified'] = http_date(last_modified.replace(tzinfo=timezone.utc))
+    return headers
+
+
+def _not_modified(request, etag: str, last_modified=None):
+    """A 304 when the client's copy is current (as api._conditional), else None."""
+    if_none_match = parse_etags(request.headers.get('if-none-match'))
+    if if_none_match:
+        fresh = if_none_match.contains(etag)
+    else:
+        since = parse_date(request.headers.get('if-modified-since'))
+        fresh = bool(
+            last_modified and since
+            and last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= since
+        )
+    return Response(status_code=304, headers=_validators(etag, last_modified)) if fresh else None
+
+
+@_instrumented('api.list_issues')
+async def list_issues(request):
+    session = _require_login(request)
+    await _enforce_budgets(request, 'api.list_issues', session)
+    args = request.query_params
+    fields = parse_fields(args.get('fields'))
+    filters = issue_filters_from_args(args)
+    limit = clamp_page_size(args.get('limit'))
+    statement = keyset_page_query(apply_issue_filters(select(Issue), filters), args.get('cursor'), limit)
+    async with request.app.state.sessionmaker() as db_session:
+        page = issue_page(list(await db_session.scalars(statement)), limit)
+
+    etag = make_etag('issues', fields, page.next_cursor, [(issue.id, issue.updated_at) for issue in page.items])
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    with _flask_context(request):
+        payload = {
+            'data': [issue_json(issue, fields) for issue in page.items],
+            'next_cursor': page.next_cursor,
+            'next': url_for(
+                'api.list_issues', cursor=page.next_cursor, limit=args.get('limit'),
+                fields=args.get('fields'), **filters
+            ) if page.has_more else None,
+        }
+    return _json(payload, headers=_validators(etag))
+
+
+async def _issue_version(db_session, issue_id: int):
+    """api._issue_version: (updated_at, archived) by primary key, 404 if the issue is nowhere."""
+    row = (await db_session.execute(select(Issue.updated_at).where(Issue.id == issue_id))).first()
+    if row is not None:
+        return row.updated_at or datetime.min, False
+    row = (await db_session.execute(select(ArchivedIssue.updated_at).where(ArchivedIssue.id == issue_id))).first()
+    if row is None:
+        raise APIError('Not found.', 404)
+    return row.updated_at or datetime.min, True
+
+
+@_instrumented('api.get_issue')
+async def get_issue(request):
+    session = _require_login(request)
+    await _enforce_budgets(request, 'api.get_issue', session)
+    fields = parse_fields(request.query_params.get('fields'))
+    issue_id = request.path_params['issue_id']
+    async with request.app.state.sessionmaker() as db_session:
+        updated_at, archived = await _issue_version(db_session, issue_id)
+        etag = make_etag('issue', issue_id, updated_at, fields)
+        not_modified = _not_modified(request, etag, updated_at)
+        if not_modified:
+            return not_modified
+        issue = await db_session.get(ArchivedIssue if archived else Issue, issue_id)
+    with _flask_context(request):
+        payload = issue_json(issue, fields)
+    return _json(payload, headers=_validators(etag, updated_at))
+
+
+def _too_large(max_length: int) -> APIError:
+    return APIError(f'Uploaded file is too large (maximum {max_length // (1024 * 1024)} MB).', 413)
+
+
+def _report_issue(flask_app, base_url: str, user_id: int, data, image):
+    """Worker thread: file the report through issue_service, as the WSGI API does."""
+    with flask_app.test_request_context('/api/v1/issues', base_url=base_url, method='POST'):
+        issue = issue_service.report_issue(
+            db.session.get(User, user_id),
+            issue_type=data.get('issue_type'),
+            description=data.get('description'),
+            area=data.get('area'),
+            street=data.get('street'),
+            landmark=data.get('landmark'),
+            latitude=data.get('latitude'),
+            longitude=data.get('longitude'),
+            name=data.get('name'),
+            email=data.get('email'),
+            phone=data.get('phone'),
+            image=image
+        )
+        return (issue_json(issue, list(ISSUE_FIELDS)), url_for('api.get_issue', issue_id=issue.id),
+                issue.id, issue.updated_at)
+
+
+@_instrumented('api.create_issue')
+async def create_issue(request):
+    session = _require_login(request)
+    await _enforce_budgets(request, 'api.create_issue', session)
+    flask_app = request.app.state.flask_app
+    max_length = flask_app.config.get('MAX_CONTENT_LENGTH')
+    if max_length and int(request.headers.get('content-length') or 0) > max_length:
+        raise _too_large(max_length)
+
+    form = None
+    image = None
+    media_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    if media_type == 'application/json' or media_type.endswith('+json'):
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            raise APIError('Request body must be a JSON object.')
+    else:
+        # Starlette spools uploads to temporary files from a worker thread
+        form = data = await request.form(max_files=1)
+        upload = form.get('before_image')
+        if isinstance(upload, UploadFile):
+            if max_length and upload.size and upload.size > max_length:
+                await form.close()
+                raise _too_large(max_length)
+            image = FileStorage(stream=upload.file, filename=upload.filename, content_type=upload.content_type)
+    try:
+        # Writers get their own few threads, so a burst of reports waiting on the
+        # database lock cannot starve the reads queued behind them
+        payload, location, issue_id, updated_at = await to_thread.run_sync(
+            _report_issue, flask_app, str(request.base_url), session['user_id'], data, image,
+            limiter=request.app.state.write_limiter
+        )
+    finally:
+        if form is not None:
+            await form.close()
+    headers = {
+        'Location': location,
+        **_validators(make_etag('issue', issue_id, updated_at, list(ISSUE_FIELDS)), updated_at),
+    }
+    return _json(payload, 201, headers)
+
+
+async def _report_cache_key(db_session, issue_id: int):
+    """pdf_cache.issue_cache_key over the async session."""
+    row = (await db_session.execute(issue_version_query(issue_id))).first()
+    if row is None:
+        archived = (await db_session.execute(archived_version_query(issue_id))).first()
+        if archived is None:
+            return None
+        user = await db_session.get(User, archived[3])
+        row = (*archived[:3], user and user.name, user and user.email, user and user.phone)
+    return cache_key_for_version(issue_id, *row)
+
+
+async def _load_issue_for_report(db_session, issue_id: int):
+    """pdf_cache.load_issue_for_report over the async session."""
+    issue = await db_session.get(Issue, issue_id, options=[
+        joinedload(Issue.user), selectinload(Issue.status_logs), selectinload(Issue.feedbacks)
+    ])
+    if issue is None:
+        issue = await db_session.get(ArchivedIssue, issue_id, options=[
+            selectinload(ArchivedIssue.status_logs), selectinload(ArchivedIssue.feedbacks)
+        ])
+    return issue
+
+
+def _report_snapshot(flask_app, issue):
+    """Worker thread: resolve the report's images (possibly downloading them from S3) and an archived issue's user."""
+    from bulk_export import issue_snapshot
+    with flask_app.app_context():
+        return issue_snapshot(issue)
+
+
+async def _render_report(request, issue_id: int, key: str):
+    """Render and cache an issue's report, the CPU-heavy part in bulk_export's process pool."""
+    from bulk_export import render_pool, render_snapshot
+
+    state = request.app.state
+    async with state.sessionmaker() as db_session:
+        issue = await _load_issue_for_report(db_session, issue_id)
+    if issue is None:
+        return None
+    snapshot = await asyncio.to_thread(_report_snapshot, state.flask_app, issue)
+    pdf = await asyncio.get_running_loop().run_in_executor(render_pool(), render_snapshot, snapshot)
+    return await asyncio.to_thread(state.flask_app.extensions['pdf_cache'].put, key, pdf)
+
+
+@_instrumented('reports.download_issue_pdf')
+async def download_issue_pdf(request):
+    state = request.app.state
+    session = _session(request)
+    if 'user_id' not in session:
+        return _HandOver(state.wsgi_app)
+    await _enforce_budgets(request, 'reports.download_issue_pdf', session)
+    issue_id = request.path_params['issue_id']
+    async with state.sessionmaker() as db_session:
+        key = await _report_cache_key(db_session, issue_id)
+    if key is None:
+        return _HandOver(state.wsgi_app)
+    if parse_etags(request.headers.get('if-none-match')).contains(key):
+        return Response(status_code=304, headers={'ETag': quote_etag(key)})
+
+    cache = state.flask_app.extensions['pdf_cache']
+    path = await asyncio.to_thread(cache.get, key)
+    if path is None:
+        limit = state.flask_app.extensions['rate_limits'].concurrency['pdf']
+        await limit.acquire_async('reports.download_issue_pdf')
+        try:
+            path = await _render_report(request, issue_id, key)
+        except Exception:
+            logger.exception("Error generating PDF for issue %s", issue_id)
+            path = None
+        finally:
+            limit.release()
+        if path is None:
+            # The Flask view renders once more and flashes its error page
+            return _HandOver(state.wsgi_app)
+
+    return FileResponse(
+        path,
+        media_type='application/pdf',
+        filename=f'issue_{issue_id}_report.pdf',
+        headers={'ETag': quote_etag(key), 'Cache-Control': 'private, no-cache'}
+    )
+
+
+@_instrumented('events.event_stream')
+async def event_stream(request):
+    """Server-Sent Events feed of issue changes, as events.event_stream."""
+    session = _session(request)
+    if 'user_id' not in session:
+        return _json({'error': 'Login required.'}, 401)
+    bus = request.app.state.flask_app.extensions['events']
+    return StreamingResponse(
+        bus.astream(request.headers.get('last-event-id'), admin=session.get('role') == 'admin'),
+        media_type='text/event-stream',
+        # Proxies must neither buffer nor cache the stream
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def _async_sessionmaker(engine, archive_engine):
+    # The archive tables may live in another database (ARCHIVE_DATABASE_URL)
+    binds = {table: archive_engine for table in db.metadatas['archive'].tables.values()}
+    return async_sessionmaker(engine, binds=binds, expire_on_commit=False)
+
+
+def create_asgi_app(config=None) -> Starlette:
+    """
+    Build the ASGI application: the async views in front of create_app(config),
+    which serves every other path. `uvicorn --factory asgi:create_asgi_app`
+    finds this factory.
+    """
+    flask_app = create_app(config)
+    engine = create_async_engine(flask_app.config)
+    archive_url = flask_app.config.get('ARCHIVE_DATABASE_URL')
+    archive_engine = create_async_engine(flask_app.config, archive_url) if archive_url else engine
+    wsgi_app = WSGIMiddleware(flask_app, workers=flask_app.config.get('ASGI_WSGI_THREADS', 10))
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await engine.dispose()
+        if archive_engine is not engine:
+            await archive_engine.dispose()
+
+    app = Starlette(
+        routes=[
+            Route('/api/v1/issues', list_issues, methods=['GET']),
+            Route('/api/v1/issues', create_issue, methods=['POST']),
+            Route('/api/v1/issues/{issue_id:int}', get_issue, methods=['GET']),
+            Route('/issue/{issue_id:int}/pdf', download_issue_pdf, methods=['GET']),
+            Route('/events', event_stream, methods=['GET']),
+            Mount('/', app=wsgi_app),
+        ],
+        exception_handlers={
+            APIError: _api_error,
+            IssueValidationError: _validation_error,
+            TooManyRequests: _too_many_requests,
+        },
+        lifespan=lifespan,
+    )
+    app.state.flask_app = flask_app
+    app.state.wsgi_app = wsgi_app
+    app.state.sessionmaker = _async_sessionmaker(engine, archive_engine)
+    app.state.write_limiter = CapacityLimiter(flask_app.config.get('ASGI_WRITE_THREADS', 1))
+    app.state.session_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    app.state.session_max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+    return app
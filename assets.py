@@ -0,0 +1,202 @@
+"""
+Static asset pipeline. The CSS and JS under static/ are copied to
+static/build under content-hashed names (css/style.<hash>.css), with gzip
+siblings and, if the brotli package is installed, brotli siblings. A
+manifest maps each source file to its hashed copy, and url_for('static', ...)
+resolves to the hashed name, so templates keep using the plain file names.
+
+Hashed assets and content-addressed uploads never change under their URL.
+They are served with a one-year immutable Cache-Control, so browsers stop
+revalidating them on every dashboard view. Hashed assets are sent in the
+best encoding the client accepts. Every static file, including uploaded
+images, supports Range requests (werkzeug's conditional send_file).
+
+The build runs at startup when the sources changed since the manifest was
+written, or ahead of time with `flask assets-build` (e.g. in a Docker build,
+where the static folder may be read-only at runtime).
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+from typing import Dict, Optional
+
+from flask import current_app, request, send_from_directory
+
+
+logger = logging.getLogger(__name__)
+
+SOURCE_DIRS = ('css', 'js')
+COMPRESSIBLE = ('.css', '.js', '.svg')
+BUILD_DIR = 'build'
+MANIFEST_NAME = 'manifest.json'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Preferred first when the client accepts both
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# Uploads stored by content address: <prefix>/[variants/]ab/cd/<sha256>.<ext>[...]
+CONTENT_ADDRESSED = r'(?:variants/)?[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[\w.]+'
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as fh:
+        fh.write(data)
+    os.replace(tmp_path, path)
+
+
+def _compressors():
+    compressors = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    try:
+        import brotli  # optional dependency: `pip install brotli`
+    except ImportError:
+        logger.info("brotli is not installed; static assets get gzip siblings only")
+    else:
+        compressors.insert(0, ('.br', lambda data: brotli.compress(data, quality=11)))
+    return compressors
+
+
+def _sources(static_folder: str) -> Dict[str, list]:
+    """Source files to fingerprint, as {path relative to static/: [mtime_ns, size]}."""
+    sources = {}
+    for directory in SOURCE_DIRS:
+        for root, _, files in os.walk(os.path.join(static_folder, directory)):
+            for name in files:
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                sources[os.path.relpath(path, static_folder).replace(os.sep, '/')] = [stat.st_mtime_ns, stat.st_size]
+    return sources
+
+
+def build_assets(static_folder: str) -> dict:
+    """Fingerprint and precompress the sources, write the manifest and return it."""
+    compressors = _compressors()
+    sources = _sources(static_folder)
+    files = {}
+    for filename in sorted(sources):
+        with open(os.path.join(static_folder, filename), 'rb') as fh:
+            data = fh.read()
+        stem, ext = os.path.splitext(filename)
+        hashed = f"{BUILD_DIR}/{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        target = os.path.join(static_folder, hashed)
+        # Earlier builds stay in place for pages still referencing them during a deploy
+        if not os.path.exists(target):
+            _write_atomic(target, data)
+        if ext in COMPRESSIBLE:
+            for suffix, compress in compressors:
+                if not os.path.exists(target + suffix):
+                    _write_atomic(target + suffix, compress(data))
+        files[filename] = hashed
+    manifest = {'files': files, 'sources': sources}
+    _write_atomic(
+        os.path.join(static_folder, BUILD_DIR, MANIFEST_NAME),
+        json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8')
+    )
+    return manifest
+
+
+class AssetManifest:
+    """Source name -> fingerprinted name lookups, rebuilding when the sources change."""
+
+    def __init__(self, static_folder: str, upload_prefix: str = 'uploads', auto_build: bool = True,
+                 auto_reload: bool = False):
+        self.static_folder = static_folder
+        self.upload_pattern = re.compile(f'{re.escape(upload_prefix)}/{CONTENT_ADDRESSED}')
+        self.auto_build = auto_build
+        self.auto_reload = auto_reload
+        self.files: Dict[str, str] = {}
+        self.sources: Dict[str, list] = {}
+        self._hashed = frozenset()
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.static_folder, BUILD_DIR, MANIFEST_NAME)
+
+    def _apply(self, manifest: dict):
+        self.files = manifest.get('files', {})
+        self.sources = manifest.get('sources', {})
+        self._hashed = frozenset(self.files.values())
+
+    def load(self):
+        try:
+            with open(self.path) as fh:
+                self._apply(json.load(fh))
+        except (OSError, ValueError):
+            self._apply({})
+        if self.auto_build and self.sources != _sources(self.static_folder):
+            self.build()
+
+    def build(self):
+        with self._lock:
+            try:
+                self._apply(build_assets(self.static_folder))
+            except OSError:
+                # e.g. a read-only static folder: serve the unhashed files rather than fail
+                logger.warning("Could not build static assets; serving them unfingerprinted", exc_info=True)
+
+    def lookup(self, filename: str) -> Optional[str]:
+        if self.auto_reload and self.sources != _sources(self.static_folder):
+            self.build()
+        return self.files.get(filename)
+
+    def is_fingerprinted(self, filename: str) -> bool:
+        return filename in self._hashed
+
+    def is_immutable(self, filename: str) -> bool:
+        return filename in self._hashed or bool(self.upload_pattern.fullmatch(filename))
+
+
+def _fingerprint_url(endpoint, values):
+    """url_defaults hook: url_for('static', filename='css/style.css') -> the fingerprinted name."""
+    if endpoint == 'static' and 'filename' in values:
+        hashed = current_app.extensions['assets'].lookup(values['filename'])
+        if hashed:
+            values['filename'] = hashed
+
+
+def _accepted_encoding(filename: str) -> Optional[tuple]:
+    path = os.path.join(current_app.static_folder, filename)
+    for encoding, suffix in ENCODINGS:
+        if request.accept_encodings[encoding] and os.path.exists(path + suffix):
+            return encoding, suffix
+    return None
+
+
+def serve_static(filename):
+    """Replacement for Flask's static view: encodings and immutable caching for unchanging files."""
+    manifest = current_app.extensions['assets']
+    fingerprinted = manifest.is_fingerprinted(filename)
+    chosen = _accepted_encoding(filename) if fingerprinted else None
+    if chosen:
+        encoding, suffix = chosen
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(current_app.static_folder, filename + suffix, mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = current_app.send_static_file(filename)
+    if fingerprinted:
+        response.vary.add('Accept-Encoding')
+    if manifest.is_immutable(filename):
+        response.headers['Cache-Control'] = IMMUTABLE
+    return response
+
+
+def init_assets(app) -> AssetManifest:
+    manifest = AssetManifest(
+        app.static_folder,
+        upload_prefix=getattr(app.extensions['storage'], 'static_prefix', None) or 'uploads',
+        auto_build=app.config.get('ASSET_AUTO_BUILD', True),
+        auto_reload=app.debug or bool(app.config.get('TEMPLATES_AUTO_RELOAD'))
+    )
+    app.extensions['assets'] = manifest
+    app.view_functions['static'] = serve_static
+    if app.config.get('ASSET_FINGERPRINTING', True):
+        manifest.load()
+        app.url_defaults(_fingerprint_url)
+    return manifest
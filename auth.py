@@ -0,0 +1,106 @@
+"""
+Login, logout and registration.
+"""
+from flask import Blueprint, flash, redirect, render_template, request, session, url_for
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from extensions import db
+from models import User
+
+
+auth = Blueprint('auth', __name__)
+
+
+@auth.route('/')
+def index():
+    if 'user_id' in session:
+        if session.get('role') == 'admin':
+            return redirect(url_for('admin.admin_dashboard'))
+        else:
+            return redirect(url_for('citizen.user_dashboard'))
+    return redirect(url_for('auth.login'))
+
+@auth.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+        role = request.form.get('role')
+
+        if not username or not password or not role:
+            flash('All fields are required.', 'error')
+            return redirect(url_for('auth.login'))
+
+        user = User.query.filter_by(username=username, role=role).first()
+        if user and check_password_hash(user.password_hash, password):
+            session['user_id'] = user.id
+            session['username'] = user.username
+            session['role'] = user.role
+            flash('Login successful!', 'success')
+            if role == 'admin':
+                return redirect(url_for('admin.admin_dashboard'))
+            else:
+                return redirect(url_for('citizen.user_dashboard'))
+        else:
+            flash('Invalid username, password, or role.', 'error')
+            return redirect(url_for('auth.login'))
+
+    return render_template('login.html')
+
+@auth.route('/logout')
+def logout():
+    session.clear()
+    flash('You have been logged out.', 'info')
+    return redirect(url_for('auth.login'))
+
+
+@auth.route('/register', methods=['GET', 'POST'])
+def register():
+    # Check if user is logged in as admin to allow role selection
+    can_register_admin = 'user_id' in session and session.get('role') == 'admin'
+
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+        confirm_password = request.form.get('confirm_password')
+        role = request.form.get('role', 'user')  # Default to user if not specified
+        name = request.form.get('name')
+        email = request.form.get('email')
+        phone = request.form.get('phone')
+
+        if not username or not password or not confirm_password:
+            flash('Username and password are required.', 'error')
+            return redirect(url_for('auth.register'))
+
+        if password != confirm_password:
+            flash('Passwords do not match.', 'error')
+            return redirect(url_for('auth.register'))
+
+        # Only admins can register admin accounts
+        if role == 'admin' and not can_register_admin:
+            flash('Only administrators can register admin accounts.', 'error')
+            return redirect(url_for('auth.register'))
+
+        # Check if username already exists
+        existing_user = User.query.filter_by(username=username).first()
+        if existing_user:
+            flash('Username already exists.', 'error')
+            return redirect(url_for('auth.register'))
+
+        # Create new user
+        hashed_password = generate_password_hash(password)
+        new_user = User(
+            username=username,
+            password_hash=hashed_password,
+            role=role,
+            name=name,
+            email=email,
+            phone=phone
+        )
+        db.session.add(new_user)
+        db.session.commit()
+
+        flash('Registration successful! Please log in.', 'success')
+        return redirect(url_for('auth.login'))
+
+    return render_template('register.html', can_register_admin=can_register_admin)
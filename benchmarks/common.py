@@ -0,0 +1,114 @@
+"""
+Helpers shared by the benchmark scripts.
+"""
+import atexit
+import os
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT, 'benchmarks', 'data')
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def percentile(sorted_values, q: float) -> float:
+    """Nearest-rank percentile (q in 0-100) of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(min(rank, len(sorted_values))) - 1]
+
+
+def latency_summary(values_ms) -> dict:
+    values = sorted(values_ms)
+    return {
+        'count': len(values),
+        'mean_ms': round(sum(values) / len(values), 2) if values else 0.0,
+        'p50_ms': round(percentile(values, 50), 2),
+        'p95_ms': round(percentile(values, 95), 2),
+        'p99_ms': round(percentile(values, 99), 2),
+        'max_ms': round(values[-1], 2) if values else 0.0,
+    }
+
+
+def peak_rss_kb() -> int:
+    """Peak resident set size of this process so far, in KiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, KiB on Linux
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def bench_config(database_url: str, **overrides) -> dict:
+    """
+    Settings the benchmarks run the app with: no background threads, single-process events, cold PDF
+    cache, and no rate limits (every virtual user shares one address).
+    """
+    if 'PDF_CACHE_DIR' not in overrides:
+        overrides['PDF_CACHE_DIR'] = tempfile.mkdtemp(prefix='bench-pdf-cache-')
+        atexit.register(shutil.rmtree, overrides['PDF_CACHE_DIR'], True)
+    return {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'MAIL_OUTBOX_THREAD': False,
+        'SLA_SWEEP_THREAD': False,
+        'ARCHIVE_THREAD': False,
+        'RATE_LIMIT_ENABLED': False,
+        'EVENTS_BACKEND': 'memory',
+        'UPLOAD_FOLDER': os.path.join(DATA_DIR, 'uploads'),
+        **overrides,
+    }
+
+
+def bench_app(database_url: str, **overrides):
+    """The application as the benchmarks run it (see bench_config)."""
+    from app import create_app
+
+    return create_app(bench_config(database_url, **overrides))
+
+
+def bench_database(issues: int, tmp: str, database_url: str = None) -> str:
+    """
+    A database to benchmark against: database_url as is, or a migrated copy (in tmp) of the seeded
+    SQLite file for this scale, seeding it first if missing. Copying keeps the benchmark's writes out
+    of the seeded file.
+    """
+    if database_url:
+        return database_url
+    from migrations import migrate
+    from sqlalchemy.engine import make_url
+
+    import seed
+
+    source_url = seed.default_database_url(issues)
+    source = make_url(source_url).database
+    if not os.path.exists(source):
+        os.makedirs(os.path.dirname(source), exist_ok=True)
+        seed.seed(bench_app(source_url), issues)
+    copy = os.path.join(tmp, 'bench.db')
+    # Through SQLite's backup API rather than a file copy: a freshly seeded WAL-mode
+    # database may still hold most of its pages in the -wal file
+    src, dst = sqlite3.connect(source), sqlite3.connect(copy)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+    database_url = f'sqlite:///{copy}'
+    # Seeded files may predate later migrations
+    with bench_app(database_url).app_context():
+        migrate()
+    return database_url
@@ -0,0 +1,332 @@
+"""
+Benchmark the core request paths against a seeded database.
+
+1. Per endpoint: a fresh process logs in, warms up, then sends --requests
+   sequential requests through the Flask test client. It records latency
+   (p50/p95/p99), SQL statements per request and the process's peak RSS.
+2. Load: --users virtual users (threads, each with its own session) pick
+   endpoints by weight, locust-style, with an exponential think time, for
+   --duration seconds. It reports throughput and latency per endpoint.
+
+Results are written as JSON (--output) for tracking in CI; with --baseline
+the run fails if an endpoint's p95 grew by more than --max-regression or it
+now runs more SQL statements per request.
+
+    python benchmarks/run.py --scale 10k
+    python benchmarks/run.py --scale 100k --requests 500 --users 32 --duration 60 --output bench.json
+    python benchmarks/run.py --baseline main.json --max-regression 0.25
+
+The seeded SQLite database is copied (and migrated) before each run, so the
+writes made by report_issue never accumulate in it. A --database-url (e.g.
+PostgreSQL) is used as is.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable
+
+from common import ROOT, bench_app, bench_database, git_revision, latency_summary, peak_rss_kb
+
+from sqlalchemy import func
+from sqlalchemy.engine import make_url
+
+from constants import CHENNAI_AREAS, ISSUE_TYPES
+from extensions import db
+from instrumentation import current_stats
+from models import Issue
+
+import seed
+
+SEARCH_TERMS = ['garbage', 'pothole', 'water logging', 'street light', 'tree', 'debris', 'toilet']
+CREDENTIALS = {
+    'admin': {'username': 'admin', 'password': 'admin123', 'role': 'admin'},
+    'user': {'username': 'user', 'password': 'password', 'role': 'user'},
+}
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    role: str
+    weight: int
+    send: Callable  # (client, rng, context) -> response
+    expected: tuple = (200,)
+
+
+def _report_issue(client, rng, context):
+    area = rng.choice(CHENNAI_AREAS)
+    issue_type = rng.choice(ISSUE_TYPES)
+    data = {
+        'issue_type': issue_type,
+        'issue_description': f'{rng.choice(seed.PROBLEMS[issue_type])}. {rng.choice(seed.DETAILS)}',
+        'area': area,
+        'street': rng.choice(seed.STREETS),
+        'landmark': rng.choice(seed.LANDMARKS) or '',
+        'name': 'Benchmark User',
+        'email': 'bench@example.com',
+    }
+    # One report in four comes with a photo
+    if rng.random() < 0.25:
+        data['before_image'] = (io.BytesIO(context['photo']), 'photo.jpg')
+    return client.post('/issue/report', data=data, content_type='multipart/form-data')
+
+
+SCENARIOS = [
+    Scenario('admin_dashboard', 'admin', 3, lambda c, rng, ctx: c.get('/admin/dashboard')),
+    Scenario('admin_dashboard_filtered', 'admin', 2, lambda c, rng, ctx: c.get(
+        '/admin/dashboard', query_string={'area': rng.choice(CHENNAI_AREAS), 'status': 'Pending'}
+    )),
+    Scenario('admin_search', 'admin', 1, lambda c, rng, ctx: c.get(
+        '/admin/dashboard', query_string={'q': rng.choice(SEARCH_TERMS)}
+    )),
+    Scenario('admin_metrics', 'admin', 1, lambda c, rng, ctx: c.get('/admin/metrics.json')),
+    Scenario('user_dashboard', 'user', 5, lambda c, rng, ctx: c.get('/user/dashboard')),
+    Scenario('report_issue', 'user', 2, _report_issue, expected=(302,)),
+    Scenario('download_issue_pdf', 'user', 2, lambda c, rng, ctx: c.get(
+        f"/issue/{rng.randint(1, ctx['max_issue_id'])}/pdf"
+    )),
+    Scenario('api_list_issues', 'user', 3, lambda c, rng, ctx: c.get('/api/v1/issues', query_string={'limit': 50})),
+]
+SCENARIOS_BY_NAME = {scenario.name: scenario for scenario in SCENARIOS}
+
+
+class Recorder:
+    """Latency and SQL statement count of every request, per endpoint; safe to share between threads."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.queries = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, elapsed_ms, queries, ok):
+        with self._lock:
+            self.latencies.setdefault(name, []).append(elapsed_ms)
+            if queries is not None:
+                self.queries.setdefault(name, []).append(queries)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, name) -> dict:
+        queries = self.queries.get(name) or [0]
+        return {
+            **latency_summary(self.latencies.get(name, [])),
+            'errors': self.errors.get(name, 0),
+            'queries_per_request': {'mean': round(sum(queries) / len(queries), 2), 'max': max(queries)},
+        }
+
+
+def _build(database_url):
+    app = bench_app(database_url)
+    # Registered after init_instrumentation, so it runs first and sees the finished view's statement count
+    @app.after_request
+    def _capture_queries(response):
+        stats = current_stats()
+        if stats is not None:
+            response.headers['X-Bench-Queries'] = str(stats.queries)
+        return response
+
+    with app.app_context():
+        max_issue_id = db.session.query(func.max(Issue.id)).scalar() or 1
+    context = {'max_issue_id': max_issue_id, 'photo': seed._photo(random.Random(7)).getvalue()}
+    return app, context
+
+
+def _login(app, role):
+    client = app.test_client()
+    response = client.post('/login', data=CREDENTIALS[role])
+    # A failed login redirects too, so check the session rather than the status
+    with client.session_transaction() as session:
+        if session.get('role') != role or 'user_id' not in session:
+            raise RuntimeError(f'Could not log in as {role} (status {response.status_code})')
+    return client
+
+
+def _send(recorder, scenario, client, rng, context):
+    started = time.perf_counter()
+    response = scenario.send(client, rng, context)
+    response.get_data()  # include streamed bodies (PDFs) in the latency
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    queries = response.headers.get('X-Bench-Queries')
+    recorder.record(scenario.name, elapsed_ms, int(queries) if queries else None,
+                    response.status_code in scenario.expected)
+
+
+def run_endpoint(database_url, name, requests, warmup, seed_value) -> dict:
+    """Sequential requests to one endpoint in this process (run in a fresh child per endpoint)."""
+    app, context = _build(database_url)
+    scenario = SCENARIOS_BY_NAME[name]
+    client = _login(app, scenario.role)
+    rng = random.Random(seed_value)
+    for _ in range(warmup):
+        scenario.send(client, rng, context).get_data()
+    baseline_rss = peak_rss_kb()
+    recorder = Recorder()
+    for _ in range(requests):
+        _send(recorder, scenario, client, rng, context)
+    return {**recorder.summary(name), 'baseline_rss_kb': baseline_rss, 'peak_rss_kb': peak_rss_kb()}
+
+
+def run_load(database_url, users, duration, think_time, seed_value) -> dict:
+    """Weighted random endpoints from `users` concurrent virtual users for `duration` seconds."""
+    app, context = _build(database_url)
+    recorder = Recorder()
+    weights = [scenario.weight for scenario in SCENARIOS]
+    deadline = time.perf_counter() + duration
+
+    def virtual_user(number):
+        rng = random.Random(seed_value + number)
+        clients = {role: _login(app, role) for role in CREDENTIALS}
+        while time.perf_counter() < deadline:
+            scenario = rng.choices(SCENARIOS, weights)[0]
+            try:
+                _send(recorder, scenario, clients[scenario.role], rng, context)
+            except Exception:  # noqa: BLE001 - counted, the load keeps going
+                recorder.record(scenario.name, 0.0, None, False)
+            if think_time:
+                time.sleep(rng.expovariate(1 / think_time))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=virtual_user, args=(n,)) for n in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(values) for values in recorder.latencies.values())
+    return {
+        'users': users,
+        'duration_s': round(elapsed, 2),
+        'think_time_s': think_time,
+        'requests': total,
+        'errors': sum(recorder.errors.values()),
+        'throughput_rps': round(total / elapsed, 1),
+        'peak_rss_kb': peak_rss_kb(),
+        'endpoints': {name: recorder.summary(name) for name in recorder.latencies},
+    }
+
+
+def _child(args):
+    if args.child == 'load':
+        result = run_load(args.database_url, args.users, args.duration, args.think_time, args.seed)
+    else:
+        result = run_endpoint(args.database_url, args.child, args.requests, args.warmup, args.seed)
+    print(json.dumps(result))
+
+
+def _spawn(args, database_url, child) -> dict:
+    command = [
+        sys.executable, os.path.abspath(__file__), '--child', child, '--database-url', database_url,
+        '--requests', str(args.requests), '--warmup', str(args.warmup), '--users', str(args.users),
+        '--duration', str(args.duration), '--think-time', str(args.think_time), '--seed', str(args.seed),
+    ]
+    output = subprocess.run(command, cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list:
+    """Regressions of results against a previous results file."""
+    problems = []
+    for name, current in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if not previous:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + max_regression):
+            problems.append(f"{name}: p95 {previous['p95_ms']} ms -> {current['p95_ms']} ms")
+        if current['queries_per_request']['mean'] > previous['queries_per_request']['mean']:
+            problems.append(
+                f"{name}: SQL statements per request {previous['queries_per_request']['mean']}"
+                f" -> {current['queries_per_request']['mean']}"
+            )
+    return problems
+
+
+def _print_table(results):
+    print(f"{'endpoint':<26}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}{'peak RSS':>11}{'errors':>8}")
+    for name, row in results['endpoints'].items():
+        print(f"{name:<26}{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}"
+              f"{row['queries_per_request']['mean']:>9}{row['peak_rss_kb'] // 1024:>8} MB{row['errors']:>8}")
+    load = results.get('load')
+    if load:
+        print(f"\nLoad: {load['users']} users for {load['duration_s']}s -> {load['requests']} requests, "
+              f"{load['throughput_rps']} req/s, {load['errors']} errors, peak RSS {load['peak_rss_kb'] // 1024} MB")
+        for name, row in load['endpoints'].items():
+            print(f"  {name:<24}{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}  ({row['count']} requests)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', default='10k', help='10k, 100k, 1m or a number of issues (seeded if missing).')
+    parser.add_argument('--database-url', help='Benchmark this database instead of a seeded SQLite copy.')
+    parser.add_argument('--endpoints', help=f"Comma-separated subset of: {', '.join(SCENARIOS_BY_NAME)}.")
+    parser.add_argument('--requests', type=int, default=200, help='Sequential requests per endpoint.')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--users', type=int, default=16, help='Virtual users for the load phase (0 skips it).')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds of load.')
+    parser.add_argument('--think-time', type=float, default=0.05, help='Mean seconds between a user\'s requests.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    parser.add_argument('--baseline', help='Results JSON of a previous run to compare against.')
+    parser.add_argument('--max-regression', type=float, default=0.25, help='Allowed p95 growth (0.25 = 25%%).')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args)
+        return
+
+    names = args.endpoints.split(',') if args.endpoints else list(SCENARIOS_BY_NAME)
+    unknown = [name for name in names if name not in SCENARIOS_BY_NAME]
+    if unknown:
+        parser.error(f"Unknown endpoint(s): {', '.join(unknown)}")
+
+    issues = seed.parse_scale(args.scale)
+    with tempfile.TemporaryDirectory(prefix='bench-') as tmp:
+        database_url = bench_database(issues, tmp, args.database_url)
+
+        results = {
+            'meta': {
+                'revision': git_revision(),
+                'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'database': make_url(database_url).get_backend_name(),
+                'scale': issues,
+                'requests_per_endpoint': args.requests,
+            },
+            'endpoints': {},
+        }
+        for name in names:
+            print(f'{name}...', file=sys.stderr)
+            results['endpoints'][name] = _spawn(args, database_url, name)
+        if args.users:
+            print(f'load: {args.users} users for {args.duration}s...', file=sys.stderr)
+            results['load'] = _spawn(args, database_url, 'load')
+
+    _print_table(results)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            problems = compare(results, json.load(fh), args.max_regression)
+        if problems:
+            print('\nRegressions:\n  ' + '\n  '.join(problems))
+            sys.exit(1)
+        print('\nNo regressions against the baseline.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+"""
+Seed a synthetic database for the benchmarks.
+
+Issues are spread over CHENNAI_AREAS and ISSUE_TYPES with a year of report
+dates and a realistic status mix. They go through the legacy importer, so
+analysis, geocoding, queue and duplicate-signature columns are filled in
+exactly as in production. Each issue then gets status-log history, resolved
+issues get feedback, and a share of issues reference a pool of generated
+photos (with their variants).
+
+    python benchmarks/seed.py --scale 100k
+    python benchmarks/seed.py --issues 25000 --database-url postgresql+psycopg://bench@localhost/bench
+
+Seeding is idempotent: an existing database is only topped up to the requested size.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from common import DATA_DIR, bench_app
+
+from sqlalchemy import bindparam, func, insert, select, text, update
+
+from commands import create_sample_users
+from constants import AREA_COORDINATES, CHENNAI_AREAS, ISSUE_TYPES
+from extensions import db
+from images import process_image
+from importer import import_issues
+from migrations import migrate
+from models import Feedback, Issue, IssueStatusLog, StoredFile, User
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+STATUS_WEIGHTS = {'Pending': 40, 'In Progress': 25, 'Resolved': 35}
+BATCH_SIZE = 2000
+
+PROBLEMS = {
+    'Potholes / Road Damage': ['Deep pothole near the junction', 'Road surface broken after rain',
+                               'Large crater damaging two-wheelers', 'Speed breaker crumbling'],
+    'Garbage / Waste Management': ['Garbage not collected for a week', 'Overflowing bin attracting stray dogs',
+                                   'Waste dumped on the footpath', 'Burning garbage near houses'],
+    'Street Light Not Working': ['Street light off for several nights', 'Lamp post flickering',
+                                 'Entire stretch dark after 7 pm', 'Exposed wiring at the light pole'],
+    'Water Logging / Drainage': ['Water logging after light rain', 'Storm drain clogged',
+                                 'Sewage overflowing onto the road', 'Knee-deep water at the subway'],
+    'Illegal Parking / Encroachment': ['Vehicles parked on the footpath', 'Shop extension blocking the road',
+                                       'Lorries parked overnight', 'Encroachment narrowing the lane'],
+    'Public Toilet Maintenance': ['Public toilet not cleaned', 'No water supply in the toilet block',
+                                  'Broken doors in the public toilet', 'Toilet locked all day'],
+    'Tree Fall / Pruning Required': ['Tree branch hanging over wires', 'Fallen tree blocking the road',
+                                     'Overgrown tree hiding the signal', 'Uprooted tree leaning on a wall'],
+    'Water Supply Issue': ['No metro water supply for three days', 'Contaminated water from the tap',
+                           'Pipeline leak wasting water', 'Very low pressure in the morning'],
+    'Noise Pollution': ['Loudspeakers late at night', 'Construction noise after 10 pm',
+                        'Generator running all night', 'Honking near the hospital zone'],
+    'Construction Debris': ['Debris left on the road', 'Sand and bricks dumped on the footpath',
+                            'Construction waste blocking the drain', 'Demolition debris not cleared'],
+    'Other': ['Stray cattle on the main road', 'Broken bench in the park', 'Damaged bus shelter',
+              'Manhole cover missing'],
+}
+DETAILS = ['Residents have complained repeatedly.', 'It is dangerous for children and elderly people.',
+           'The problem gets worse every evening.', 'Please send someone urgently.',
+           'Nobody has responded to earlier calls.', 'Traffic slows down here because of this.', '']
+STREETS = ['Anna Salai', 'Mount Road', 'Usman Road', 'Kamarajar Salai', 'Rajaji Salai', 'Poonamallee High Road',
+           'Arcot Road', 'GST Road', 'OMR', 'ECR', 'Lattice Bridge Road', '1st Main Road', '2nd Cross Street']
+LANDMARKS = ['Near the bus stand', 'Opposite the temple', 'Next to the school', 'Behind the market',
+             'Near the metro station', 'Opposite the bank', None]
+REMARKS = ['Crew assigned.', 'Inspection completed.', 'Work order raised with the contractor.',
+           'Scheduled for this week.', 'Fixed and verified on site.']
+FEEDBACK = ['Quick response, thank you.', 'Took too long.', 'Fixed properly.', 'Partially fixed.', None]
+
+
+def generate_records(count: int, rng: random.Random, now: datetime):
+    """JSON Lines for the importer, one synthetic complaint per line."""
+    statuses = list(STATUS_WEIGHTS)
+    weights = list(STATUS_WEIGHTS.values())
+    for number in range(count):
+        area = rng.choice(CHENNAI_AREAS)
+        issue_type = rng.choice(ISSUE_TYPES)
+        lat, lon = AREA_COORDINATES[area]
+        yield json.dumps({
+            'reference': f'BENCH-{number}',
+            'issue_type': issue_type,
+            'description': f'{rng.choice(PROBLEMS[issue_type])} on {rng.choice(STREETS)}. {rng.choice(DETAILS)}',
+            'area': area,
+            'street': rng.choice(STREETS),
+            'landmark': rng.choice(LANDMARKS),
+            'status': rng.choices(statuses, weights)[0],
+            'created_at': (now - timedelta(minutes=rng.randrange(365 * 24 * 60))).isoformat(),
+            # Spread reports around the area centre so the map has more than one cell per area
+            'latitude': lat + rng.gauss(0, 0.006),
+            'longitude': lon + rng.gauss(0, 0.006),
+        }) + '\n'
+
+
+def _photo(rng: random.Random) -> io.BytesIO:
+    from PIL import Image, ImageDraw
+
+    img = Image.new('RGB', (1280, 960), tuple(rng.randrange(40, 200) for _ in range(3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x, y = rng.randrange(1280), rng.randrange(960)
+        box = (x, y, x + rng.randrange(20, 400), y + rng.randrange(20, 300))
+        draw.rectangle(box, fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=85)
+    buffer.seek(0)
+    return buffer
+
+
+def seed_photos(storage, count: int, rng: random.Random) -> list:
+    """Store `count` distinct photos and their variants; returns [(key, size)]."""
+    photos = []
+    for _ in range(count):
+        key, size = storage.save_stream(_photo(rng), 'jpg')
+        process_image(storage, key)
+        photos.append((key, size))
+    return photos
+
+
+def _batches(first_id: int, *columns):
+    """Rows of (Issue.id, *columns) after first_id, BATCH_SIZE at a time by keyset, so each batch can commit."""
+    last_id = first_id
+    while True:
+        rows = db.session.execute(
+            select(Issue.id, *columns).where(Issue.id > last_id).order_by(Issue.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def _add_history(first_id: int, rng: random.Random, now: datetime):
+    """Status-log history, feedback and timestamps for the issues imported after first_id."""
+    updated_at = update(Issue.__table__).where(Issue.__table__.c.id == bindparam('b_id')).values(
+        updated_at=bindparam('b_updated_at')
+    )
+    for partition in _batches(first_id, Issue.current_status, Issue.created_at):
+        logs, feedback, touched = [], [], []
+        for issue_id, status, created_at in partition:
+            moment = created_at
+            if status in ('In Progress', 'Resolved'):
+                moment = min(moment + timedelta(hours=rng.randrange(1, 96)), now)
+                logs.append({'issue_id': issue_id, 'status': 'In Progress', 'remarks': rng.choice(REMARKS[:4]),
+                             'created_at': moment})
+            if status == 'Resolved':
+                moment = min(moment + timedelta(hours=rng.randrange(4, 240)), now)
+                logs.append({'issue_id': issue_id, 'status': 'Resolved', 'remarks': REMARKS[-1],
+                             'created_at': moment})
+                if rng.random() < 0.5:
+                    moment = min(moment + timedelta(hours=rng.randrange(1, 48)), now)
+                    feedback.append({'issue_id': issue_id, 'rating': rng.randint(1, 5),
+                                     'comments': rng.choice(FEEDBACK), 'created_at': moment})
+            touched.append({'b_id': issue_id, 'b_updated_at': moment})
+        if logs:
+            db.session.execute(insert(IssueStatusLog), logs)
+        if feedback:
+            db.session.execute(insert(Feedback), feedback)
+        db.session.execute(updated_at, touched)
+        db.session.commit()
+
+
+def _attach_photos(first_id: int, photos: list, ratio: float, rng: random.Random):
+    """Point a share of the new issues at the photo pool (after photos for resolved ones) and set refcounts."""
+    table = Issue.__table__
+    set_images = update(table).where(table.c.id == bindparam('b_id')).values(
+        before_image=bindparam('b_before'), after_image=bindparam('b_after')
+    )
+    references = {key: 0 for key, _ in photos}
+    for partition in _batches(first_id, Issue.current_status):
+        batch = []
+        for issue_id, status in partition:
+            if rng.random() >= ratio:
+                continue
+            before = rng.choice(photos)[0]
+            after = rng.choice(photos)[0] if status == 'Resolved' else None
+            references[before] += 1
+            if after:
+                references[after] += 1
+            batch.append({'b_id': issue_id, 'b_before': before, 'b_after': after})
+        if batch:
+            db.session.execute(set_images, batch)
+            db.session.commit()
+
+    sizes = dict(photos)
+    for key, count in references.items():
+        if not count:
+            continue
+        updated = db.session.execute(
+            update(StoredFile).where(StoredFile.key == key).values(refcount=StoredFile.refcount + count)
+        ).rowcount
+        if not updated:
+            db.session.add(StoredFile(key=key, size=sizes[key], refcount=count))
+    db.session.commit()
+
+
+def seed(app, issues: int, photos: int = 40, photo_ratio: float = 0.3, seed_value: int = 42,
+         chunk_size: int = BATCH_SIZE, log=print) -> dict:
+    """Top the database up to `issues` issues. Returns counts of what is in it."""
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    with app.app_context():
+        migrate()
+        create_sample_users()
+        existing = db.session.query(func.count(Issue.id)).scalar()
+        missing = issues - existing
+        if missing > 0:
+            first_id = db.session.query(func.max(Issue.id)).scalar() or 0
+            user = User.query.filter_by(username='user').one()
+            started = time.perf_counter()
+            log(f'Importing {missing} issues...')
+            result = import_issues(generate_records(missing, rng, now), 'jsonl', user.id,
+                                   app.extensions['analysis'], chunk_size=chunk_size)
+            log(f'  {result.imported} imported in {time.perf_counter() - started:.1f}s')
+            log('Adding status history and feedback...')
+            _add_history(first_id, rng, now)
+            if photos:
+                log(f'Generating {photos} photos...')
+                _attach_photos(first_id, seed_photos(app.extensions['storage'], photos, rng), photo_ratio, rng)
+            with db.engine.begin() as conn:
+                conn.execute(text('ANALYZE'))
+        return {
+            'issues': db.session.query(func.count(Issue.id)).scalar(),
+            'status_logs': db.session.query(func.count(IssueStatusLog.id)).scalar(),
+            'feedback': db.session.query(func.count(Feedback.id)).scalar(),
+            'issues_with_photos': db.session.query(func.count(Issue.id)).filter(Issue.before_image.isnot(None)).scalar(),
+        }
+
+
+def default_database_url(issues: int) -> str:
+    return f"sqlite:///{os.path.join(DATA_DIR, f'bench_{issues}.db')}"
+
+
+def parse_scale(value: str) -> int:
+    return SCALES.get(value.lower()) or int(value.replace('_', ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', default='10k', help='10k, 100k, 1m or a number of issues.')
+    parser.add_argument('--issues', type=int, help='Overrides --scale.')
+    parser.add_argument('--database-url', help='Defaults to benchmarks/data/bench_<issues>.db (SQLite).')
+    parser.add_argument('--photos', type=int, default=40, help='Distinct generated photos.')
+    parser.add_argument('--photo-ratio', type=float, default=0.3, help='Share of issues with a photo.')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    issues = args.issues or parse_scale(args.scale)
+    os.makedirs(DATA_DIR, exist_ok=True)
+    database_url = args.database_url or default_database_url(issues)
+    counts = seed(bench_app(database_url), issues, args.photos, args.photo_ratio, args.seed)
+    print(json.dumps({'database_url': database_url, **counts}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+"""
+Compare the WSGI and ASGI serving modes under many concurrent connections.
+
+Both servers run for real on a copy of the seeded database:
+
+- wsgi: gunicorn with --workers sync workers (--wsgi-threads > 1 uses gthread
+  workers), as in the production instructions;
+- asgi: uvicorn running asgi.create_asgi_app with the same number of workers.
+
+Each mode first gets --listeners idle /events streams (open dashboards),
+then --connections concurrent clients, each with its own keep-alive
+connection, send requests back to back for --duration seconds. Requests
+are a weighted mix of the API listing, single-issue lookup, issue creation
+(one in four with a photo) and PDF download. The report shows throughput,
+latency per endpoint and errors (including timed-out requests) per mode.
+
+    python benchmarks/serving.py --scale 10k
+    python benchmarks/serving.py --connections 256 --listeners 16 --duration 30 --output serving.json
+
+Needs gunicorn and the ASGI extras (see the README's "ASGI serving mode").
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from common import ROOT, bench_config, bench_database, git_revision, latency_summary
+
+from constants import CHENNAI_AREAS, ISSUE_TYPES
+
+import seed
+
+MODES = ('wsgi', 'asgi')
+CREDENTIALS = {'username': 'user', 'password': 'password', 'role': 'user'}
+
+
+def wsgi_app():
+    """gunicorn entry point: the benchmark app, configured from BENCH_* environment variables."""
+    from app import create_app
+
+    return create_app(bench_config(os.environ['BENCH_DATABASE_URL'], PDF_CACHE_DIR=os.environ['BENCH_PDF_CACHE_DIR']))
+
+
+def asgi_app():
+    """uvicorn entry point (--factory) for the same app in ASGI mode."""
+    from asgi import create_asgi_app
+
+    return create_asgi_app(bench_config(os.environ['BENCH_DATABASE_URL'], PDF_CACHE_DIR=os.environ['BENCH_PDF_CACHE_DIR']))
+
+
+def _issue_fields(rng):
+    issue_type = rng.choice(ISSUE_TYPES)
+    return {
+        'issue_type': issue_type,
+        'description': f'{rng.choice(seed.PROBLEMS[issue_type])}. {rng.choice(seed.DETAILS)}',
+        'area': rng.choice(CHENNAI_AREAS),
+        'street': rng.choice(seed.STREETS),
+        'landmark': rng.choice(seed.LANDMARKS) or '',
+        'name': 'Benchmark User',
+        'email': 'bench@example.com',
+    }
+
+
+def _create_issue(client, rng, context):
+    if rng.random() < 0.25:
+        return client.post('/api/v1/issues', data=_issue_fields(rng),
+                           files={'before_image': ('photo.jpg', context['photo'], 'image/jpeg')})
+    return client.post('/api/v1/issues', json=_issue_fields(rng))
+
+
+# (name, weight, send, expected statuses)
+SCENARIOS = [
+    ('api_list_issues', 3, lambda c, rng, ctx: c.get('/api/v1/issues', params={'limit': 50}), (200,)),
+    ('api_list_issues_filtered', 2, lambda c, rng, ctx: c.get('/api/v1/issues', params={
+        'limit': 50, 'area': rng.choice(CHENNAI_AREAS), 'status': 'Pending',
+    }), (200,)),
+    ('api_get_issue', 4, lambda c, rng, ctx: c.get(f"/api/v1/issues/{rng.randint(1, ctx['max_issue_id'])}"),
+     (200, 404)),
+    ('api_create_issue', 1, _create_issue, (201,)),
+    ('download_issue_pdf', 2, lambda c, rng, ctx: c.get(f"/issue/{rng.randint(1, ctx['max_issue_id'])}/pdf"),
+     (200, 404, 429)),
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(mode, port, args, env) -> subprocess.Popen:
+    benchmarks_dir = os.path.join(ROOT, 'benchmarks')
+    if mode == 'wsgi':
+        command = [
+            sys.executable, '-m', 'gunicorn', '--workers', str(args.workers), '--bind', f'127.0.0.1:{port}',
+            '--chdir', ROOT, '--pythonpath', benchmarks_dir, '--log-level', 'warning',
+        ]
+        if args.wsgi_threads > 1:
+            command += ['--worker-class', 'gthread', '--threads', str(args.wsgi_threads)]
+        command.append('serving:wsgi_app()')
+    else:
+        command = [
+            sys.executable, '-m', 'uvicorn', '--factory', 'serving:asgi_app', '--workers', str(args.workers),
+            '--host', '127.0.0.1', '--port', str(port), '--app-dir', benchmarks_dir, '--log-level', 'warning',
+        ]
+    return subprocess.Popen(command, cwd=ROOT, env=env, start_new_session=True)
+
+
+def _stop_server(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+    except ProcessLookupError:
+        pass
+
+
+async def _wait_until_ready(base_url, process, timeout=60.0):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f'Server exited with status {process.returncode}')
+            try:
+                await client.get('/login')
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f'Server did not start within {timeout:.0f}s')
+
+
+async def _listen(base_url, cookies, ready):
+    """One idle dashboard: an open /events stream that is read but never closed by the client."""
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url, cookies=cookies, timeout=None) as client:
+        try:
+            async with client.stream('GET', '/events') as response:
+                ready.release()
+                async for _ in response.aiter_raw():
+                    pass
+        except httpx.HTTPError:
+            ready.release()
+
+
+async def _drive(base_url, args, context) -> dict:
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        response = await client.post('/login', data=CREDENTIALS)
+        # A failed login redirects too (back to /login, with a flash message in the session cookie)
+        if response.status_code != 302 or response.headers.get('location', '').endswith('/login'):
+            raise RuntimeError(f'Login failed with status {response.status_code}')
+        cookies = dict(client.cookies)
+
+    ready = asyncio.Semaphore(0)
+    listeners = [asyncio.create_task(_listen(base_url, cookies, ready)) for _ in range(args.listeners)]
+    for _ in listeners:
+        try:
+            await asyncio.wait_for(ready.acquire(), args.timeout)
+        except asyncio.TimeoutError:
+            break
+
+    names = [name for name, *_ in SCENARIOS]
+    weights = [weight for _, weight, *_ in SCENARIOS]
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    deadline = time.monotonic() + args.duration
+
+    async def connection(number):
+        rng = random.Random(args.seed * 1000 + number)
+        limits = httpx.Limits(max_connections=1, max_keepalive_connections=1)
+        async with httpx.AsyncClient(base_url=base_url, cookies=cookies, limits=limits,
+                                     timeout=args.timeout) as client:
+            while time.monotonic() < deadline:
+                name, _, send, expected = SCENARIOS[names.index(rng.choices(names, weights)[0])]
+                started = time.perf_counter()
+                try:
+                    response = await send(client, rng, context)
+                    ok = response.status_code in expected
+                except httpx.HTTPError:
+                    ok = False
+                latencies[name].append((time.perf_counter() - started) * 1000)
+                if not ok:
+                    errors[name] += 1
+
+    started = time.monotonic()
+    await asyncio.gather(*(connection(number) for number in range(args.connections)))
+    elapsed = time.monotonic() - started
+    for listener in listeners:
+        listener.cancel()
+    await asyncio.gather(*listeners, return_exceptions=True)
+
+    requests = sum(len(values) for values in latencies.values())
+    return {
+        'requests': requests,
+        'errors': sum(errors.values()),
+        'throughput_rps': round(requests / elapsed, 1),
+        'endpoints': {name: {**latency_summary(latencies[name]), 'errors': errors[name]} for name in names},
+    }
+
+
+def run_mode(mode, database_url, args, context) -> dict:
+    port = _free_port()
+    with tempfile.TemporaryDirectory(prefix='bench-pdf-cache-') as pdf_cache_dir:
+        env = {**os.environ, 'BENCH_DATABASE_URL': database_url, 'BENCH_PDF_CACHE_DIR': pdf_cache_dir}
+        process = _start_server(mode, port, args, env)
+        try:
+            base_url = f'http://127.0.0.1:{port}'
+            asyncio.run(_wait_until_ready(base_url, process))
+            return asyncio.run(_drive(base_url, args, context))
+        finally:
+            _stop_server(process)
+
+
+def _print_table(results):
+    for mode, result in results['modes'].items():
+        print(f"{mode}: {result['throughput_rps']} req/s, {result['requests']} requests, {result['errors']} errors")
+        print(f"  {'endpoint':<24}{'p50':>9}{'p95':>9}{'p99':>9}{'requests':>10}{'errors':>8}")
+        for name, row in result['endpoints'].items():
+            print(f"  {name:<24}{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['count']:>10}{row['errors']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', default='10k', help='10k, 100k, 1m or a number of issues (seeded if missing).')
+    parser.add_argument('--database-url', help='Benchmark this database instead of a seeded SQLite copy.')
+    parser.add_argument('--modes', default=','.join(MODES), help='Comma-separated subset of: wsgi, asgi.')
+    parser.add_argument('--workers', type=int, default=4, help='Server worker processes.')
+    parser.add_argument('--wsgi-threads', type=int, default=1, help='Threads per gunicorn worker (gthread if > 1).')
+    parser.add_argument('--connections', type=int, default=64, help='Concurrent client connections.')
+    parser.add_argument('--listeners', type=int, default=0, help='Idle /events streams held open meanwhile.')
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds of load per mode.')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Seconds before a request counts as failed.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    args = parser.parse_args()
+
+    modes = args.modes.split(',')
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"Unknown mode(s): {', '.join(unknown)}")
+
+    issues = seed.parse_scale(args.scale)
+    results = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scale': issues,
+            'workers': args.workers,
+            'wsgi_threads': args.wsgi_threads,
+            'connections': args.connections,
+            'listeners': args.listeners,
+            'duration_s': args.duration,
+        },
+        'modes': {},
+    }
+    context = {'max_issue_id': issues, 'photo': seed._photo(random.Random(7)).getvalue()}
+    for mode in modes:
+        # Every mode starts from the same data, without the issues the previous one created
+        with tempfile.TemporaryDirectory(prefix='bench-') as tmp:
+            database_url = bench_database(issues, tmp, args.database_url)
+            print(f'{mode}: {args.connections} connections, {args.listeners} listeners for {args.duration}s...',
+                  file=sys.stderr)
+            results['modes'][mode] = run_mode(mode, database_url, args, context)
+
+    _print_table(results)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Cold-start benchmark: how long a fresh worker takes to import the app,
+build it with create_app(), and answer its first requests.
+
+Every run starts a new interpreter, so nothing is warm in sys.modules.
+Each run also reports which heavy libraries were loaded by the time the first
+dashboard was served (ReportLab and Pillow should only appear after a PDF
+or image request).
+
+    python benchmarks/startup.py                # 10 runs against a temporary SQLite database
+    python benchmarks/startup.py --runs 30 --json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('reportlab', 'PIL', 'pyarrow', 'boto3', 'redis', 'sklearn')
+
+
+def _child(database_url):
+    """One measurement in this (fresh) interpreter; prints a JSON line."""
+    timings = {}
+    started = time.perf_counter()
+    from app import create_app
+    timings['import_ms'] = (time.perf_counter() - started) * 1000
+
+    mark = time.perf_counter()
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'MAIL_OUTBOX_THREAD': False,
+        'SLA_SWEEP_THREAD': False,
+        'EVENTS_BACKEND': 'memory',
+    })
+    timings['create_app_ms'] = (time.perf_counter() - mark) * 1000
+
+    client = app.test_client()
+    mark = time.perf_counter()
+    response = client.get('/login')
+    timings['first_request_ms'] = (time.perf_counter() - mark) * 1000
+    assert response.status_code == 200, response.status_code
+
+    client.post('/login', data={'username': 'user', 'password': 'password', 'role': 'user'})
+    mark = time.perf_counter()
+    response = client.get('/user/dashboard')
+    timings['first_dashboard_ms'] = (time.perf_counter() - mark) * 1000
+    assert response.status_code == 200, response.status_code
+
+    timings['total_ms'] = (time.perf_counter() - started) * 1000
+    timings['heavy_modules'] = sorted(name for name in HEAVY_MODULES if name in sys.modules)
+    print(json.dumps(timings))
+
+
+def _prepare_database(database_url):
+    """Schema and demo users, built once in a separate process so runs only measure startup."""
+    code = (
+        'from app import create_app; from commands import create_sample_users; from migrations import migrate\n'
+        f'app = create_app({{"SQLALCHEMY_DATABASE_URI": {database_url!r}, "EVENTS_BACKEND": "memory"}})\n'
+        'with app.app_context():\n    migrate(); create_sample_users()\n'
+    )
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True)
+
+
+def _summary(values):
+    values = sorted(values)
+    return {
+        'min': round(values[0], 1),
+        'median': round(statistics.median(values), 1),
+        'p95': round(values[min(len(values) - 1, int(len(values) * 0.95))], 1),
+        'max': round(values[-1], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--database-url', help='Defaults to a temporary SQLite file with demo data.')
+    parser.add_argument('--json', action='store_true', help='Print the summary as JSON.')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, ROOT)
+        _child(args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+        if not args.database_url:
+            _prepare_database(database_url)
+        runs = []
+        for _ in range(args.runs):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child', database_url],
+                cwd=ROOT, check=True, capture_output=True, text=True
+            ).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    metrics = ('import_ms', 'create_app_ms', 'first_request_ms', 'first_dashboard_ms', 'total_ms')
+    summary = {name: _summary([run[name] for run in runs]) for name in metrics}
+    summary['heavy_modules'] = sorted({name for run in runs for name in run['heavy_modules']})
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print(f"{args.runs} cold starts (ms)      min   median      p95      max")
+    for name in metrics:
+        row = summary[name]
+        print(f"  {name:<22} {row['min']:>7} {row['median']:>8} {row['p95']:>8} {row['max']:>8}")
+    print(f"  heavy modules loaded:  {', '.join(summary['heavy_modules']) or 'none'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import RawIOBase
+from types import SimpleNamespace
+from typing import Iterator, Optional
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from sqlalchemy import func
+
+from extensions import db
+from models import Issue
+from pagination import apply_issue_filters, issue_listing_query, iter_issue_pages
+from utils import draw_issue_report, generate_issue_pdf, report_image_path
+
+
+BATCH_SIZE = 50
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def render_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Process pool for PDF rendering, shared by the exports and the async single-report path (asgi.py)."""
+    global _pool
+    if _pool is None:
+        # spawn rather than fork: the parent runs dispatcher and cache-warming threads
+        _pool = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _pool
+
+
+def issue_snapshot(issue) -> SimpleNamespace:
+    """
+    Detached, picklable copy of everything generate_issue_pdf reads, with
+    images resolved to local files, so rendering can run in worker processes
+    without a database session or app context.
+    """
+    user = issue.user
+    return SimpleNamespace(
+        id=issue.id,
+        issue_type=issue.issue_type,
+        description=issue.description,
+        area=issue.area,
+        street=issue.street,
+        landmark=issue.landmark,
+        before_image=report_image_path(issue.before_image),
+        after_image=report_image_path(issue.after_image),
+        ai_summary=issue.ai_summary,
+        authority_remarks=issue.authority_remarks,
+        user=SimpleNamespace(name=user.name, email=user.email, phone=user.phone) if user else None,
+        status_logs=[
+            SimpleNamespace(status=log.status, remarks=log.remarks, created_at=log.created_at)
+            for log in issue.status_logs
+        ],
+        feedbacks=[
+            SimpleNamespace(rating=fb.rating, comments=fb.comments)
+            for fb in issue.feedbacks
+        ]
+    )
+
+
+def render_snapshot(snapshot) -> bytes:
+    return generate_issue_pdf(snapshot, resolve_images=False).getvalue()
+
+
+def _snapshot_batches(filters: dict, batch_size: int) -> Iterator[list]:
+    """Snapshots of the filtered issues in keyset batches; the session is cleared after each batch."""
+    for issues in iter_issue_pages(issue_listing_query(filters=filters), batch_size):
+        batch = [issue_snapshot(issue) for issue in issues]
+        db.session.expunge_all()
+        yield batch
+
+
+class _ChunkSink(RawIOBase):
+    """Unseekable write target; zipfile falls back to streaming mode (data descriptors)."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_issue_zip(filters: dict, batch_size: int = BATCH_SIZE,
+                     max_workers: Optional[int] = None) -> Iterator[bytes]:
+    """
+    ZIP of per-issue reports, rendered in a process pool one batch at a time
+    and yielded as soon as each batch is written, so memory stays flat.
+    """
+    pool = render_pool(max_workers)
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for batch in _snapshot_batches(filters, batch_size):
+            for snapshot, pdf in zip(batch, pool.map(render_snapshot, batch)):
+                archive.writestr(f'issue_{snapshot.id}_report.pdf', pdf)
+            yield sink.take()
+    yield sink.take()
+
+
+def exceeds_combined_limit(filters: dict, limit: int) -> bool:
+    """Whether more than `limit` issues match; counts at most limit + 1 rows."""
+    matching = apply_issue_filters(db.session.query(Issue.id), filters).limit(limit + 1).subquery()
+    return db.session.query(func.count()).select_from(matching).scalar() > limit
+
+
+def stream_combined_pdf(filters: dict, batch_size: int = BATCH_SIZE) -> Iterator[bytes]:
+    """
+    One PDF containing every filtered issue's report. ReportLab can only emit
+    a document on save(), so it is drawn in this thread to a temporary file and
+    streamed back from disk in chunks; nothing is sent until the whole document
+    is drawn. Callers cap the selection (COMBINED_PDF_MAX_ISSUES) and send
+    larger ones to the ZIP export, which renders in the pool as it streams.
+    """
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    os.close(fd)
+    try:
+        c = canvas.Canvas(path, pagesize=A4, pageCompression=1)
+        for batch in _snapshot_batches(filters, batch_size):
+            for snapshot in batch:
+                draw_issue_report(c, snapshot, resolve_images=False)
+        c.save()
+
+        with open(path, 'rb') as fh:
+            while True:
+                chunk = fh.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
@@ -0,0 +1,89 @@
+"""
+Citizen dashboard: reporting issues and leaving feedback.
+"""
+from flask import Blueprint, current_app, flash, redirect, render_template, request, session, url_for
+
+import issue_service
+from constants import AREA_COORDINATES, CHENNAI_AREAS, ISSUE_TYPES
+from extensions import db
+from images import allowed_upload
+from issue_service import IssueValidationError
+from models import Issue, User
+from pagination import clamp_page_size, issue_listing_query, paginate_issues
+
+
+citizen = Blueprint('citizen', __name__)
+
+
+@citizen.route('/user/dashboard')
+def user_dashboard():
+    if 'user_id' not in session:
+        flash('Please log in to access this page.', 'error')
+        return redirect(url_for('auth.login'))
+
+    # For simplicity, all issues are shown as if for a single demo user
+    page = paginate_issues(
+        issue_listing_query(),
+        cursor=request.args.get('cursor'),
+        limit=clamp_page_size(request.args.get('limit'))
+    )
+    current_app.extensions['fragment_cache'].prefetch(page.items)
+    return render_template(
+        'user_dashboard.html',
+        issues=page.items,
+        page=page,
+        areas=CHENNAI_AREAS,
+        area_coordinates=AREA_COORDINATES,
+        issue_types=ISSUE_TYPES
+    )
+
+
+@citizen.route('/issue/report', methods=['POST'])
+def report_issue():
+    if 'user_id' not in session:
+        flash('Please log in to report issues.', 'error')
+        return redirect(url_for('auth.login'))
+
+    user = db.session.get(User, session['user_id'])
+    try:
+        issue = issue_service.report_issue(
+            user,
+            issue_type=request.form.get('issue_type'),
+            description=request.form.get('issue_description'),
+            area=request.form.get('area'),
+            street=request.form.get('street'),
+            landmark=request.form.get('landmark'),
+            latitude=request.form.get('latitude'),
+            longitude=request.form.get('longitude'),
+            name=request.form.get('name'),
+            email=request.form.get('email'),
+            phone=request.form.get('phone'),
+            image=allowed_upload(request.files.get('before_image'))
+        )
+    except IssueValidationError as exc:
+        flash(str(exc), 'error')
+        return redirect(url_for('citizen.user_dashboard'))
+
+    if issue.duplicate_of_id:
+        flash(
+            f'Issue reported successfully! It looks like issue #{issue.duplicate_of_id}, '
+            'which is already being tracked, so your report has been linked to it.',
+            'success'
+        )
+    else:
+        flash('Issue reported successfully!', 'success')
+    return redirect(url_for('citizen.user_dashboard'))
+
+
+@citizen.route('/issue/<int:issue_id>/feedback', methods=['POST'])
+def submit_feedback(issue_id):
+    issue = db.get_or_404(Issue, issue_id)
+    try:
+        issue_service.add_feedback(
+            issue, rating=request.form.get('rating'), comments=request.form.get('comments')
+        )
+    except IssueValidationError as exc:
+        flash(str(exc), 'error')
+        return redirect(url_for('citizen.user_dashboard'))
+    flash('Thank you for your feedback!', 'success')
+    return redirect(url_for('citizen.user_dashboard'))
@@ -0,0 +1,233 @@
+"""
+Demo data and the `flask` CLI commands (workers, backfills, imports and
+exports, migrations, static assets).
+"""
+import json
+import os
+
+import click
+from flask import current_app
+from werkzeug.security import generate_password_hash
+
+from analysis import rescore_issues
+from archive import archive_resolved, start_archiver
+from analytics_export import (
+    EXPORT_CHUNK_SIZE, EXPORT_FORMATS, EXPORT_TABLES, ExportUnavailable, default_until, parse_watermark,
+    stream_export
+)
+from assets import build_assets
+from extensions import db
+from geo import backfill_locations, rebuild_clusters, record_location, resolve_location
+from images import variant_keys
+from importer import IMPORT_CHUNK_SIZE, IMPORT_FORMATS, import_issues
+from migrations import MIGRATIONS, applied_versions, migrate
+from models import Issue, IssueStatusLog, User
+from outbox import drain, start_dispatcher
+from storage import collect_garbage
+from work_queue import rebuild_queue, refresh_queue_fields, start_sla_sweeper, sweep_sla_breaches
+
+
+def create_sample_users():
+    """Create sample users and a sample issue if they don't exist"""
+    # Create admin user
+    admin_user = User.query.filter_by(username='admin').first()
+    if not admin_user:
+        admin_user = User(
+            username='admin',
+            password_hash=generate_password_hash('admin123'),
+            role='admin',
+            name='System Administrator',
+            email='admin@civiccare.com'
+        )
+        db.session.add(admin_user)
+
+    # Create regular user
+    regular_user = User.query.filter_by(username='user').first()
+    if not regular_user:
+        regular_user = User(
+            username='user',
+            password_hash=generate_password_hash('password'),
+            role='user',
+            name='Demo User',
+            email='user@civiccare.com'
+        )
+        db.session.add(regular_user)
+
+    # Create a sample issue if none exist
+    if Issue.query.count() == 0 and regular_user:
+        sample_issue = Issue(
+            user_id=regular_user.id,
+            issue_type='Potholes / Road Damage',
+            description='Large pothole on the main road causing traffic issues.',
+            area='T. Nagar',
+            street='Anna Salai',
+            landmark='Near T. Nagar Bus Stand',
+            current_status='Pending',
+            **resolve_location('T. Nagar')
+        )
+        [analysis] = current_app.extensions['analysis'].analyze_batch([sample_issue])
+        for name, value in analysis.columns().items():
+            setattr(sample_issue, name, value)
+        refresh_queue_fields(sample_issue)
+        db.session.add(sample_issue)
+        db.session.flush()
+        record_location(sample_issue)
+
+        status_log = IssueStatusLog(
+            issue_id=sample_issue.id,
+            status='Pending',
+            remarks='Sample issue created for demo.'
+        )
+        db.session.add(status_log)
+
+    db.session.commit()
+
+
+def init_commands(app):
+    """Register the CLI commands on the app (`flask --app app <command>`)."""
+    @app.cli.command('outbox-worker')
+    @click.option('--once', is_flag=True, help='Drain the outbox once and exit.')
+    @click.option('--interval', default=10.0, show_default=True, help='Seconds between polls.')
+    def outbox_worker(once, interval):
+        """Send queued notification emails (run instead of the in-process thread)."""
+        if once:
+            click.echo(f"Processed {drain(app.config['MAIL_OUTBOX_BATCH_SIZE'])} emails.")
+            return
+        app.config['MAIL_OUTBOX_INTERVAL'] = interval
+        start_dispatcher(app).join()
+
+    @app.cli.command('dedup-index')
+    def dedup_index():
+        """Build the duplicate-detection index, backfilling signatures of older issues."""
+        index = app.extensions['dedup']
+        backfilled = index.sync()
+        db.session.commit()
+        click.echo(f"Indexed {len(index)} open issues ({backfilled} signatures backfilled).")
+
+    @app.cli.command('analysis-rescore')
+    @click.option('--batch-size', default=500, show_default=True, help='Issues analysed per batch.')
+    def analysis_rescore(batch_size):
+        """Re-run issue analysis over every issue (e.g. after changing rules or the model)."""
+        rescored = rescore_issues(app.extensions['analysis'], batch_size=batch_size)
+        rebuild_queue(batch_size=batch_size)
+        click.echo(f"Rescored {rescored} issues and rebuilt the work queue.")
+
+    @app.cli.command('sla-sweep')
+    @click.option('--once', is_flag=True, help='Sweep once and exit.')
+    @click.option('--interval', default=300.0, show_default=True, help='Seconds between sweeps.')
+    def sla_sweep(once, interval):
+        """Flag open issues past their SLA and notify admins (run instead of the in-process thread)."""
+        if once:
+            click.echo(f"Flagged {len(sweep_sla_breaches())} issues past their SLA.")
+            return
+        app.config['SLA_SWEEP_INTERVAL'] = interval
+        start_sla_sweeper(app).join()
+
+    @app.cli.command('archive-issues')
+    @click.option('--once', is_flag=True, help='Archive once and exit.')
+    @click.option('--interval', default=3600.0, show_default=True, help='Seconds between runs.')
+    @click.option('--older-than', 'after_days', type=float, default=None,
+                  help='Days since resolution (default: ARCHIVE_AFTER_DAYS).')
+    def archive_issues(once, interval, after_days):
+        """Move long-resolved issues to the archive tables (run instead of the in-process thread)."""
+        if after_days is not None:
+            app.config['ARCHIVE_AFTER_DAYS'] = after_days
+        if once:
+            moved = archive_resolved(app.config['ARCHIVE_AFTER_DAYS'], app.config['ARCHIVE_BATCH_SIZE'])
+            click.echo(f"Archived {moved} issues resolved more than {app.config['ARCHIVE_AFTER_DAYS']:g} days ago.")
+            return
+        app.config['ARCHIVE_INTERVAL'] = interval
+        start_archiver(app).join()
+
+    @app.cli.command('geo-backfill')
+    def geo_backfill():
+        """Geocode issues without coordinates from their area and rebuild the map cluster counts."""
+        geocoded = backfill_locations()
+        cells = rebuild_clusters()
+        click.echo(f"Geocoded {geocoded} issues; {cells} cluster cells.")
+
+    @app.cli.command('import-issues')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS), default=None,
+                  help='Defaults to the file extension (.csv, .jsonl).')
+    @click.option('--username', default='admin', show_default=True, help='Account the complaints are filed under.')
+    @click.option('--chunk-size', default=IMPORT_CHUNK_SIZE, show_default=True)
+    def import_issues_command(path, fmt, username, chunk_size):
+        """Import legacy complaints from a CSV or JSON Lines file, streamed in chunks."""
+        fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower().replace('ndjson', 'jsonl')
+        if fmt not in IMPORT_FORMATS:
+            raise click.UsageError('Cannot tell the format from the file name; pass --format.')
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.UsageError(f'No user named {username!r}.')
+        with open(path, newline='', encoding='utf-8-sig') as stream:
+            result = import_issues(stream, fmt, user.id, app.extensions['analysis'], chunk_size=chunk_size)
+        click.echo(f"Imported {result.imported} issues; skipped {result.skipped}.")
+        for error in result.errors:
+            click.echo(f"  {error}")
+
+    @app.cli.command('export-analytics')
+    @click.argument('output_dir', type=click.Path(file_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='csv', show_default=True)
+    @click.option('--table', 'tables', type=click.Choice(list(EXPORT_TABLES)), multiple=True,
+                  help='Repeat for several tables; defaults to all.')
+    @click.option('--since', default=None, help='Only rows changed after this ISO-8601 watermark.')
+    @click.option('--state-file', type=click.Path(dir_okay=False), default=None,
+                  help='JSON file holding each table\'s last watermark; read for --since and updated after each export.')
+    @click.option('--chunk-size', default=EXPORT_CHUNK_SIZE, show_default=True)
+    def export_analytics_command(output_dir, fmt, tables, since, state_file, chunk_size):
+        """Stream Issue, IssueStatusLog and Feedback rows to CSV/Parquet files (full or incremental)."""
+        state = {}
+        if state_file and os.path.exists(state_file):
+            with open(state_file) as fh:
+                state = json.load(fh)
+        os.makedirs(output_dir, exist_ok=True)
+        until = default_until()
+        for table in tables or EXPORT_TABLES:
+            try:
+                table_since = parse_watermark(since or state.get(table))
+            except ValueError:
+                raise click.UsageError('--since must be an ISO-8601 timestamp.')
+            path = os.path.join(output_dir, f'{table}_{until:%Y%m%d_%H%M%S}.{fmt}')
+            try:
+                with open(path, 'wb') as fh:
+                    for chunk in stream_export(table, fmt, since=table_since, until=until, chunk_size=chunk_size):
+                        fh.write(chunk)
+            except ExportUnavailable as exc:
+                os.remove(path)
+                raise click.ClickException(str(exc))
+            state[table] = until.isoformat()
+            if state_file:
+                with open(state_file, 'w') as fh:
+                    json.dump(state, fh, indent=2)
+            click.echo(f"{table}: {path}" + (f" (since {table_since.isoformat()})" if table_since else ''))
+        click.echo(f"Watermark: {until.isoformat()}")
+
+    @app.cli.command('storage-gc')
+    def storage_gc():
+        """Delete uploads (and their variants) no longer referenced by any issue."""
+        removed = collect_garbage(app.extensions['storage'], derived_keys=variant_keys)
+        click.echo(f"Removed {removed} unreferenced uploads.")
+
+    @app.cli.command('assets-build')
+    def assets_build():
+        """Fingerprint and precompress the CSS/JS under static/ and rewrite the asset manifest."""
+        manifest = build_assets(app.static_folder)
+        for source, hashed in sorted(manifest['files'].items()):
+            click.echo(f"{source} -> {hashed}")
+
+    @app.cli.command('db-upgrade')
+    def db_upgrade():
+        """Apply pending schema migrations."""
+        applied = migrate()
+        for migration in applied:
+            click.echo(f"Applied {migration.version}: {migration.description}")
+        click.echo(f"{len(applied)} migration(s) applied.")
+
+    @app.cli.command('db-status')
+    def db_status():
+        """List schema migrations and whether each has been applied."""
+        applied = applied_versions()
+        for migration in MIGRATIONS:
+            state = 'applied' if migration.version in applied else 'pending'
+            click.echo(f"{migration.version:>4}  {state:<8} {migration.description}")
@@ -0,0 +1,143 @@
+"""
+Application settings. Every value can be overridden with an environment
+variable of the same name (booleans accept 1/0, true/false, yes/no), so
+deployments configure the app without editing code.
+"""
+import os
+
+
+def env_str(name, default=None):
+    return os.environ.get(name, default)
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value not in (None, '') else default
+
+
+def env_bool(name, default):
+    value = os.environ.get(name)
+    if value in (None, ''):
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def database_url(default='sqlite:///civic_issues.db'):
+    url = os.environ.get('DATABASE_URL', default)
+    # Many hosting providers still hand out the pre-SQLAlchemy-1.4 scheme
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+class Config:
+    SECRET_KEY = env_str('SECRET_KEY', 'change-this-secret-key')
+    SQLALCHEMY_DATABASE_URI = database_url()
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Connection pool (see database.engine_options)
+    DB_POOL_SIZE = env_int('DB_POOL_SIZE', 10)
+    DB_MAX_OVERFLOW = env_int('DB_MAX_OVERFLOW', 20)
+    DB_POOL_TIMEOUT = env_int('DB_POOL_TIMEOUT', 30)
+    DB_POOL_RECYCLE = env_int('DB_POOL_RECYCLE', 1800)
+    # SQLite only: how long a writer waits for the lock, and memory-mapped I/O / page cache sizes
+    SQLITE_BUSY_TIMEOUT_MS = env_int('SQLITE_BUSY_TIMEOUT_MS', 5000)
+    SQLITE_MMAP_SIZE = env_int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+    SQLITE_CACHE_SIZE_KB = env_int('SQLITE_CACHE_SIZE_KB', 16 * 1024)
+
+    # Email configuration placeholders (to be configured in README)
+    MAIL_SERVER = env_str('MAIL_SERVER', 'smtp.example.com')
+    MAIL_PORT = env_int('MAIL_PORT', 587)
+    MAIL_USE_TLS = env_bool('MAIL_USE_TLS', True)
+    MAIL_USERNAME = env_str('MAIL_USERNAME', 'you@example.com')
+    MAIL_PASSWORD = env_str('MAIL_PASSWORD', 'your-password')
+    MAIL_DEFAULT_SENDER = (' Civic Issue Management System', env_str('MAIL_DEFAULT_SENDER', 'you@example.com'))
+    # Notifications are written to an outbox table and sent by a background dispatcher
+    MAIL_OUTBOX_THREAD = env_bool('MAIL_OUTBOX_THREAD', True)
+    MAIL_OUTBOX_INTERVAL = env_float('MAIL_OUTBOX_INTERVAL', 10.0)
+    MAIL_OUTBOX_BATCH_SIZE = env_int('MAIL_OUTBOX_BATCH_SIZE', 50)
+
+    # Issues resolved more than ARCHIVE_AFTER_DAYS ago move to the archive tables (see archive.py),
+    # in ARCHIVE_DATABASE_URL (e.g. sqlite:///civic_archive.db) or, when unset, the main database
+    ARCHIVE_DATABASE_URL = env_str('ARCHIVE_DATABASE_URL')
+    ARCHIVE_THREAD = env_bool('ARCHIVE_THREAD', True)
+    ARCHIVE_INTERVAL = env_float('ARCHIVE_INTERVAL', 3600.0)
+    ARCHIVE_AFTER_DAYS = env_float('ARCHIVE_AFTER_DAYS', 90.0)
+    ARCHIVE_BATCH_SIZE = env_int('ARCHIVE_BATCH_SIZE', 500)
+
+    # Rendered PDF reports are cached under instance/pdf_cache by default
+    PDF_CACHE_DIR = env_str('PDF_CACHE_DIR')
+    PDF_CACHE_MAX_BYTES = env_int('PDF_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+    # The combined PDF export is drawn in one document before the first byte is sent, so larger
+    # selections are pointed to the ZIP export, which streams (0 = no cap)
+    COMBINED_PDF_MAX_ISSUES = env_int('COMBINED_PDF_MAX_ISSUES', 200)
+
+    # Rendered issue cards / admin rows (see fragment_cache.py): 'memory' is a per-process LRU,
+    # 'redis' shares fragments between workers, 'database' does so through a table (no extra
+    # service), 'none' renders every time
+    FRAGMENT_CACHE_BACKEND = env_str('FRAGMENT_CACHE_BACKEND', 'memory')
+    FRAGMENT_CACHE_REDIS_URL = env_str('FRAGMENT_CACHE_REDIS_URL')
+    FRAGMENT_CACHE_MAX_ENTRIES = env_int('FRAGMENT_CACHE_MAX_ENTRIES', 5000)
+    FRAGMENT_CACHE_TTL = env_float('FRAGMENT_CACHE_TTL', 600.0)
+
+    # CSS/JS are served under content-hashed names from static/build (see assets.py), rebuilt
+    # at startup when the sources change unless ASSET_AUTO_BUILD is off (`flask assets-build`)
+    ASSET_FINGERPRINTING = env_bool('ASSET_FINGERPRINTING', True)
+    ASSET_AUTO_BUILD = env_bool('ASSET_AUTO_BUILD', True)
+
+    UPLOAD_FOLDER = env_str('UPLOAD_FOLDER', os.path.join('static', 'uploads'))
+    # 'local' stores uploads under UPLOAD_FOLDER; 's3' uses an S3-compatible bucket (requires boto3)
+    STORAGE_BACKEND = env_str('STORAGE_BACKEND', 'local')
+    S3_BUCKET = env_str('S3_BUCKET')
+    S3_ENDPOINT_URL = env_str('S3_ENDPOINT_URL')
+    S3_PREFIX = env_str('S3_PREFIX', '')
+    S3_PUBLIC_URL = env_str('S3_PUBLIC_URL')
+    MAX_CONTENT_LENGTH = env_int('MAX_CONTENT_LENGTH', 16 * 1024 * 1024)
+
+    # Admission control (see rate_limit.py): per-endpoint budgets per IP, session and user, counted
+    # in this process ('memory') or shared between workers ('redis', 'database'). RATE_LIMITS overrides entries of
+    # rate_limit.DEFAULT_RATE_LIMITS, e.g. "POST auth.login = ip:10/minute, user:5/minute"
+    RATE_LIMIT_ENABLED = env_bool('RATE_LIMIT_ENABLED', True)
+    RATE_LIMIT_BACKEND = env_str('RATE_LIMIT_BACKEND', 'memory')
+    RATE_LIMIT_REDIS_URL = env_str('RATE_LIMIT_REDIS_URL')
+    RATE_LIMITS = env_str('RATE_LIMITS')
+    # Number of reverse proxies in front of the app whose X-Forwarded-For is trusted for client IPs
+    PROXY_FIX_X_FOR = env_int('PROXY_FIX_X_FOR', 0)
+    # Per-process caps on concurrent PDF renders, bulk exports and image uploads (0 = unlimited);
+    # a request waits ADMISSION_WAIT_SECONDS for a slot, then gets a 429 with ADMISSION_RETRY_AFTER
+    PDF_RENDER_CONCURRENCY = env_int('PDF_RENDER_CONCURRENCY', 2)
+    EXPORT_CONCURRENCY = env_int('EXPORT_CONCURRENCY', 1)
+    IMAGE_UPLOAD_CONCURRENCY = env_int('IMAGE_UPLOAD_CONCURRENCY', 4)
+    ADMISSION_WAIT_SECONDS = env_float('ADMISSION_WAIT_SECONDS', 0.5)
+    ADMISSION_RETRY_AFTER = env_int('ADMISSION_RETRY_AFTER', 5)
+
+    # ASGI mode (see asgi.py): threads running the Flask app for the paths without an async view
+    ASGI_WSGI_THREADS = env_int('ASGI_WSGI_THREADS', 10)
+    # ... and filing reports from the async API (raise it for PostgreSQL; SQLite takes one writer at a time)
+    ASGI_WRITE_THREADS = env_int('ASGI_WRITE_THREADS', 1)
+
+    # Periodic check for open issues past their resolution SLA (see work_queue.py)
+    SLA_SWEEP_THREAD = env_bool('SLA_SWEEP_THREAD', True)
+    SLA_SWEEP_INTERVAL = env_float('SLA_SWEEP_INTERVAL', 300.0)
+
+    # Optional scikit-learn text classifiers for issue analysis (see analysis.ClassifierAnalyzer)
+    ANALYSIS_MODEL_PATH = env_str('ANALYSIS_MODEL_PATH')
+    ANALYSIS_MIN_CONFIDENCE = env_float('ANALYSIS_MIN_CONFIDENCE', 0.6)
+
+    # Live dashboard updates (see events.py): 'database' relays events between worker
+    # processes through the EventLog table, 'redis' uses Redis pub/sub, 'memory' is single-process
+    EVENTS_BACKEND = env_str('EVENTS_BACKEND', 'database')
+    EVENTS_REDIS_URL = env_str('EVENTS_REDIS_URL')
+    EVENTS_POLL_INTERVAL = env_float('EVENTS_POLL_INTERVAL', 1.0)
+
+    # Request instrumentation (see instrumentation.py): /metrics is open to admins and to
+    # scrapers sending "Authorization: Bearer <METRICS_TOKEN>"; admins can add ?profile=1 to a page
+    METRICS_TOKEN = env_str('METRICS_TOKEN')
+    PROFILING_ENABLED = env_bool('PROFILING_ENABLED', True)
+    # Log a request as a possible N+1 when one SQL statement runs this many times in it
+    N_PLUS_ONE_THRESHOLD = env_int('N_PLUS_ONE_THRESHOLD', 10)
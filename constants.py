@@ -0,0 +1,81 @@
+CHENNAI_AREAS = [
+    "T. Nagar", "Adyar", "Anna Nagar", "Velachery", "Tambaram",
+    "Poonamallee", "Mylapore", "Kodambakkam", "Nungambakkam", "Guindy",
+    "Perambur", "Royapettah", "Chromepet", "Thiruvanmiyur", "Porur",
+    "Saidapet", "Ambattur", "Washermanpet", "Besant Nagar"
+]
+
+ISSUE_TYPES = [
+    "Potholes / Road Damage",
+    "Garbage / Waste Management",
+    "Street Light Not Working",
+    "Water Logging / Drainage",
+    "Illegal Parking / Encroachment",
+    "Public Toilet Maintenance",
+    "Tree Fall / Pruning Required",
+    "Water Supply Issue",
+    "Noise Pollution",
+    "Construction Debris",
+    "Other"
+]
+
+ISSUE_STATUSES = ["Pending", "In Progress", "Resolved"]
+
+SEVERITY_LEVELS = ["Low", "Moderate", "High"]
+PRIORITY_LEVELS = ["Low", "Medium", "High"]
+
+# Civic department responsible for each issue type
+ISSUE_DEPARTMENTS = {
+    "Potholes / Road Damage": "Roads & Bridges",
+    "Garbage / Waste Management": "Solid Waste Management",
+    "Street Light Not Working": "Electrical",
+    "Water Logging / Drainage": "Storm Water Drains",
+    "Illegal Parking / Encroachment": "Traffic & Enforcement",
+    "Public Toilet Maintenance": "Public Health",
+    "Tree Fall / Pruning Required": "Parks & Gardens",
+    "Water Supply Issue": "Water Supply & Sewerage",
+    "Noise Pollution": "Pollution Control",
+    "Construction Debris": "Solid Waste Management",
+    "Other": "General Administration",
+}
+
+# Resolution SLA per issue type, in hours from the report
+ISSUE_SLA_HOURS = {
+    "Potholes / Road Damage": 72,
+    "Garbage / Waste Management": 24,
+    "Street Light Not Working": 48,
+    "Water Logging / Drainage": 24,
+    "Illegal Parking / Encroachment": 48,
+    "Public Toilet Maintenance": 24,
+    "Tree Fall / Pruning Required": 24,
+    "Water Supply Issue": 24,
+    "Noise Pollution": 72,
+    "Construction Debris": 72,
+    "Other": 120,
+}
+
+# Approximate centre (latitude, longitude) of each area, used to geocode reports without a GPS fix
+AREA_COORDINATES = {
+    "T. Nagar": (13.0418, 80.2341),
+    "Adyar": (13.0012, 80.2565),
+    "Anna Nagar": (13.0850, 80.2101),
+    "Velachery": (12.9815, 80.2180),
+    "Tambaram": (12.9249, 80.1000),
+    "Poonamallee": (13.0473, 80.0945),
+    "Mylapore": (13.0368, 80.2676),
+    "Kodambakkam": (13.0521, 80.2255),
+    "Nungambakkam": (13.0569, 80.2425),
+    "Guindy": (13.0067, 80.2206),
+    "Perambur": (13.1210, 80.2320),
+    "Royapettah": (13.0540, 80.2640),
+    "Chromepet": (12.9516, 80.1462),
+    "Thiruvanmiyur": (12.9830, 80.2594),
+    "Porur": (13.0382, 80.1565),
+    "Saidapet": (13.0213, 80.2231),
+    "Ambattur": (13.1143, 80.1548),
+    "Washermanpet": (13.1148, 80.2872),
+    "Besant Nagar": (13.0002, 80.2668),
+}
+
+# Browser positions outside this box (south, west, north, east) are ignored
+CHENNAI_BOUNDS = (12.80, 79.95, 13.30, 80.35)
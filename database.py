@@ -0,0 +1,111 @@
+"""
+Engine configuration: pool settings per backend and SQLite pragmas applied
+to every new connection, for the main database and the archive bind
+(ARCHIVE_DATABASE_URL, the main database unless set; see archive.py), and
+the matching async engines for the ASGI app (asgi.py).
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from extensions import db
+
+
+def _is_memory_sqlite(url) -> bool:
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(config, database_url=None) -> dict:
+    """Engine options for database_url (default: SQLALCHEMY_DATABASE_URI)."""
+    url = make_url(database_url or config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite':
+        if _is_memory_sqlite(url):
+            return {}
+        return {
+            # One writer at a time: waiting in pysqlite's busy handler beats
+            # failing with "database is locked" under concurrent workers
+            'connect_args': {
+                'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000,
+                'check_same_thread': False,
+            },
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+        }
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        # Drop connections the server or a proxy (pgbouncer, load balancer) closed
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+    }
+
+
+def sqlite_pragmas(config) -> dict:
+    return {
+        # Readers never block the writer and vice versa
+        'journal_mode': 'WAL',
+        # Durable at checkpoints; safe with WAL and far fewer fsyncs than FULL
+        'synchronous': 'NORMAL',
+        'busy_timeout': config['SQLITE_BUSY_TIMEOUT_MS'],
+        'mmap_size': config['SQLITE_MMAP_SIZE'],
+        # Negative values are KiB rather than pages
+        'cache_size': -config['SQLITE_CACHE_SIZE_KB'],
+        'temp_store': 'MEMORY',
+    }
+
+
+def _apply_pragmas(pragmas: dict):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+    return on_connect
+
+
+def init_database(app):
+    """Set engine options from the config, bind Flask-SQLAlchemy and tune SQLite connections."""
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **engine_options(app.config),
+        **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+    }
+    archive_url = app.config.get('ARCHIVE_DATABASE_URL') or app.config['SQLALCHEMY_DATABASE_URI']
+    app.config['SQLALCHEMY_BINDS'] = {
+        'archive': {'url': archive_url, **engine_options(app.config, archive_url)},
+        **app.config.get('SQLALCHEMY_BINDS', {}),
+    }
+    db.init_app(app)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.url.get_backend_name() == 'sqlite' and not _is_memory_sqlite(engine.url):
+                event.listen(engine, 'connect', _apply_pragmas(sqlite_pragmas(app.config)))
+
+
+# Async drivers for the ASGI app (asgi.py), by backend
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'postgresql': 'psycopg'}
+
+
+def async_database_url(database_url: str):
+    """database_url with the backend's async driver: sqlite+aiosqlite, postgresql+psycopg (psycopg 3)."""
+    url = make_url(database_url)
+    if url.get_dialect().is_async:
+        return url
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS or _is_memory_sqlite(url):
+        raise ValueError(f"No async driver for {url.drivername} (use a file or server database)")
+    return url.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}')
+
+
+def create_async_engine(config, database_url=None):
+    """An AsyncEngine with the same pool options and SQLite pragmas as the app's engines."""
+    from sqlalchemy.ext.asyncio import create_async_engine as _create_async_engine
+
+    database_url = database_url or config['SQLALCHEMY_DATABASE_URI']
+    engine = _create_async_engine(async_database_url(database_url), **engine_options(config, database_url))
+    if engine.url.get_backend_name() == 'sqlite':
+        event.listen(engine.sync_engine, 'connect', _apply_pragmas(sqlite_pragmas(config)))
+    return engine
@@ -0,0 +1,227 @@
+import hashlib
+import re
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from extensions import db
+from models import Issue
+
+
+# 16 bands x 4 rows: pairs above ~0.5 estimated Jaccard similarity become candidates
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# Estimated Jaccard similarity at which a new report is linked to an open issue
+DUPLICATE_THRESHOLD = 0.6
+
+SHINGLE_SIZE = 4
+BUILD_BATCH_SIZE = 1000
+
+_MASK64 = (1 << 64) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Multiply-shift hash family: h_i(x) = ((a_i * x + b_i) mod 2^64) >> 32, fixed seeds so
+# signatures stored in the database stay comparable across processes and restarts
+_PERMUTATIONS = [
+    (
+        int.from_bytes(hashlib.blake2b(f'a{i}'.encode(), digest_size=8).digest(), 'big') | 1,
+        int.from_bytes(hashlib.blake2b(f'b{i}'.encode(), digest_size=8).digest(), 'big'),
+    )
+    for i in range(NUM_PERM)
+]
+
+_WORD_RE = re.compile(r'[^\W_]+', re.UNICODE)
+_STOPWORDS = {'a', 'an', 'and', 'at', 'is', 'near', 'of', 'on', 'the', 'there', 'to', 'very'}
+
+
+def shingles(*parts: Optional[str]) -> set:
+    """Character shingles of the normalised text (case, punctuation and filler words ignored)."""
+    words = [w for w in _WORD_RE.findall(' '.join(p for p in parts if p).lower()) if w not in _STOPWORDS]
+    text = ' '.join(words)
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash(tokens: Iterable[str]) -> bytes:
+    """MinHash signature of a shingle set as NUM_PERM unsigned 32-bit values."""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'big')
+        for token in tokens
+    ]
+    if not hashes:
+        return array('I', [_MAX_HASH] * NUM_PERM).tobytes()
+    return array('I', [
+        # min before the shift: same result as shifting every value, one shift per permutation
+        min([(a * h + b) & _MASK64 for h in hashes]) >> 32
+        for a, b in _PERMUTATIONS
+    ]).tobytes()
+
+
+def issue_signature(issue) -> bytes:
+    return minhash(shingles(issue.description, issue.street, issue.landmark))
+
+
+def similarity(sig_a: bytes, sig_b: bytes) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    a, b = array('I', sig_a), array('I', sig_b)
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def _band_keys(signature: bytes) -> List[int]:
+    width = ROWS * 4
+    return [hash(signature[i * width:(i + 1) * width]) for i in range(BANDS)]
+
+
+def _is_open(issue) -> bool:
+    return (issue.current_status or 'Pending') != 'Resolved'
+
+
+class DuplicateIndex:
+    """
+    In-memory LSH index over the MinHash signatures of open, canonical
+    issues, partitioned by (area, issue_type). Built from the signatures
+    stored on Issue.dedup_signature, then kept current incrementally:
+    new issues are added as they are reported, and issues other workers
+    created are picked up by id on the next lookup.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._high_water = 0
+        self._signatures: Dict[int, Tuple[tuple, bytes]] = {}
+        # (area, issue_type) -> one dict per band: band hash -> issue id, or list of ids
+        self._partitions: Dict[tuple, List[dict]] = {}
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _insert(self, issue_id: int, partition: tuple, signature: bytes):
+        if issue_id in self._signatures:
+            return
+        self._signatures[issue_id] = (partition, signature)
+        bands = self._partitions.setdefault(partition, [{} for _ in range(BANDS)])
+        for bucket, key in zip(bands, _band_keys(signature)):
+            current = bucket.get(key)
+            if current is None:
+                bucket[key] = issue_id
+            elif isinstance(current, list):
+                current.append(issue_id)
+            else:
+                bucket[key] = [current, issue_id]
+
+    def discard(self, issue_id: int):
+        with self._lock:
+            entry = self._signatures.pop(issue_id, None)
+            if entry is None:
+                return
+            partition, signature = entry
+            bands = self._partitions[partition]
+            for bucket, key in zip(bands, _band_keys(signature)):
+                current = bucket.get(key)
+                if isinstance(current, list):
+                    current.remove(issue_id)
+                    if len(current) == 1:
+                        bucket[key] = current[0]
+                elif current == issue_id:
+                    del bucket[key]
+
+    def add(self, issue):
+        """Index an open, canonical issue (one whose dedup_signature is set)."""
+        if issue.duplicate_of_id or not _is_open(issue) or not issue.dedup_signature:
+            return
+        with self._lock:
+            # The high-water mark is left to _load: issues other workers committed below
+            # this id are not indexed here yet, and the next sync() skips this one
+            self._insert(issue.id, (issue.area, issue.issue_type), issue.dedup_signature)
+
+    def _load(self, after_id: int):
+        """
+        Index open canonical issues with id > after_id. Signatures missing on
+        rows created before duplicate detection are computed and written back
+        in the caller's transaction.
+        """
+        query = (
+            db.session.query(
+                Issue.id, Issue.area, Issue.issue_type, Issue.dedup_signature,
+                Issue.description, Issue.street, Issue.landmark
+            )
+            .filter(
+                Issue.id > after_id,
+                Issue.duplicate_of_id.is_(None),
+                Issue.current_status != 'Resolved'
+            )
+            .order_by(Issue.id)
+        )
+        backfill = []
+        for row in query.yield_per(BUILD_BATCH_SIZE):
+            signature = row.dedup_signature
+            if signature is None:
+                signature = issue_signature(row)
+                backfill.append({'id': row.id, 'dedup_signature': signature})
+            self._insert(row.id, (row.area, row.issue_type), signature)
+            self._high_water = max(self._high_water, row.id)
+        if backfill:
+            db.session.bulk_update_mappings(Issue, backfill)
+        return len(backfill)
+
+    def sync(self) -> int:
+        """Build the index on first use, afterwards pick up issues created elsewhere."""
+        with self._lock:
+            return self._load(self._high_water)
+
+    def candidates(self, partition: tuple, signature: bytes) -> List[Tuple[int, float]]:
+        """Indexed issues sharing at least one band, with their estimated similarity, best first."""
+        with self._lock:
+            bands = self._partitions.get(partition)
+            if not bands:
+                return []
+            ids = set()
+            for bucket, key in zip(bands, _band_keys(signature)):
+                current = bucket.get(key)
+                if isinstance(current, list):
+                    ids.update(current)
+                elif current is not None:
+                    ids.add(current)
+            scored = [(issue_id, similarity(signature, self._signatures[issue_id][1])) for issue_id in ids]
+        return sorted(scored, key=lambda item: (-item[1], item[0]))
+
+    def find_duplicate(self, issue, threshold: float = DUPLICATE_THRESHOLD) -> Optional[Tuple[int, float]]:
+        """
+        The open canonical issue this one most likely duplicates, as
+        (issue_id, similarity), or None. Sets issue.dedup_signature; call it
+        before the new issue is flushed so it cannot match itself.
+        """
+        if issue.dedup_signature is None:
+            issue.dedup_signature = issue_signature(issue)
+        self.sync()
+
+        matches = [
+            (issue_id, score)
+            for issue_id, score in self.candidates((issue.area, issue.issue_type), issue.dedup_signature)
+            if score >= threshold and issue_id != issue.id
+        ]
+        if not matches:
+            return None
+
+        # Another worker may have resolved or re-linked a candidate since it was indexed
+        still_open = {
+            issue_id for (issue_id,) in db.session.query(Issue.id).filter(
+                Issue.id.in_([issue_id for issue_id, _ in matches]),
+                Issue.duplicate_of_id.is_(None),
+                Issue.current_status != 'Resolved'
+            )
+        }
+        for issue_id, score in matches:
+            if issue_id in still_open:
+                return issue_id, score
+            self.discard(issue_id)
+        return None
+
+
+def init_dedup(app) -> DuplicateIndex:
+    index = DuplicateIndex()
+    app.extensions['dedup'] = index
+    return index
@@ -0,0 +1,351 @@
+import asyncio
+import itertools
+import json
+import logging
+import queue
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Iterator, List, Optional
+
+from flask import Blueprint, current_app, jsonify, request, session
+from sqlalchemy import delete, func, insert, select
+
+from extensions import db
+from models import EventLog
+
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 256
+HEARTBEAT_SECONDS = 15.0
+REPLAY_LIMIT = 500
+# Event fields only sent to admin listeners: citizens see each other's issues, not who reported them
+ADMIN_ONLY_FIELDS = frozenset({'citizen'})
+# EventLog rows older than this are pruned by the database backend's poller
+EVENT_RETENTION = timedelta(hours=1)
+
+
+@dataclass
+class Event:
+    id: int
+    type: str
+    data: dict
+
+    def to_sse(self, admin: bool = False) -> str:
+        data = self.data if admin else {key: value for key, value in self.data.items() if key not in ADMIN_ONLY_FIELDS}
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    """One listener's bounded queue; a listener that falls too far behind is told to reload."""
+
+    def __init__(self, maxsize: int = SUBSCRIBER_QUEUE_SIZE):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def deliver(self, event: Event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout: float) -> Optional[Event]:
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscription:
+    """Subscription for a listener served by an event loop (asgi.py); safe to deliver to from any thread."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int = SUBSCRIBER_QUEUE_SIZE):
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def deliver(self, event: Event):
+        try:
+            self._loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The loop has shut down; the listener is gone
+            pass
+
+    def _put(self, event: Event):
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout: float) -> Optional[Event]:
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class _Fanout:
+    """Delivers events to the subscriptions of this process."""
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def add(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.add(subscription)
+
+    def remove(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def deliver(self, event: Event):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+
+class MemoryBackend:
+    """In-process only: every subscriber must be served by the publishing process."""
+
+    def __init__(self, fanout: _Fanout):
+        self.fanout = fanout
+        self._ids = itertools.count(1)
+
+    def publish(self, event_type: str, data: dict):
+        self.fanout.deliver(Event(next(self._ids), event_type, data))
+
+    def start(self):
+        pass
+
+    def replay(self, after_id: int) -> List[Event]:
+        return []
+
+
+class RedisBackend:
+    """Redis pub/sub: each process relays the channel to its own subscribers (requires redis-py)."""
+
+    def __init__(self, fanout: _Fanout, url: str, channel: str = 'civiccare:events'):
+        import redis  # optional dependency, only needed for this backend
+
+        self.fanout = fanout
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def publish(self, event_type: str, data: dict):
+        event_id = self.client.incr(f"{self.channel}:id")
+        self.client.publish(self.channel, json.dumps({'id': event_id, 'type': event_type, 'data': data}))
+
+    def start(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='events-redis', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        for message in pubsub.listen():
+            try:
+                payload = json.loads(message['data'])
+                self.fanout.deliver(Event(payload['id'], payload['type'], payload['data']))
+            except (ValueError, KeyError, TypeError):
+                logger.warning("Ignoring malformed event message")
+
+    def replay(self, after_id: int) -> List[Event]:
+        return []
+
+
+class DatabaseBackend:
+    """
+    Stand-in for Redis that needs no extra service: events are appended to
+    the EventLog table and each process polls it for new rows, so
+    subscribers on any gunicorn worker see events published by any other.
+    """
+
+    def __init__(self, fanout: _Fanout, app, poll_interval: float = 1.0):
+        self.fanout = fanout
+        self.app = app
+        self.poll_interval = poll_interval
+        self._poller = None
+        self._lock = threading.Lock()
+
+    def publish(self, event_type: str, data: dict):
+        # Own short transaction, after the change itself was committed
+        with db.engine.begin() as conn:
+            conn.execute(insert(EventLog).values(
+                type=event_type, data=json.dumps(data), created_at=datetime.utcnow()
+            ))
+
+    def start(self):
+        with self._lock:
+            if self._poller is None:
+                # Read synchronously so the first subscriber sees everything published after it subscribed
+                with self.app.app_context(), db.engine.connect() as conn:
+                    last_id = conn.execute(select(func.max(EventLog.id))).scalar() or 0
+                self._poller = threading.Thread(target=self._poll, args=(last_id,), name='events-poller', daemon=True)
+                self._poller.start()
+
+    def _fetch(self, conn, after_id: int, limit: int = REPLAY_LIMIT) -> List[Event]:
+        rows = conn.execute(
+            select(EventLog.id, EventLog.type, EventLog.data)
+            .where(EventLog.id > after_id)
+            .order_by(EventLog.id)
+            .limit(limit)
+        )
+        return [Event(row.id, row.type, json.loads(row.data)) for row in rows]
+
+    def _poll(self, last_id: int):
+        with self.app.app_context():
+            last_pruned = datetime.min
+            while True:
+                try:
+                    with db.engine.begin() as conn:
+                        for event in self._fetch(conn, last_id):
+                            self.fanout.deliver(event)
+                            last_id = event.id
+                        if datetime.utcnow() - last_pruned > EVENT_RETENTION / 4:
+                            last_pruned = datetime.utcnow()
+                            conn.execute(delete(EventLog).where(EventLog.created_at < last_pruned - EVENT_RETENTION))
+                except Exception:  # noqa: BLE001 - keep polling
+                    logger.exception("Event poll failed")
+                threading.Event().wait(self.poll_interval)
+
+    def replay(self, after_id: int) -> List[Event]:
+        with self.app.app_context(), db.engine.connect() as conn:
+            return self._fetch(conn, after_id)
+
+
+class EventBus:
+    """Publish/subscribe front end; the backend decides how events reach other processes."""
+
+    def __init__(self, backend, fanout: _Fanout):
+        self.backend = backend
+        self.fanout = fanout
+
+    def publish(self, event_type: str, **data):
+        try:
+            self.backend.publish(event_type, data)
+        except Exception:  # noqa: BLE001 - live updates are best effort
+            logger.exception("Failed to publish %s event", event_type)
+
+    def subscribe(self) -> Subscription:
+        self.backend.start()
+        subscription = Subscription()
+        self.fanout.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.fanout.remove(subscription)
+
+    def stream(self, last_event_id: Optional[str] = None, heartbeat: float = HEARTBEAT_SECONDS,
+               admin: bool = False) -> Iterator[str]:
+        """
+        SSE body: missed events since Last-Event-ID (if the backend keeps them), then live ones.
+        ADMIN_ONLY_FIELDS are left out unless the listener is an admin.
+        """
+        subscription = self.subscribe()
+        try:
+            yield 'retry: 3000\n\n'
+            replayed = 0
+            if last_event_id and last_event_id.isdigit():
+                for event in self.backend.replay(int(last_event_id)):
+                    replayed = event.id
+                    yield event.to_sse(admin)
+            while True:
+                event = subscription.get(timeout=heartbeat)
+                if subscription.overflowed:
+                    yield 'event: reset\ndata: {}\n\n'
+                    return
+                if event is None:
+                    yield ': keepalive\n\n'
+                elif event.id > replayed:
+                    yield event.to_sse(admin)
+        finally:
+            self.unsubscribe(subscription)
+
+    async def astream(self, last_event_id: Optional[str] = None, heartbeat: float = HEARTBEAT_SECONDS,
+                      admin: bool = False) -> AsyncIterator[str]:
+        """stream() for async servers: a listener costs a coroutine rather than a worker thread."""
+        # The backends' start and replay may query the database
+        await asyncio.to_thread(self.backend.start)
+        subscription = AsyncSubscription(asyncio.get_running_loop())
+        self.fanout.add(subscription)
+        try:
+            yield 'retry: 3000\n\n'
+            replayed = 0
+            if last_event_id and last_event_id.isdigit():
+                for event in await asyncio.to_thread(self.backend.replay, int(last_event_id)):
+                    replayed = event.id
+                    yield event.to_sse(admin)
+            while True:
+                event = await subscription.get(timeout=heartbeat)
+                if subscription.overflowed:
+                    yield 'event: reset\ndata: {}\n\n'
+                    return
+                if event is None:
+                    yield ': keepalive\n\n'
+                elif event.id > replayed:
+                    yield event.to_sse(admin)
+        finally:
+            self.unsubscribe(subscription)
+
+
+def issue_event_data(issue) -> dict:
+    """What dashboards need to patch an issue into the page."""
+    return {
+        'id': issue.id,
+        'issue_type': issue.issue_type,
+        'area': issue.area,
+        'street': issue.street,
+        'landmark': issue.landmark,
+        'description': issue.description,
+        'status': issue.current_status,
+        'priority': issue.priority,
+        'department': issue.department,
+        'duplicate_of_id': issue.duplicate_of_id,
+        # Admin rows only, see ADMIN_ONLY_FIELDS
+        'citizen': (issue.user.name or 'Citizen') if issue.user else 'Citizen',
+        'created_at': issue.created_at.strftime('%d %b %Y, %I:%M %p') if issue.created_at else None,
+    }
+
+
+def init_events(app) -> EventBus:
+    fanout = _Fanout()
+    backend_name = app.config.get('EVENTS_BACKEND', 'database')
+    if backend_name == 'memory':
+        backend = MemoryBackend(fanout)
+    elif backend_name == 'redis':
+        backend = RedisBackend(fanout, app.config['EVENTS_REDIS_URL'])
+    elif backend_name == 'database':
+        backend = DatabaseBackend(fanout, app, app.config.get('EVENTS_POLL_INTERVAL', 1.0))
+    else:
+        raise ValueError(f"Unknown EVENTS_BACKEND: {backend_name}")
+    bus = EventBus(backend, fanout)
+    app.extensions['events'] = bus
+    return bus
+
+
+events = Blueprint('events', __name__)
+
+
+@events.route('/events')
+def event_stream():
+    """Server-Sent Events feed of issue changes for the open dashboards."""
+    if 'user_id' not in session:
+        return jsonify(error='Login required.'), 401
+    stream = current_app.extensions['events'].stream(
+        request.headers.get('Last-Event-ID'), admin=session.get('role') == 'admin'
+    )
+    response = current_app.response_class(stream, mimetype='text/event-stream')
+    # Proxies must neither buffer nor cache the stream
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,326 @@
+"""
+Cache of rendered per-issue HTML fragments: the citizen dashboard's issue
+cards and the admin dashboard's table rows. A page of cards is then mostly
+dictionary lookups instead of Jinja work.
+
+Keys carry the issue's version: id, updated_at, the latest status log and
+feedback ids, and the citizen's contact details. These are read from the
+eagerly loaded relationships, so they cost no queries. Keys also carry a digest of the fragment template. A
+changed issue therefore gets new keys in every process at once. Explicit
+invalidation from issue_service only frees the stale entries early.
+
+Entries expire after FRAGMENT_CACHE_TTL seconds, because the image URLs
+inside them can be presigned (S3), or can switch to a generated variant
+once it exists.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set
+
+from flask import current_app
+from markupsafe import Markup
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from extensions import db
+from instrumentation import REGISTRY, Counter
+from models import FragmentCacheEntry
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_TTL = 600
+
+FRAGMENT_LOOKUPS = REGISTRY.register(Counter(
+    'civiccare_fragment_cache_lookups_total', 'Issue fragment cache lookups by template and result.',
+    ('template', 'result')
+))
+
+
+class LRUBackend:
+    """Bounded in-process LRU with per-entry expiry, indexed by issue id for invalidation."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (issue_id, expires_at, html), least recently used first
+        self._entries: OrderedDict = OrderedDict()
+        self._by_issue: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, issue_id: int, key: str, html: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (issue_id, time.monotonic() + self.ttl, html)
+            self._by_issue.setdefault(issue_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, issue_id: int):
+        with self._lock:
+            for key in self._by_issue.get(issue_id, set()).copy():
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_issue.clear()
+
+    def _remove(self, key: str):
+        issue_id = self._entries.pop(key)[0]
+        keys = self._by_issue.get(issue_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_issue[issue_id]
+
+
+class RedisBackend:
+    """
+    Fragments shared by all worker processes through Redis, with a small
+    local LRU in front to save round trips. Redis errors count as misses,
+    so an unavailable Redis slows pages down but does not break them.
+    """
+
+    def __init__(self, url: str, local: LRUBackend, ttl: float = DEFAULT_TTL, prefix: str = 'civiccare:fragment:'):
+        import redis  # optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url)
+        self.errors = redis.RedisError
+        self.local = local
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    def __len__(self):
+        return len(self.local)
+
+    def get(self, key: str) -> Optional[str]:
+        html = self.local.get(key)
+        if html is not None:
+            return html
+        try:
+            value = self.client.get(self.prefix + key)
+        except self.errors:
+            logger.warning("Fragment cache read from Redis failed", exc_info=True)
+            return None
+        if value is None:
+            return None
+        html = value.decode('utf-8')
+        self.local.set(int(key.split(':', 1)[0]), key, html)
+        return html
+
+    def set(self, issue_id: int, key: str, html: str):
+        self.local.set(issue_id, key, html)
+        index = f'{self.prefix}issue:{issue_id}'
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.setex(self.prefix + key, self.ttl, html.encode('utf-8'))
+            pipe.sadd(index, key)
+            pipe.expire(index, self.ttl)
+            pipe.execute()
+        except self.errors:
+            logger.warning("Fragment cache write to Redis failed", exc_info=True)
+
+    def invalidate(self, issue_id: int):
+        self.local.invalidate(issue_id)
+        index = f'{self.prefix}issue:{issue_id}'
+        try:
+            keys = self.client.smembers(index)
+            self.client.delete(index, *(self.prefix + key.decode('utf-8') for key in keys))
+        except self.errors:
+            logger.warning("Fragment cache invalidation in Redis failed", exc_info=True)
+
+    def clear(self):
+        self.local.clear()
+
+
+class DatabaseBackend:
+    """
+    Stand-in for Redis that needs no extra service: fragments are shared by
+    all worker processes through the FragmentCacheEntry table, with a small
+    local LRU in front. Database errors count as misses, and expired rows are
+    pruned every PRUNE_INTERVAL seconds by whichever process writes next.
+    """
+
+    PRUNE_INTERVAL = 60.0
+
+    def __init__(self, local: LRUBackend, ttl: float = DEFAULT_TTL):
+        self.local = local
+        self.ttl = ttl
+        self._next_prune = 0.0
+
+    def __len__(self):
+        return len(self.local)
+
+    def get(self, key: str) -> Optional[str]:
+        html = self.local.get(key)
+        if html is not None:
+            return html
+        try:
+            with db.engine.connect() as conn:
+                row = conn.execute(
+                    select(FragmentCacheEntry.issue_id, FragmentCacheEntry.html)
+                    .where(FragmentCacheEntry.key == key, FragmentCacheEntry.expires_at > datetime.utcnow())
+                ).first()
+        except SQLAlchemyError:
+            logger.warning("Fragment cache read from the database failed", exc_info=True)
+            return None
+        if row is None:
+            return None
+        self.local.set(row.issue_id, key, row.html)
+        return row.html
+
+    def prefetch(self, issue_ids):
+        """Load the stored fragments of a page's issues into the local LRU with one query."""
+        ids = list(issue_ids)
+        if not ids:
+            return
+        try:
+            with db.engine.connect() as conn:
+                rows = conn.execute(
+                    select(FragmentCacheEntry.key, FragmentCacheEntry.issue_id, FragmentCacheEntry.html)
+                    .where(FragmentCacheEntry.issue_id.in_(ids), FragmentCacheEntry.expires_at > datetime.utcnow())
+                ).all()
+        except SQLAlchemyError:
+            logger.warning("Fragment cache read from the database failed", exc_info=True)
+            return
+        for row in rows:
+            self.local.set(row.issue_id, row.key, row.html)
+
+    def set(self, issue_id: int, key: str, html: str):
+        self.local.set(issue_id, key, html)
+        now = datetime.utcnow()
+        table = FragmentCacheEntry.__table__
+        try:
+            # Own short transaction, independent of the request's session
+            with db.engine.begin() as conn:
+                conn.execute(delete(table).where(table.c.key == key))
+                conn.execute(insert(table).values(
+                    key=key, issue_id=issue_id, html=html, expires_at=now + timedelta(seconds=self.ttl)
+                ))
+                if time.monotonic() >= self._next_prune:
+                    self._next_prune = time.monotonic() + self.PRUNE_INTERVAL
+                    conn.execute(delete(table).where(table.c.expires_at <= now))
+        except SQLAlchemyError:
+            # Including another worker storing the same fragment at the same moment
+            logger.warning("Fragment cache write to the database failed", exc_info=True)
+
+    def invalidate(self, issue_id: int):
+        self.local.invalidate(issue_id)
+        table = FragmentCacheEntry.__table__
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(delete(table).where(table.c.issue_id == issue_id))
+        except SQLAlchemyError:
+            logger.warning("Fragment cache invalidation in the database failed", exc_info=True)
+
+    def clear(self):
+        self.local.clear()
+
+
+class FragmentCache:
+    """Renders fragment templates for one issue, through the backend when there is one."""
+
+    def __init__(self, jinja_env, backend=None):
+        self.jinja_env = jinja_env
+        self.backend = backend
+        self._digests: Dict[str, str] = {}
+
+    def _template_digest(self, name: str) -> str:
+        # Templates only change on deploy, unless they are auto-reloaded (debug mode)
+        digest = None if self.jinja_env.auto_reload else self._digests.get(name)
+        if digest is None:
+            source = self.jinja_env.loader.get_source(self.jinja_env, name)[0]
+            digest = self._digests[name] = hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]
+        return digest
+
+    def key(self, name: str, issue, **context) -> str:
+        last_log_id = max((log.id for log in issue.status_logs), default=0)
+        last_feedback_id = max((feedback.id for feedback in issue.feedbacks), default=0)
+        updated_at = issue.updated_at.isoformat() if issue.updated_at else ''
+        # The admin row shows the citizen's contact details, which report_issue can change
+        # without touching this issue; hashed so they do not end up in Redis key names
+        user = issue.user
+        contact = f'{user.name}|{user.email}|{user.phone}' if user else ''
+        contact_digest = hashlib.sha1(contact.encode('utf-8')).hexdigest()[:12]
+        extra = ','.join(f'{field}={value}' for field, value in sorted(context.items()))
+        return (
+            f'{issue.id}:{updated_at}:{last_log_id}:{last_feedback_id}:{contact_digest}:'
+            f'{name}:{self._template_digest(name)}:{extra}'
+        )
+
+    def render(self, name: str, issue, **context) -> Markup:
+        """
+        The rendered fragment `name` for `issue`. Extra context values become
+        part of the key, so keep them small (flags, not objects).
+        """
+        if self.backend is None:
+            return Markup(self.jinja_env.get_template(name).render(issue=issue, **context))
+        key = self.key(name, issue, **context)
+        html = self.backend.get(key)
+        if html is None:
+            FRAGMENT_LOOKUPS.inc(template=name, result='miss')
+            html = self.jinja_env.get_template(name).render(issue=issue, **context)
+            self.backend.set(issue.id, key, html)
+        else:
+            FRAGMENT_LOOKUPS.inc(template=name, result='hit')
+        return Markup(html)
+
+    def prefetch(self, issues):
+        """Warm the backend's local tier for a page of issues, if it has a batch read."""
+        if hasattr(self.backend, 'prefetch'):
+            self.backend.prefetch([issue.id for issue in issues])
+
+    def invalidate(self, issue_id: int):
+        if self.backend is not None:
+            self.backend.invalidate(issue_id)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+
+def issue_fragment(name: str, issue, **context) -> Markup:
+    """Template global: {{ issue_fragment('_issue_card.html', issue) }}."""
+    return current_app.extensions['fragment_cache'].render(name, issue, **context)
+
+
+def init_fragment_cache(app) -> FragmentCache:
+    backend_name = app.config.get('FRAGMENT_CACHE_BACKEND', 'memory')
+    ttl = app.config.get('FRAGMENT_CACHE_TTL', DEFAULT_TTL)
+    max_entries = app.config.get('FRAGMENT_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+    if backend_name == 'memory':
+        backend = LRUBackend(max_entries, ttl)
+    elif backend_name == 'redis':
+        # The local tier only needs to hold about one page's worth of fragments
+        backend = RedisBackend(
+            app.config['FRAGMENT_CACHE_REDIS_URL'], LRUBackend(min(max_entries, 500), min(ttl, 60)), ttl
+        )
+    elif backend_name == 'database':
+        backend = DatabaseBackend(LRUBackend(min(max_entries, 500), min(ttl, 60)), ttl)
+    elif backend_name == 'none':
+        backend = None
+    else:
+        raise ValueError(f"Unknown FRAGMENT_CACHE_BACKEND: {backend_name}")
+    cache = FragmentCache(app.jinja_env, backend)
+    app.extensions['fragment_cache'] = cache
+    return cache
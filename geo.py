@@ -0,0 +1,378 @@
+import math
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, case, func, or_, update
+
+from constants import AREA_COORDINATES, CHENNAI_BOUNDS
+from extensions import db
+from models import GeoCluster, Issue
+from work_queue import OPEN_STATUSES
+
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {char: i for i, char in enumerate(_BASE32)}
+
+# Stored on Issue.geohash: ~5 m cells
+GEOHASH_PRECISION = 9
+# Pre-aggregated in GeoCluster: from ~600 km (2) down to ~150 m (7) cells
+CLUSTER_PRECISIONS = range(2, 8)
+
+EARTH_RADIUS_M = 6371000.0
+MAX_NEARBY_RADIUS_M = 5000
+
+
+def encode_geohash(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits, value, even = 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if coord >= mid:
+            value = (value << 1) | 1
+            rng[0] = mid
+        else:
+            value <<= 1
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def decode_geohash(cell: str) -> Tuple[float, float, float, float]:
+    """Centre (lat, lon) of a geohash cell and its half-height / half-width in degrees."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return (
+        (lat_range[0] + lat_range[1]) / 2,
+        (lon_range[0] + lon_range[1]) / 2,
+        (lat_range[1] - lat_range[0]) / 2,
+        (lon_range[1] - lon_range[0]) / 2,
+    )
+
+
+def neighbors(cell: str) -> List[str]:
+    """The cell and its 8 surrounding cells of the same precision."""
+    lat, lon, lat_err, lon_err = decode_geohash(cell)
+    return [
+        encode_geohash(lat + dlat * 2 * lat_err, lon + dlon * 2 * lon_err, len(cell))
+        for dlat in (-1, 0, 1) for dlon in (-1, 0, 1)
+    ]
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def in_chennai(lat: float, lon: float) -> bool:
+    south, west, north, east = CHENNAI_BOUNDS
+    return south <= lat <= north and west <= lon <= east
+
+
+def nearest_area(lat: float, lon: float) -> str:
+    return min(AREA_COORDINATES, key=lambda area: haversine_m(lat, lon, *AREA_COORDINATES[area]))
+
+
+def _parse_coordinate(value) -> Optional[float]:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def resolve_location(area: Optional[str], latitude=None, longitude=None) -> dict:
+    """
+    Issue location columns: the browser's position when it lies within
+    Chennai, otherwise the gazetteer centre of the chosen area.
+    """
+    lat, lon = _parse_coordinate(latitude), _parse_coordinate(longitude)
+    if lat is not None and lon is not None and in_chennai(lat, lon):
+        source = 'browser'
+    elif area in AREA_COORDINATES:
+        (lat, lon), source = AREA_COORDINATES[area], 'area'
+    else:
+        return {'latitude': None, 'longitude': None, 'geohash': None, 'location_source': None}
+    return {
+        'latitude': lat,
+        'longitude': lon,
+        'geohash': encode_geohash(lat, lon),
+        'location_source': source,
+    }
+
+
+def _is_open(status: Optional[str]) -> bool:
+    return (status or 'Pending') in OPEN_STATUSES
+
+
+def _bump(issue, total: int, open_count: int):
+    for precision in CLUSTER_PRECISIONS:
+        cell = issue.geohash[:precision]
+        updated = db.session.execute(
+            update(GeoCluster)
+            .where(GeoCluster.precision == precision, GeoCluster.cell == cell)
+            .values(
+                total=GeoCluster.total + total,
+                open_count=GeoCluster.open_count + open_count,
+                lat_sum=GeoCluster.lat_sum + total * issue.latitude,
+                lon_sum=GeoCluster.lon_sum + total * issue.longitude
+            )
+        ).rowcount
+        if not updated:
+            center_lat, center_lon, _, _ = decode_geohash(cell)
+            db.session.add(GeoCluster(
+                precision=precision, cell=cell, center_lat=center_lat, center_lon=center_lon,
+                total=total, open_count=open_count,
+                lat_sum=total * issue.latitude, lon_sum=total * issue.longitude
+            ))
+
+
+def record_location(issue):
+    """Count a newly reported issue in the cluster tables, in the caller's transaction."""
+    if issue.geohash:
+        _bump(issue, 1, 1 if _is_open(issue.current_status) else 0)
+
+
+def record_status_change(issue, previous_status: Optional[str]):
+    """Keep open counts in step when an issue is resolved or reopened."""
+    was_open, is_open = _is_open(previous_status), _is_open(issue.current_status)
+    if issue.geohash and was_open != is_open:
+        _bump(issue, 0, 1 if is_open else -1)
+
+
+def _apply_deltas(deltas: dict):
+    """Add {(precision, cell): [total, open_count, lat_sum, lon_sum]} to the cluster table, one statement per kind."""
+    existing = set()
+    for precision in CLUSTER_PRECISIONS:
+        cells = [cell for p, cell in deltas if p == precision]
+        for start in range(0, len(cells), 500):
+            existing.update(
+                (precision, cell) for (cell,) in db.session.query(GeoCluster.cell).filter(
+                    GeoCluster.precision == precision, GeoCluster.cell.in_(cells[start:start + 500])
+                )
+            )
+
+    table = GeoCluster.__table__
+    updates = [
+        {'b_precision': precision, 'b_cell': cell, 'b_total': total, 'b_open': open_count,
+         'b_lat': lat_sum, 'b_lon': lon_sum}
+        for (precision, cell), (total, open_count, lat_sum, lon_sum) in deltas.items()
+        if (precision, cell) in existing
+    ]
+    if updates:
+        db.session.execute(
+            update(table)
+            .where(table.c.precision == bindparam('b_precision'), table.c.cell == bindparam('b_cell'))
+            .values(
+                total=table.c.total + bindparam('b_total'),
+                open_count=table.c.open_count + bindparam('b_open'),
+                lat_sum=table.c.lat_sum + bindparam('b_lat'),
+                lon_sum=table.c.lon_sum + bindparam('b_lon')
+            ),
+            updates
+        )
+
+    inserts = []
+    for (precision, cell), (total, open_count, lat_sum, lon_sum) in deltas.items():
+        # A missing cell with no new issues belongs to issues never counted; rebuild_clusters fixes those
+        if (precision, cell) not in existing and total > 0:
+            center_lat, center_lon, _, _ = decode_geohash(cell)
+            inserts.append({
+                'precision': precision, 'cell': cell, 'center_lat': center_lat, 'center_lon': center_lon,
+                'total': total, 'open_count': open_count, 'lat_sum': lat_sum, 'lon_sum': lon_sum,
+            })
+    if inserts:
+        db.session.bulk_insert_mappings(GeoCluster, inserts)
+
+
+def _location_deltas(issues, sign: int) -> dict:
+    deltas = {}
+    for issue in issues:
+        if not issue.geohash:
+            continue
+        open_count = 1 if _is_open(issue.current_status) else 0
+        for precision in CLUSTER_PRECISIONS:
+            delta = deltas.setdefault((precision, issue.geohash[:precision]), [0, 0, 0.0, 0.0])
+            delta[0] += sign
+            delta[1] += sign * open_count
+            delta[2] += sign * issue.latitude
+            delta[3] += sign * issue.longitude
+    return deltas
+
+
+def record_locations(issues):
+    """record_location for many new issues (e.g. an import chunk) with one UPDATE and one INSERT."""
+    _apply_deltas(_location_deltas(issues, 1))
+
+
+def forget_locations(issues):
+    """
+    Take issues leaving the hot table (archived) out of the cluster counts, in
+    the caller's transaction, so the map covers the same issues as rebuild_clusters().
+    issues are rows with geohash, latitude, longitude and current_status.
+    """
+    _apply_deltas(_location_deltas(issues, -1))
+
+
+def record_status_changes(changes):
+    """record_status_change for many (issue, previous_status) pairs with one UPDATE."""
+    deltas = {}
+    for issue, previous_status in changes:
+        was_open, is_open = _is_open(previous_status), _is_open(issue.current_status)
+        if not issue.geohash or was_open == is_open:
+            continue
+        for precision in CLUSTER_PRECISIONS:
+            delta = deltas.setdefault((precision, issue.geohash[:precision]), [0, 0, 0.0, 0.0])
+            delta[1] += 1 if is_open else -1
+    _apply_deltas(deltas)
+
+
+def precision_for_zoom(zoom: int) -> int:
+    """Cluster precision for a web-map zoom level (0-20): roughly a few dozen cells per screen."""
+    zoom = max(0, min(int(zoom), 20))
+    return min(max(CLUSTER_PRECISIONS), max(min(CLUSTER_PRECISIONS), (zoom + 1) // 2 - 1))
+
+
+def clusters(zoom: int, bbox: Optional[Tuple[float, float, float, float]] = None,
+             open_only: bool = False) -> List[dict]:
+    """
+    Pre-aggregated issue counts for a map view, one entry per geohash cell
+    at the zoom's precision, positioned at the mean location of its issues.
+    bbox is (west, south, east, north); served by ix_geo_cluster_bbox.
+    """
+    precision = precision_for_zoom(zoom)
+    query = db.session.query(GeoCluster).filter(GeoCluster.precision == precision)
+    if bbox:
+        west, south, east, north = bbox
+        # Cell centres can lie just outside the view while the cell overlaps it
+        _, _, lat_err, lon_err = decode_geohash('s' * precision)
+        query = query.filter(
+            GeoCluster.center_lat.between(south - lat_err, north + lat_err),
+            GeoCluster.center_lon.between(west - lon_err, east + lon_err)
+        )
+    count_column = GeoCluster.open_count if open_only else GeoCluster.total
+    query = query.filter(count_column > 0)
+    return [
+        {
+            'geohash': cluster.cell,
+            'lat': round(cluster.lat_sum / cluster.total, 6),
+            'lon': round(cluster.lon_sum / cluster.total, 6),
+            'count': cluster.open_count if open_only else cluster.total,
+            'open': cluster.open_count,
+        }
+        for cluster in query
+    ]
+
+
+def _search_precision(radius_m: float, lat: float) -> int:
+    """Finest geohash precision whose cells are at least radius_m across (so 3x3 cells cover the circle)."""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        _, _, lat_err, lon_err = decode_geohash(encode_geohash(lat, 0.0, precision))
+        height = 2 * lat_err * 111_320
+        width = 2 * lon_err * 111_320 * math.cos(math.radians(lat))
+        if min(height, width) >= radius_m:
+            return precision
+    return 1
+
+
+def issues_near(lat: float, lon: float, radius_m: float = 500, limit: int = 50,
+                open_only: bool = True) -> List[Tuple[Issue, float]]:
+    """Issues within radius_m metres, nearest first, as (issue, distance in metres)."""
+    radius_m = min(radius_m, MAX_NEARBY_RADIUS_M)
+    cells = neighbors(encode_geohash(lat, lon, _search_precision(radius_m, lat)))
+    lat_delta = math.degrees(radius_m / EARTH_RADIUS_M)
+    lon_delta = lat_delta / max(math.cos(math.radians(lat)), 0.01)
+
+    # Candidate positions only: prefix ranges on the indexed geohash column
+    # ('{' sorts right after 'z'), narrowed to the circle's bounding box
+    # (status is checked here rather than in SQL, which would steer the planner to the status index)
+    query = db.session.query(Issue.id, Issue.latitude, Issue.longitude, Issue.current_status).filter(
+        or_(*(and_(Issue.geohash >= cell, Issue.geohash < cell + '{') for cell in set(cells))),
+        Issue.latitude.between(lat - lat_delta, lat + lat_delta),
+        Issue.longitude.between(lon - lon_delta, lon + lon_delta)
+    )
+    nearest = sorted(
+        (distance, issue_id)
+        for issue_id, issue_lat, issue_lon, status in query
+        if not open_only or _is_open(status)
+        for distance in (haversine_m(lat, lon, issue_lat, issue_lon),)
+        if distance <= radius_m
+    )[:limit]
+    if not nearest:
+        return []
+
+    issues = {issue.id: issue for issue in Issue.query.filter(Issue.id.in_([i for _, i in nearest]))}
+    return [(issues[issue_id], distance) for distance, issue_id in nearest if issue_id in issues]
+
+
+def backfill_locations(batch_size: int = 1000) -> int:
+    """Geocode issues without coordinates from their area. Returns the number updated."""
+    updated = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.session.query(Issue.id, Issue.area)
+            .filter(Issue.id > last_id, Issue.geohash.is_(None))
+            .order_by(Issue.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return updated
+        mappings = [
+            {'id': row.id, **resolve_location(row.area)}
+            for row in rows if row.area in AREA_COORDINATES
+        ]
+        db.session.bulk_update_mappings(Issue, mappings)
+        db.session.commit()
+        updated += len(mappings)
+        last_id = rows[-1].id
+
+
+def rebuild_clusters() -> int:
+    """Recompute the cluster tables from scratch with one GROUP BY per precision. Returns the cell count."""
+    db.session.query(GeoCluster).delete(synchronize_session=False)
+    cells = 0
+    open_case = case((Issue.current_status.in_(OPEN_STATUSES), 1), else_=0)
+    for precision in CLUSTER_PRECISIONS:
+        cell = func.substr(Issue.geohash, 1, precision)
+        rows = (
+            db.session.query(
+                cell, func.count(Issue.id), func.sum(open_case),
+                func.sum(Issue.latitude), func.sum(Issue.longitude)
+            )
+            .filter(Issue.geohash.isnot(None))
+            .group_by(cell)
+            .all()
+        )
+        mappings = []
+        for cell_value, total, open_count, lat_sum, lon_sum in rows:
+            center_lat, center_lon, _, _ = decode_geohash(cell_value)
+            mappings.append({
+                'precision': precision, 'cell': cell_value,
+                'center_lat': center_lat, 'center_lon': center_lon,
+                'total': total, 'open_count': open_count or 0,
+                'lat_sum': lat_sum, 'lon_sum': lon_sum,
+            })
+        db.session.bulk_insert_mappings(GeoCluster, mappings)
+        cells += len(mappings)
+    db.session.commit()
+    return cells
@@ -0,0 +1,217 @@
+import logging
+import os
+import tempfile
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Optional
+
+from instrumentation import span
+from storage import acquire, is_legacy_path
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+# Reject decompression bombs well before Pillow's own 89 MP warning threshold
+MAX_PIXELS = 40_000_000
+# Stripped uploads up to this size are re-encoded in memory, larger ones spill to a temp file
+STRIP_SPOOL_BYTES = 4 * 1024 * 1024
+
+# name -> (longest edge in px, output format, file extension)
+VARIANTS = {
+    'thumb': (320, 'WEBP', 'webp'),
+    'medium': (1024, 'WEBP', 'webp'),
+    # JPEG is embedded by ReportLab as-is, without decoding and re-compressing
+    'print': (1024, 'JPEG', 'jpg'),
+}
+
+VARIANT_DIR = 'variants'
+
+FORMAT_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+# Uploads with other extensions are ignored by the HTML forms
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+
+
+class InvalidImageError(ValueError):
+    """Raised when an upload is not a supported, sane image."""
+
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def allowed_upload(file):
+    """The uploaded file if it has an allowed extension; other uploads are ignored as before."""
+    return file if file and file.filename and allowed_file(file.filename) else None
+
+
+def validate_image(stream) -> str:
+    """
+    Check the real format of an uploaded image from its header, ignoring the
+    client-supplied filename and content type. Returns the Pillow format name
+    and rewinds the stream.
+    """
+    # Pillow is imported on the upload path only, not at worker startup
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with warnings.catch_warnings():
+            # Pillow only warns between its own limit and twice that; past it, it raises
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            with Image.open(stream) as img:
+                image_format = img.format
+                width, height = img.size
+                img.verify()
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning) as exc:
+        raise InvalidImageError('Image dimensions are too large.') from exc
+    except (UnidentifiedImageError, OSError, SyntaxError) as exc:
+        raise InvalidImageError('File is not a valid image.') from exc
+    finally:
+        stream.seek(0)
+
+    if image_format not in ALLOWED_FORMATS:
+        raise InvalidImageError(f'Unsupported image format: {image_format}.')
+    if width * height > MAX_PIXELS:
+        raise InvalidImageError('Image dimensions are too large.')
+    return image_format
+
+
+def strip_metadata(stream, image_format: str):
+    """
+    Re-encode an uploaded image without its EXIF/XMP/text metadata (GPS,
+    camera serials), applying the EXIF orientation first. Animated images keep
+    all their frames. Returns a new stream positioned at the start.
+    """
+    from PIL import Image, ImageOps
+
+    clean = tempfile.SpooledTemporaryFile(max_size=STRIP_SPOOL_BYTES)
+    with Image.open(stream) as img:
+        if getattr(img, 'is_animated', False):
+            # The GIF and WebP encoders carry these over from the source unless removed
+            for name in ('exif', 'xmp', 'comment'):
+                img.info.pop(name, None)
+            img.save(clean, format=image_format, save_all=True)
+        else:
+            img = ImageOps.exif_transpose(img)
+            params = {'quality': 90} if image_format in ('JPEG', 'WEBP') else {}
+            _prepare_for(img, image_format).save(clean, format=image_format, **params)
+    clean.seek(0)
+    return clean
+
+
+def store_image_upload(storage, file) -> str:
+    """
+    Validate an uploaded image, strip its metadata and stream it into
+    content-addressed storage, counting the new reference in the current
+    session. Returns the storage key, which is the hash of the stored bytes.
+    """
+    with span('image.upload'):
+        image_format = validate_image(file.stream)
+        with strip_metadata(file.stream, image_format) as clean:
+            key, size = storage.save_stream(clean, FORMAT_EXTENSIONS[image_format])
+    acquire(key, size)
+    return key
+
+
+def variant_key(key: str, name: str) -> str:
+    """
+    Storage key of a derived image, e.g. variants/ab/cd/<sha>.jpg.thumb.webp.
+    Legacy static/uploads/<file> paths keep their variants in static/uploads/variants/.
+    """
+    _, _, ext = VARIANTS[name]
+    if is_legacy_path(key):
+        directory, filename = os.path.split(key)
+        return os.path.join(directory, VARIANT_DIR, f"{filename}.{name}.{ext}")
+    return f"{VARIANT_DIR}/{key}.{name}.{ext}"
+
+
+def variant_keys(key: str):
+    return [variant_key(key, name) for name in VARIANTS]
+
+
+def best_image_key(storage, key: Optional[str], name: str) -> Optional[str]:
+    """The named variant if it has been generated, otherwise the original upload."""
+    if not key:
+        return None
+    candidate = variant_key(key, name)
+    return candidate if storage.exists(candidate) else key
+
+
+def best_image_path(storage, key: Optional[str], name: str) -> Optional[str]:
+    """Local file path of best_image_key(), fetching it from remote storage if needed."""
+    key = best_image_key(storage, key, name)
+    return storage.local_path(key) if key else None
+
+
+def _save_temp(img: 'Image.Image', image_format: str, **params) -> str:
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp')
+    os.close(fd)
+    try:
+        img.save(tmp_path, format=image_format, **params)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return tmp_path
+
+
+def _prepare_for(img: 'Image.Image', image_format: str) -> 'Image.Image':
+    from PIL import Image
+
+    if image_format == 'JPEG' and img.mode != 'RGB':
+        if img.mode in ('RGBA', 'LA', 'P'):
+            rgba = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.split()[-1])
+            return background
+        return img.convert('RGB')
+    if img.mode not in ('RGB', 'RGBA'):
+        return img.convert('RGBA' if 'A' in img.getbands() or img.mode == 'P' else 'RGB')
+    return img
+
+
+def process_image(storage, key: str):
+    """
+    Store the resized variants next to a stored original, which is never
+    rewritten (its key is the hash of its content). Deduplicated uploads that
+    were already processed are skipped.
+    """
+    if all(storage.exists(k) for k in variant_keys(key)):
+        return
+    from PIL import Image, ImageOps
+
+    with span('image.process'):
+        with Image.open(storage.local_path(key)) as img:
+            # Variants are stills of the first frame; originals stored before
+            # uploads were stripped may still need their orientation applied
+            img = ImageOps.exif_transpose(img)
+            img.load()
+
+        for name, (edge, out_format, _) in VARIANTS.items():
+            variant = img.copy()
+            variant.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+            storage.put_file(
+                variant_key(key, name),
+                _save_temp(_prepare_for(variant, out_format), out_format, quality=80)
+            )
+
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='image-process')
+
+
+def process_image_async(storage, key: str, then: Optional[Callable[[], None]] = None):
+    """
+    Run process_image on a background thread; failures are logged and leave the original in place.
+    `then` runs afterwards either way, e.g. to render a report that should embed the variants.
+    """
+    def _process():
+        try:
+            process_image(storage, key)
+        except Exception:  # noqa: BLE001 - variants are an optimisation
+            logger.exception("Failed to process uploaded image %s", key)
+        if then is not None:
+            then()
+
+    return _executor.submit(_process)
@@ -0,0 +1,196 @@
+import csv
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Iterator, List, Optional, TextIO, Tuple
+
+from sqlalchemy import insert
+
+from constants import CHENNAI_AREAS, ISSUE_STATUSES, ISSUE_TYPES
+from dedup import issue_signature
+from extensions import db
+from geo import record_locations, resolve_location
+from models import Issue, IssueStatusLog
+from work_queue import queue_columns
+
+
+IMPORT_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+IMPORT_FORMATS = ('csv', 'jsonl')
+
+_AREAS = {area.lower(): area for area in CHENNAI_AREAS}
+_TYPES = {issue_type.lower(): issue_type for issue_type in ISSUE_TYPES}
+_STATUSES = {status.lower(): status for status in ISSUE_STATUSES}
+_DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d', '%d/%m/%Y %H:%M', '%d/%m/%Y', '%d-%m-%Y')
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+@dataclass
+class ImportResult:
+    imported: int = 0
+    skipped: int = 0
+    # "line N: reason" for the first MAX_REPORTED_ERRORS skipped records
+    errors: List[str] = field(default_factory=list)
+
+    def skip(self, line: int, reason: str):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'line {line}: {reason}')
+
+
+def iter_records(stream: TextIO, fmt: str) -> Iterator[Tuple[int, object]]:
+    """
+    (line number, record dict) pairs read lazily from a text stream, or
+    (line number, ImportRowError) for lines that cannot be parsed.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_number, ImportRowError('not valid JSON')
+                continue
+            yield line_number, record if isinstance(record, dict) else ImportRowError('not a JSON object')
+    else:
+        raise ValueError(f"Unknown import format: {fmt}")
+
+
+def _text(record: dict, *names: str) -> Optional[str]:
+    for name in names:
+        value = record.get(name)
+        if value is not None and str(value).strip():
+            return str(value).strip()
+    return None
+
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    else:
+        # Stored as naive UTC like every other timestamp
+        return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ImportRowError(f'unrecognised date {value!r}')
+
+
+def _issue_fields(record: dict, now: datetime) -> SimpleNamespace:
+    """Validated Issue fields for one legacy record."""
+    description = _text(record, 'description', 'issue_description', 'complaint')
+    if not description:
+        raise ImportRowError('description is required')
+    area = _AREAS.get((_text(record, 'area') or '').lower())
+    if not area:
+        raise ImportRowError(f"unknown area {record.get('area')!r}")
+    status_text = _text(record, 'status', 'current_status') or 'Pending'
+    status = _STATUSES.get(status_text.lower())
+    if not status:
+        raise ImportRowError(f'unknown status {status_text!r}')
+    return SimpleNamespace(
+        # Legacy categories that do not map onto ours are filed under 'Other'
+        issue_type=_TYPES.get((_text(record, 'issue_type', 'category') or '').lower(), 'Other'),
+        description=description,
+        area=area,
+        street=_text(record, 'street'),
+        landmark=_text(record, 'landmark'),
+        current_status=status,
+        authority_remarks=_text(record, 'authority_remarks', 'remarks'),
+        created_at=_parse_datetime(_text(record, 'created_at', 'reported_at', 'date')) or now,
+        reference=_text(record, 'reference', 'legacy_id', 'id'),
+        duplicate_of_id=None,
+        latitude=record.get('latitude'),
+        longitude=record.get('longitude'),
+    )
+
+
+def _insert_chunk(engine, items: List[SimpleNamespace], user_id: int, now: datetime):
+    rows = []
+    for item, analysis in zip(items, engine.analyze_batch(items)):
+        columns = analysis.columns()
+        item.severity, item.priority = columns['severity'], columns['priority']
+        location = resolve_location(item.area, item.latitude, item.longitude)
+        item.geohash, item.latitude, item.longitude = location['geohash'], location['latitude'], location['longitude']
+        queue = queue_columns(item)
+        rows.append({
+            'user_id': user_id,
+            'issue_type': item.issue_type,
+            'description': item.description,
+            'area': item.area,
+            'street': item.street,
+            'landmark': item.landmark,
+            'current_status': item.current_status,
+            'authority_remarks': item.authority_remarks,
+            'created_at': item.created_at,
+            'updated_at': now,
+            'dedup_signature': issue_signature(item),
+            # Already overdue on arrival: flagged now rather than reported by the next SLA sweep
+            'sla_breached_at': now if queue['queue_rank'] and queue['sla_due_at'] < now else None,
+            **columns,
+            **location,
+            **queue,
+        })
+
+    ids = db.session.execute(
+        insert(Issue).returning(Issue.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    db.session.execute(insert(IssueStatusLog), [
+        {
+            'issue_id': issue_id,
+            'status': item.current_status,
+            'remarks': f'Imported from legacy complaint {item.reference}.' if item.reference
+            else 'Imported from legacy complaint records.',
+            'created_at': item.created_at,
+        }
+        for issue_id, item in zip(ids, items)
+    ])
+    record_locations(items)
+    db.session.commit()
+
+
+def import_issues(stream: TextIO, fmt: str, user_id: int, engine,
+                  chunk_size: int = IMPORT_CHUNK_SIZE) -> ImportResult:
+    """
+    Import legacy complaints from a CSV (header row) or JSON Lines stream,
+    read lazily and inserted chunk_size at a time, each chunk analysed in
+    one batch and committed with executemany INSERTs. Records that fail
+    validation are skipped and reported; no emails are sent.
+
+    Recognised fields: description, area, issue_type, street, landmark,
+    status, created_at, authority_remarks, latitude, longitude, reference.
+    """
+    result = ImportResult()
+    now = datetime.utcnow()
+    chunk = []
+    for line, record in iter_records(stream, fmt):
+        try:
+            if isinstance(record, ImportRowError):
+                raise record
+            chunk.append(_issue_fields(record, now))
+        except ImportRowError as exc:
+            result.skip(line, str(exc))
+            continue
+        if len(chunk) >= chunk_size:
+            _insert_chunk(engine, chunk, user_id, now)
+            result.imported += len(chunk)
+            chunk = []
+    if chunk:
+        _insert_chunk(engine, chunk, user_id, now)
+        result.imported += len(chunk)
+    return result
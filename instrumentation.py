@@ -0,0 +1,344 @@
+"""
+Request instrumentation: timings, SQL query counts, template render time
+and named spans (PDF rendering, image processing), exposed in Prometheus
+text format at /metrics.
+
+Admins can append ?profile=1 to any page to get a profile of that request
+instead of the page (pyinstrument if installed, otherwise cProfile).
+Requests that run the same SQL statement N_PLUS_ONE_THRESHOLD times or
+more, the signature of a lazy relationship loaded in a loop, are logged
+as possible N+1 queries.
+
+Metrics live in the process, so each gunicorn worker reports its own.
+"""
+import cProfile
+import hmac
+import io
+import logging
+import pstats
+import threading
+import time
+from collections import Counter as StatementCounter
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+from flask import (
+    Blueprint, before_render_template, current_app, g, has_request_context, jsonify, request, session,
+    template_rendered
+)
+from sqlalchemy import event
+
+from extensions import db
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+PROFILE_LINES = 60
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels[name] for name in self.labels), 0.0)
+
+    def lines(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f'{self.name}{_format_labels(self.labels, key)} {value:g}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket..., +Inf count, sum]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += 1
+            state[-1] += value
+
+    def lines(self):
+        with self._lock:
+            values = sorted((key, list(state)) for key, state in self._values.items())
+        bounds = [f'le="{bound:g}"' for bound in self.buckets] + ['le="+Inf"']
+        for key, state in values:
+            for bound, count in zip(bounds, state):
+                yield f'{self.name}_bucket{_format_labels(self.labels, key, bound)} {count}'
+            yield f'{self.name}_sum{_format_labels(self.labels, key)} {state[-1]:g}'
+            yield f'{self.name}_count{_format_labels(self.labels, key)} {state[-2]}'
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.lines())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    'civiccare_http_requests_total', 'HTTP requests by endpoint, method and status.',
+    ('endpoint', 'method', 'status')
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'civiccare_http_request_duration_seconds',
+    'Time to produce the response (streamed bodies are sent afterwards and not included).', ('endpoint',)
+))
+REQUEST_QUERIES = REGISTRY.register(Histogram(
+    'civiccare_http_request_sql_queries', 'SQL statements executed per request.', ('endpoint',),
+    buckets=QUERY_COUNT_BUCKETS
+))
+SQL_QUERIES = REGISTRY.register(Counter(
+    'civiccare_sql_queries_total', 'SQL statements executed, by endpoint (background for worker threads).',
+    ('endpoint',)
+))
+SQL_SECONDS = REGISTRY.register(Counter(
+    'civiccare_sql_duration_seconds_total', 'Time spent executing SQL statements, by endpoint.', ('endpoint',)
+))
+TEMPLATE_SECONDS = REGISTRY.register(Histogram(
+    'civiccare_template_render_duration_seconds', 'Jinja template render time.', ('template',)
+))
+SPAN_SECONDS = REGISTRY.register(Histogram(
+    'civiccare_span_duration_seconds', 'Duration of instrumented operations (PDF rendering, image processing).',
+    ('span',)
+))
+N_PLUS_ONE = REGISTRY.register(Counter(
+    'civiccare_n_plus_one_total', 'Requests that repeated one SQL statement at least N_PLUS_ONE_THRESHOLD times.',
+    ('endpoint',)
+))
+
+
+class RequestStats:
+    """What one request spent its time on; kept on flask.g while it runs."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.statements = StatementCounter()
+        self.template_seconds = 0.0
+        self.template_starts = []
+        self.spans = StatementCounter()
+        self.profiler = None
+
+
+def current_stats():
+    """The RequestStats of the current request, or None outside a request."""
+    if has_request_context():
+        return g.get('_request_stats')
+    return None
+
+
+def _endpoint_label() -> str:
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return 'background'
+
+
+@contextmanager
+def span(name: str):
+    """Time a block into civiccare_span_duration_seconds{span=name} (and the current request's profile)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        SPAN_SECONDS.observe(elapsed, span=name)
+        stats = current_stats()
+        if stats is not None:
+            stats.spans[name] += elapsed
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's execution context: a statement that raises never reaches
+    # after_cursor_execute, and its start time must not outlive it
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    endpoint = _endpoint_label()
+    SQL_QUERIES.inc(endpoint=endpoint)
+    SQL_SECONDS.inc(elapsed, endpoint=endpoint)
+    stats = current_stats()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_seconds += elapsed
+        stats.statements[statement] += 1
+
+
+def _before_render(sender, template, context, **extra):
+    stats = current_stats()
+    if stats is not None:
+        stats.template_starts.append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    stats = current_stats()
+    if stats is None or not stats.template_starts:
+        return
+    elapsed = time.perf_counter() - stats.template_starts.pop()
+    stats.template_seconds += elapsed
+    TEMPLATE_SECONDS.observe(elapsed, template=template.name or 'string')
+
+
+def _wants_profile() -> bool:
+    return (
+        request.args.get('profile') == '1'
+        and session.get('role') == 'admin'
+        and current_app.config.get('PROFILING_ENABLED', True)
+    )
+
+
+def _start_request():
+    stats = g._request_stats = RequestStats()
+    if _wants_profile():
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            stats.profiler = cProfile.Profile()
+            stats.profiler.enable()
+        else:
+            stats.profiler = Profiler()
+            stats.profiler.start()
+
+
+def _profile_report(stats: RequestStats, response, elapsed: float) -> str:
+    profiler = stats.profiler
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        body = output.getvalue()
+    else:
+        profiler.stop()
+        body = profiler.output_text(unicode=True)
+    spans = ', '.join(f'{name} {seconds * 1000:.1f} ms' for name, seconds in stats.spans.items()) or 'none'
+    summary = (
+        f'{request.method} {request.full_path.rstrip("?")} -> {response.status_code} in {elapsed * 1000:.1f} ms\n'
+        f'SQL: {stats.queries} statements, {stats.sql_seconds * 1000:.1f} ms\n'
+        f'Templates: {stats.template_seconds * 1000:.1f} ms\n'
+        f'Spans: {spans}\n'
+    )
+    repeated = [(count, sql) for sql, count in stats.statements.most_common(5) if count > 1]
+    if repeated:
+        summary += 'Most repeated statements:\n' + ''.join(
+            f'  {count:>4} x {" ".join(sql.split())[:200]}\n' for count, sql in repeated
+        )
+    return summary + '\n' + body
+
+
+def _flag_n_plus_one(stats: RequestStats, endpoint: str):
+    threshold = current_app.config.get('N_PLUS_ONE_THRESHOLD', 10)
+    flagged = False
+    for statement, count in stats.statements.items():
+        if count >= threshold:
+            flagged = True
+            logger.warning(
+                "Possible N+1 query on %s %s (%s): %d executions of %s",
+                request.method, request.path, endpoint, count, ' '.join(statement.split())[:300]
+            )
+    if flagged:
+        N_PLUS_ONE.inc(endpoint=endpoint)
+
+
+def _finish_request(response):
+    stats = current_stats()
+    if stats is None:
+        return response
+    elapsed = time.perf_counter() - stats.started
+    endpoint = _endpoint_label()
+    REQUESTS.inc(endpoint=endpoint, method=request.method, status=str(response.status_code))
+    REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+    REQUEST_QUERIES.observe(stats.queries, endpoint=endpoint)
+    _flag_n_plus_one(stats, endpoint)
+    if stats.profiler is not None:
+        response = current_app.response_class(_profile_report(stats, response, elapsed), mimetype='text/plain')
+        response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def init_instrumentation(app):
+    """Hook request timing, SQL counting, template timing and profiling into the app."""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+instrumentation = Blueprint('instrumentation', __name__)
+
+
+@instrumentation.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint: admins, or `Authorization: Bearer <METRICS_TOKEN>`."""
+    token = current_app.config.get('METRICS_TOKEN')
+    authorized = session.get('role') == 'admin' or bool(
+        token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    )
+    if not authorized:
+        return jsonify(error='Admin login or metrics token required.'), 401
+    response = current_app.response_class(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
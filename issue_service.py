@@ -0,0 +1,306 @@
+"""
+Issue write operations shared by the HTML routes and the JSON API, so both
+apply the same validation and the same side effects (status log, email,
+duplicate index, map clusters, image variants, cached fragments, live events).
+"""
+from collections import Counter
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Iterable, Optional
+
+from flask import current_app
+
+from constants import CHENNAI_AREAS, ISSUE_STATUSES, ISSUE_TYPES
+from events import issue_event_data
+from extensions import db
+from geo import record_location, record_status_change, record_status_changes, resolve_location
+from images import InvalidImageError, process_image_async, store_image_upload
+from models import Feedback, Issue, IssueStatusLog, User
+from outbox import notify_dispatcher, queue_email, queue_emails
+from pagination import apply_issue_filters
+from pdf_cache import warm_async
+from rate_limit import concurrency_limit
+from storage import release
+from work_queue import queue_columns, refresh_queue_fields
+
+# Larger selections must be narrowed with filters (or split into several requests)
+BULK_UPDATE_LIMIT = 10000
+
+
+class IssueValidationError(ValueError):
+    """Invalid input for an issue write; the message is safe to show to the user."""
+
+
+def _store_image(image) -> Optional[str]:
+    if not image or not image.filename:
+        return None
+    try:
+        # Decoding and verifying the image is the expensive part of a report
+        with concurrency_limit('image'):
+            return store_image_upload(current_app.extensions['storage'], image)
+    except InvalidImageError as exc:
+        raise IssueValidationError(str(exc)) from exc
+
+
+def report_issue(user, *, issue_type, description, area, street=None, landmark=None,
+                 latitude=None, longitude=None, name=None, email=None, phone=None, image=None) -> Issue:
+    """Validate and file a citizen report, updating the citizen's contact details if given."""
+    if not description or not area or not issue_type:
+        raise IssueValidationError('Please fill in all mandatory fields.')
+    if issue_type not in ISSUE_TYPES or area not in CHENNAI_AREAS:
+        raise IssueValidationError('Please choose an issue type and area from the list.')
+
+    if name:
+        user.name = name
+    if email:
+        user.email = email
+    if phone:
+        user.phone = phone
+
+    before_image_path = _store_image(image)
+    extensions = current_app.extensions
+    analysis = extensions['analysis'].analyze(issue_type, description, landmark)
+
+    issue = Issue(
+        user_id=user.id,
+        issue_type=issue_type,
+        description=description,
+        area=area,
+        street=street,
+        landmark=landmark,
+        before_image=before_image_path,
+        current_status='Pending',
+        **analysis.columns(),
+        **resolve_location(area, latitude, longitude)
+    )
+    # Matched before the flush so the new report cannot match itself
+    duplicate = extensions['dedup'].find_duplicate(issue)
+    if duplicate:
+        issue.duplicate_of_id = duplicate[0]
+    refresh_queue_fields(issue)
+    db.session.add(issue)
+    db.session.flush()
+    record_location(issue)
+
+    remarks = 'Issue reported by citizen.'
+    if issue.duplicate_of_id:
+        remarks += f' Linked as a likely duplicate of issue #{issue.duplicate_of_id}.'
+    db.session.add(IssueStatusLog(
+        issue_id=issue.id,
+        status='Pending',
+        remarks=remarks
+    ))
+
+    if email:
+        duplicate_note = (
+            f"This looks like issue #{issue.duplicate_of_id}, which was reported earlier; "
+            "your report has been linked to it.\n\n"
+        ) if issue.duplicate_of_id else ''
+        queue_email(
+            [email],
+            subject=f"Issue #{issue.id} Submitted - Chennai CivicCare AI",
+            body=(
+                f"Dear {name or 'Citizen'},\n\n"
+                f"Your issue (ID: {issue.id}) has been submitted successfully.\n"
+                f"Issue Type: {issue.issue_type}\n"
+                f"Location: {issue.area}, {issue.street} - {issue.landmark}\n\n"
+                f"{duplicate_note}"
+                "You will receive updates as the status changes.\n\n"
+                "Regards,\nChennai CivicCare AI"
+            )
+        )
+    db.session.commit()
+    notify_dispatcher()
+    extensions['dedup'].add(issue)
+    extensions['events'].publish('issue.created', **issue_event_data(issue))
+    if before_image_path:
+        process_image_async(extensions['storage'], before_image_path)
+    return issue
+
+
+def update_issue(issue, *, status=None, remarks=None, duplicate_of=None, image=None) -> Issue:
+    """
+    Apply an admin update. duplicate_of is None to leave the link alone, ''
+    to unlink, or the (optionally '#'-prefixed) id of the canonical issue.
+    """
+    if status and status not in ISSUE_STATUSES:
+        raise IssueValidationError(f"Status must be one of: {', '.join(ISSUE_STATUSES)}.")
+
+    canonical_id = issue.duplicate_of_id
+    if duplicate_of is not None:
+        duplicate_of = str(duplicate_of).strip().lstrip('#')
+        if not duplicate_of:
+            canonical_id = None
+        else:
+            canonical = db.session.get(Issue, int(duplicate_of)) if duplicate_of.isdigit() else None
+            if canonical is None or canonical.id == issue.id:
+                raise IssueValidationError('Duplicate link must reference another existing issue.')
+            canonical_id = canonical.duplicate_of_id or canonical.id
+
+    previous_status = issue.current_status
+    previous_after_image = after_image_path = issue.after_image
+    new_image = _store_image(image)
+    if new_image:
+        after_image_path = new_image
+        # The replaced image loses a reference (nets out if the same file was re-uploaded)
+        release(previous_after_image)
+
+    issue.duplicate_of_id = canonical_id
+    if status:
+        issue.current_status = status
+    if remarks:
+        issue.authority_remarks = remarks
+    issue.after_image = after_image_path
+    # Every update adds a status log, so the issue counts as modified even if no column changed
+    issue.updated_at = datetime.utcnow()
+    refresh_queue_fields(issue)
+    record_status_change(issue, previous_status)
+
+    log = IssueStatusLog(
+        issue_id=issue.id,
+        status=status or issue.current_status,
+        remarks=remarks or ''
+    )
+    db.session.add(log)
+
+    if issue.user and issue.user.email:
+        queue_email(
+            [issue.user.email],
+            subject=f"Issue #{issue.id} Status Updated - Chennai CivicCare AI",
+            body=(
+                f"Dear {issue.user.name or 'Citizen'},\n\n"
+                f"The status of your issue (ID: {issue.id}) has been updated to: {issue.current_status}.\n"
+                f"Remarks: {remarks or 'No additional remarks.'}\n\n"
+                "Regards,\nChennai CivicCare AI"
+            )
+        )
+    db.session.commit()
+    notify_dispatcher()
+
+    extensions = current_app.extensions
+    extensions['fragment_cache'].invalidate(issue.id)
+    if issue.duplicate_of_id or issue.current_status == 'Resolved':
+        extensions['dedup'].discard(issue.id)
+    else:
+        extensions['dedup'].add(issue)
+    app, issue_id = current_app._get_current_object(), issue.id
+    if after_image_path and after_image_path != previous_after_image:
+        # Warm only once the print variant exists, or the cached report would embed the full-size original
+        process_image_async(extensions['storage'], after_image_path, then=lambda: warm_async(app, issue_id))
+    else:
+        warm_async(app, issue_id)
+    extensions['events'].publish(
+        'issue.status_changed', previous_status=previous_status, remarks=log.remarks,
+        updated_at=log.created_at.strftime('%d %b %Y, %I:%M %p'), **issue_event_data(issue)
+    )
+    return issue
+
+
+def bulk_update_issues(*, filters: Optional[dict] = None, ids: Optional[Iterable[int]] = None,
+                       status=None, remarks=None) -> int:
+    """
+    Apply one status and/or remarks to every issue matching the listing
+    filters (and/or ids) in a single transaction: one executemany UPDATE,
+    one bulk INSERT of status logs and one of outbox emails, instead of a
+    round trip and commit per issue. Returns the number of issues updated.
+    """
+    if status and status not in ISSUE_STATUSES:
+        raise IssueValidationError(f"Status must be one of: {', '.join(ISSUE_STATUSES)}.")
+    if not status and not remarks:
+        raise IssueValidationError('Choose a status or enter remarks to apply.')
+    try:
+        ids = [int(issue_id) for issue_id in ids] if ids is not None else None
+    except (TypeError, ValueError):
+        raise IssueValidationError('Issue ids must be integers.') from None
+    if not filters and not ids:
+        raise IssueValidationError('Bulk updates need at least one filter or issue id.')
+
+    query = apply_issue_filters(
+        db.session.query(
+            Issue.id, Issue.issue_type, Issue.area, Issue.current_status, Issue.created_at,
+            Issue.duplicate_of_id, Issue.severity, Issue.priority, Issue.description,
+            Issue.street, Issue.landmark, Issue.geohash, Issue.dedup_signature,
+            User.name.label('citizen_name'), User.email.label('citizen_email')
+        ).outerjoin(User, Issue.user_id == User.id),
+        filters or {}
+    )
+    if ids is not None:
+        query = query.filter(Issue.id.in_(ids))
+    rows = query.order_by(Issue.id).limit(BULK_UPDATE_LIMIT + 1).all()
+    if len(rows) > BULK_UPDATE_LIMIT:
+        raise IssueValidationError(
+            f'More than {BULK_UPDATE_LIMIT} issues match; narrow the filters and repeat.'
+        )
+    if not rows:
+        return 0
+
+    now = datetime.utcnow()
+    updated = [SimpleNamespace(**dict(row._mapping, current_status=status or row.current_status)) for row in rows]
+    mappings = []
+    for issue in updated:
+        mapping = {'id': issue.id, 'current_status': issue.current_status, 'updated_at': now,
+                   **queue_columns(issue)}
+        if remarks:
+            mapping['authority_remarks'] = remarks
+        mappings.append(mapping)
+    db.session.bulk_update_mappings(Issue, mappings)
+    db.session.bulk_insert_mappings(IssueStatusLog, [
+        {'issue_id': issue.id, 'status': issue.current_status, 'remarks': remarks or '', 'created_at': now}
+        for issue in updated
+    ])
+    record_status_changes(zip(updated, (row.current_status for row in rows)))
+    queue_emails(
+        (
+            [issue.citizen_email],
+            f"Issue #{issue.id} Status Updated - Chennai CivicCare AI",
+            (
+                f"Dear {issue.citizen_name or 'Citizen'},\n\n"
+                f"The status of your issue (ID: {issue.id}) has been updated to: {issue.current_status}.\n"
+                f"Remarks: {remarks or 'No additional remarks.'}\n\n"
+                "Regards,\nChennai CivicCare AI"
+            )
+        )
+        for issue in updated if issue.citizen_email
+    )
+    db.session.commit()
+    notify_dispatcher()
+
+    extensions = current_app.extensions
+    for issue in updated:
+        extensions['fragment_cache'].invalidate(issue.id)
+        if issue.duplicate_of_id or issue.current_status == 'Resolved':
+            extensions['dedup'].discard(issue.id)
+        else:
+            extensions['dedup'].add(issue)
+    extensions['events'].publish(
+        'issues.bulk_updated', ids=[issue.id for issue in updated], status=status, remarks=remarks or '',
+        updated_at=now.strftime('%d %b %Y, %I:%M %p'),
+        # Per previous status, for the metric tiles (duplicates are not counted there)
+        previous_counts=Counter(row.current_status for row in rows if not row.duplicate_of_id)
+    )
+    return len(updated)
+
+
+def add_feedback(issue, *, rating, comments=None) -> Feedback:
+    try:
+        rating = int(rating)
+    except (TypeError, ValueError):
+        rating = 0
+    if not 1 <= rating <= 5:
+        raise IssueValidationError('Rating must be between 1 and 5.')
+
+    feedback = Feedback(
+        issue_id=issue.id,
+        rating=rating,
+        comments=comments
+    )
+    db.session.add(feedback)
+    # Feedback is part of the issue's representation (PDF report, API ETags)
+    issue.updated_at = datetime.utcnow()
+    db.session.commit()
+    current_app.extensions['fragment_cache'].invalidate(issue.id)
+    warm_async(current_app._get_current_object(), issue.id)
+    current_app.extensions['events'].publish(
+        'feedback.submitted', issue_id=issue.id, rating=feedback.rating, comments=feedback.comments or ''
+    )
+    return feedback
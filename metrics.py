@@ -0,0 +1,159 @@
+from typing import Optional, Tuple
+
+from sqlalchemy import case, func
+
+from flask import current_app
+
+from constants import CHENNAI_AREAS, ISSUE_STATUSES, ISSUE_TYPES
+from extensions import db
+from models import Issue, IssueStatusLog
+
+
+def _seconds_between(start, end, dialect: str):
+    """Dialect-specific SQL expression for (end - start) in seconds, or None if the dialect has none here."""
+    if dialect == 'sqlite':
+        return (func.julianday(end) - func.julianday(start)) * 86400.0
+    if dialect == 'postgresql':
+        return func.extract('epoch', end - start)
+    if dialect in ('mysql', 'mariadb'):
+        return func.timestampdiff(db.text('SECOND'), start, end)
+    return None
+
+
+def _status_counts():
+    return {status: 0 for status in ISSUE_STATUSES}
+
+
+def issue_breakdown() -> dict:
+    """
+    Issue counts grouped by status x area x issue type, from a single
+    GROUP BY query served by the ix_issue_status_area_type_dup index, plus
+    the archived issues' counts (cached, see archive.ArchivedCounts).
+    Reports linked as duplicates of another issue are counted separately
+    so repeat reports do not inflate the totals.
+    """
+    rows = (
+        db.session.query(
+            Issue.current_status,
+            Issue.area,
+            Issue.issue_type,
+            func.count(case((Issue.duplicate_of_id.is_(None), 1))),
+            func.count(Issue.duplicate_of_id)
+        )
+        .group_by(Issue.current_status, Issue.area, Issue.issue_type)
+        .all()
+    )
+
+    by_status = _status_counts()
+    by_area = {area: {'total': 0, **_status_counts()} for area in CHENNAI_AREAS}
+    by_type = {issue_type: {'total': 0, **_status_counts()} for issue_type in ISSUE_TYPES}
+    cells = []
+    total = 0
+    duplicates = 0
+
+    merged = {}
+    for status, area, issue_type, count, duplicate_count in [*rows, *current_app.extensions['archived_counts'].rows()]:
+        key = (status or 'Pending', area, issue_type)
+        previous = merged.get(key, (0, 0))
+        merged[key] = (previous[0] + count, previous[1] + duplicate_count)
+
+    for (status, area, issue_type), (count, duplicate_count) in merged.items():
+        duplicates += duplicate_count
+        if not count:
+            continue
+        total += count
+        by_status[status] = by_status.get(status, 0) + count
+        for bucket, key in ((by_area, area), (by_type, issue_type)):
+            entry = bucket.setdefault(key, {'total': 0, **_status_counts()})
+            entry['total'] += count
+            entry[status] = entry.get(status, 0) + count
+        cells.append({
+            'status': status,
+            'area': area,
+            'issue_type': issue_type,
+            'count': count
+        })
+
+    return {
+        'total': total,
+        'duplicates': duplicates,
+        'by_status': by_status,
+        'by_area': by_area,
+        'by_type': by_type,
+        'cells': cells
+    }
+
+
+def resolution_totals(issue_model=Issue, log_model=IssueStatusLog) -> Tuple[float, int]:
+    """
+    Total seconds from report to the first 'Resolved' status log, and the
+    number of resolved issues, for the hot tables or (ArchivedIssue,
+    ArchivedIssueStatusLog) the archive's, which may be another database.
+    """
+    first_resolved = (
+        db.session.query(
+            log_model.issue_id.label('issue_id'),
+            func.min(log_model.created_at).label('resolved_at')
+        )
+        .filter(log_model.status == 'Resolved')
+        .group_by(log_model.issue_id)
+        .subquery()
+    )
+    dialect = db.session.get_bind(mapper=issue_model).dialect.name
+    seconds = _seconds_between(issue_model.created_at, first_resolved.c.resolved_at, dialect)
+    if seconds is not None:
+        total_seconds, resolved_count = (
+            db.session.query(func.sum(seconds), func.count(issue_model.id))
+            .join(first_resolved, first_resolved.c.issue_id == issue_model.id)
+            .filter(issue_model.current_status == 'Resolved')
+            .one()
+        )
+        return float(total_seconds or 0.0), resolved_count
+    # Portable fallback: stream the timestamp pairs and add them up here
+    rows = (
+        db.session.query(issue_model.created_at, first_resolved.c.resolved_at)
+        .join(first_resolved, first_resolved.c.issue_id == issue_model.id)
+        .filter(issue_model.current_status == 'Resolved')
+        .yield_per(1000)
+    )
+    total_seconds, resolved_count = 0.0, 0
+    for created_at, resolved_at in rows:
+        total_seconds += (resolved_at - created_at).total_seconds()
+        resolved_count += 1
+    return total_seconds, resolved_count
+
+
+def resolution_stats() -> dict:
+    """
+    Mean time from report to the first 'Resolved' status log over all
+    resolved issues, the archived ones included (cached, see archive.ArchivedCounts).
+    """
+    total_seconds, resolved_count = resolution_totals()
+    archived_seconds, archived_count = current_app.extensions['archived_counts'].resolution()
+    total_seconds += archived_seconds
+    resolved_count += archived_count
+    return {
+        'mean_time_to_resolve_seconds': total_seconds / resolved_count if resolved_count else None,
+        'resolved_sample_size': resolved_count
+    }
+
+
+def issue_metrics() -> dict:
+    """All admin dashboard metrics; two queries regardless of table size (plus the cached archived counts)."""
+    metrics = issue_breakdown()
+    metrics.update(resolution_stats())
+    return metrics
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    """Human-readable duration such as '2d 4h' or '35m'."""
+    if seconds is None:
+        return 'N/A'
+    minutes = int(seconds // 60)
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    if days:
+        return f"{days}d {hours}h"
+    if hours:
+        return f"{hours}h {minutes}m"
+    return f"{minutes}m"
@@ -0,0 +1,144 @@
+"""
+Versioned schema migrations.
+
+Each migration runs once per database, in version order, and is recorded
+in the schema_migration table. Run pending migrations with
+`flask db-upgrade` before starting the workers (or let `python app.py`
+do it in development); `flask db-status` lists what has been applied.
+
+Migrations 1-4 bring any database, including ones created before
+migrations existed, up to the schema declared in models.py. Later schema
+changes get their own numbered migration appended to MIGRATIONS, using
+add_column() / create_index() so they are safe on databases that already
+have the change.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List
+
+from sqlalchemy import inspect, text
+
+from extensions import db
+from models import FragmentCacheEntry, RateLimitCounter, SchemaMigration
+from search import ensure_search_index
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[], None]
+
+
+def _table(name: str):
+    return db.metadata.tables[name]
+
+
+def add_column(table_name: str, column_name: str):
+    """ALTER TABLE ADD COLUMN for a column declared on the model, unless it exists."""
+    table = _table(table_name)
+    column = table.columns[column_name]
+    if column_name in {c['name'] for c in inspect(db.engine).get_columns(table_name)}:
+        return
+    if not column.nullable:
+        raise RuntimeError(f"Cannot add NOT NULL column {table_name}.{column_name} to an existing table")
+    preparer = db.engine.dialect.identifier_preparer
+    column_type = column.type.compile(dialect=db.engine.dialect)
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            f"ALTER TABLE {preparer.format_table(table)} "
+            f"ADD COLUMN {preparer.format_column(column)} {column_type}"
+        ))
+
+
+def create_index(index_name: str):
+    """Create an index declared on a model, unless it exists."""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name == index_name:
+                index.create(db.engine, checkfirst=True)
+                return
+    raise KeyError(f"No index named {index_name} is declared")
+
+
+def _create_tables():
+    db.create_all()
+
+
+def _add_declared_columns():
+    # Columns added to tables that older releases created with db.create_all()
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                add_column(table.name, column.name)
+
+
+def _create_declared_indexes():
+    # Listing keyset pages, filtered listings, metrics GROUP BY, work queue, geohash
+    # lookups, duplicate links, export watermarks, outbox claims, ... (see models.py)
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+
+def _create_archive_tables():
+    # Tables and indexes of the archive bind, which may be a separate database (see archive.py)
+    db.create_all(bind_key='archive')
+
+
+def _create_fragment_cache_table():
+    # Shared fragment cache for deployments without Redis (see fragment_cache.DatabaseBackend)
+    FragmentCacheEntry.__table__.create(db.engine, checkfirst=True)
+
+
+def _create_rate_limit_table():
+    # Shared rate limit counters for deployments without Redis (see rate_limit.DatabaseBackend)
+    RateLimitCounter.__table__.create(db.engine, checkfirst=True)
+
+
+def _analyze():
+    # Planner statistics so the new indexes are chosen for the hot queries
+    with db.engine.begin() as conn:
+        conn.execute(text('ANALYZE'))
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, 'Create tables', _create_tables),
+    Migration(2, 'Add columns missing from tables created by earlier releases', _add_declared_columns),
+    Migration(3, 'Create indexes for the hot queries', _create_declared_indexes),
+    Migration(4, 'Create the full-text search index and its triggers', ensure_search_index),
+    Migration(5, 'Collect planner statistics', _analyze),
+    Migration(6, 'Create the archive tables for resolved issues', _create_archive_tables),
+    Migration(7, 'Create the shared fragment cache table', _create_fragment_cache_table),
+    Migration(8, 'Create the shared rate limit counter table', _create_rate_limit_table),
+]
+
+
+def applied_versions() -> set:
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    return {version for (version,) in db.session.query(SchemaMigration.version)}
+
+
+def pending_migrations() -> List[Migration]:
+    applied = applied_versions()
+    return [migration for migration in MIGRATIONS if migration.version not in applied]
+
+
+def migrate() -> List[Migration]:
+    """Apply pending migrations in order. Returns the ones applied."""
+    applied = []
+    for migration in pending_migrations():
+        logger.info("Applying migration %d: %s", migration.version, migration.description)
+        migration.upgrade()
+        db.session.add(SchemaMigration(
+            version=migration.version, description=migration.description, applied_at=datetime.utcnow()
+        ))
+        db.session.commit()
+        applied.append(migration)
+    return applied
@@ -16,6 +16,27 @@ class User(db.Model):
 
 
 class Issue(db.Model):
+    __table_args__ = (
+        # Keyset pagination for the dashboards: ORDER BY created_at DESC, id DESC
+        db.Index('ix_issue_created_at_id', 'created_at', 'id'),
+        # Status-filtered admin listing
+        db.Index('ix_issue_status_created_at', 'current_status', 'created_at'),
+        # Covering index for the status x area x type metrics GROUP BY (duplicates counted apart)
+        db.Index('ix_issue_status_area_type_dup', 'current_status', 'area', 'issue_type', 'duplicate_of_id'),
+        # Work queue (see work_queue.py): next open issues overall / per area, and the SLA sweep
+        db.Index('ix_issue_queue_rank', 'queue_rank',
+                 sqlite_where=db.text('queue_rank IS NOT NULL'),
+                 postgresql_where=db.text('queue_rank IS NOT NULL')),
+        db.Index('ix_issue_queue_area', 'area', 'queue_rank',
+                 sqlite_where=db.text('queue_rank IS NOT NULL'),
+                 postgresql_where=db.text('queue_rank IS NOT NULL')),
+        db.Index('ix_issue_sla_open', 'sla_due_at',
+                 sqlite_where=db.text('queue_rank IS NOT NULL AND sla_breached_at IS NULL'),
+                 postgresql_where=db.text('queue_rank IS NOT NULL AND sla_breached_at IS NULL')),
+        # Incremental analytics exports: rows changed since a watermark (see analytics_export.py)
+        db.Index('ix_issue_updated_at_id', 'updated_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     issue_type = db.Column(db.String(120), nullable=False)
@@ -23,11 +44,28 @@ class Issue(db.Model):
     area = db.Column(db.String(120), nullable=False)
     street = db.Column(db.String(255), nullable=True)
     landmark = db.Column(db.String(255), nullable=True)
+    # Optional position: from the browser, or the area's gazetteer centre (see geo.py)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    geohash = db.Column(db.String(12), nullable=True, index=True)
+    location_source = db.Column(db.String(16), nullable=True)  # 'browser' or 'area'
     before_image = db.Column(db.String(255), nullable=True)
     after_image = db.Column(db.String(255), nullable=True)
     ai_summary = db.Column(db.Text, nullable=True)
+    # Structured analysis results (see analysis.py); ai_summary is their readable form
+    severity = db.Column(db.String(20), nullable=True)
+    priority = db.Column(db.String(20), nullable=True)
+    department = db.Column(db.String(80), nullable=True)
+    # Work queue: SLA deadline, virtual deadline used for ordering (NULL once closed), breach flag
+    sla_due_at = db.Column(db.DateTime, nullable=True)
+    queue_rank = db.Column(db.DateTime, nullable=True)
+    sla_breached_at = db.Column(db.DateTime, nullable=True)
     current_status = db.Column(db.String(50), default='Pending')
     authority_remarks = db.Column(db.Text, nullable=True)
+    # Canonical open issue this report was linked to as a likely duplicate (see dedup.py)
+    duplicate_of_id = db.Column(db.Integer, db.ForeignKey('issue.id'), nullable=True, index=True)
+    # MinHash of description + street + landmark used for duplicate detection
+    dedup_signature = db.Column(db.LargeBinary, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(
         db.DateTime,
@@ -39,29 +77,192 @@ class Issue(db.Model):
         'IssueStatusLog',
         backref='issue',
         lazy=True,
+        order_by='IssueStatusLog.id',
         cascade="all, delete-orphan"
     )
     feedbacks = db.relationship(
         'Feedback',
         backref='issue',
         lazy=True,
+        order_by='Feedback.id',
         cascade="all, delete-orphan"
     )
 
 
 class IssueStatusLog(db.Model):
+    __table_args__ = (
+        # First 'Resolved' log per issue for time-to-resolve metrics
+        db.Index('ix_issue_status_log_status_issue', 'status', 'issue_id', 'created_at'),
+        # Incremental analytics exports
+        db.Index('ix_issue_status_log_created_at_id', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    issue_id = db.Column(db.Integer, db.ForeignKey('issue.id'), nullable=False)
+    issue_id = db.Column(db.Integer, db.ForeignKey('issue.id'), nullable=False, index=True)
     status = db.Column(db.String(50), nullable=False)
     remarks = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
 class Feedback(db.Model):
+    __table_args__ = (
+        # Incremental analytics exports
+        db.Index('ix_feedback_created_at_id', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    issue_id = db.Column(db.Integer, db.ForeignKey('issue.id'), nullable=False)
+    issue_id = db.Column(db.Integer, db.ForeignKey('issue.id'), nullable=False, index=True)
     rating = db.Column(db.Integer, nullable=False)
     comments = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
+
+def _archive_table(name: str, model, *extra, exclude=()):
+    """
+    The columns of a hot table, for the archive bind (see archive.py). Foreign
+    keys are left out because the archive may be a separate database.
+    """
+    columns = [
+        db.Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+        for column in model.__table__.columns if column.name not in exclude
+    ]
+    return db.Table(name, *columns, *extra, bind_key='archive')
+
+
+class ArchivedIssue(db.Model):
+    """A resolved issue moved out of the hot tables by archive.py; read-only, same attributes as Issue."""
+    __table__ = _archive_table(
+        'archived_issue', Issue,
+        db.Column('archived_at', db.DateTime, nullable=True),
+        # Incremental analytics exports
+        db.Index('ix_archived_issue_updated_at_id', 'updated_at', 'id'),
+        # Archived counts added to the dashboard metrics
+        db.Index('ix_archived_issue_status_area_type_dup', 'current_status', 'area', 'issue_type', 'duplicate_of_id'),
+        # The binary MinHash is only needed while an issue can still attract duplicates
+        exclude=('dedup_signature',)
+    )
+
+    status_logs = db.relationship(
+        'ArchivedIssueStatusLog',
+        primaryjoin='ArchivedIssue.id == foreign(ArchivedIssueStatusLog.issue_id)',
+        order_by='ArchivedIssueStatusLog.id',
+        lazy=True,
+        viewonly=True
+    )
+    feedbacks = db.relationship(
+        'ArchivedFeedback',
+        primaryjoin='ArchivedIssue.id == foreign(ArchivedFeedback.issue_id)',
+        order_by='ArchivedFeedback.id',
+        lazy=True,
+        viewonly=True
+    )
+
+    @property
+    def user(self):
+        # Users stay in the main database, so this is a separate lookup rather than a join
+        return db.session.get(User, self.user_id)
+
+
+class ArchivedIssueStatusLog(db.Model):
+    __table__ = _archive_table(
+        'archived_issue_status_log', IssueStatusLog,
+        db.Index('ix_archived_issue_status_log_issue_id', 'issue_id'),
+        db.Index('ix_archived_issue_status_log_created_at_id', 'created_at', 'id'),
+    )
+
+
+class ArchivedFeedback(db.Model):
+    __table__ = _archive_table(
+        'archived_feedback', Feedback,
+        db.Index('ix_archived_feedback_issue_id', 'issue_id'),
+        db.Index('ix_archived_feedback_created_at_id', 'created_at', 'id'),
+    )
+
+
+class OutboundEmail(db.Model):
+    """Outbox row for a notification email; drained by outbox.dispatch_batch()."""
+    __table_args__ = (
+        db.Index('ix_outbound_email_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    recipients = db.Column(db.Text, nullable=False)  # comma-separated
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending / sending / sent / dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+
+class StoredFile(db.Model):
+    """Reference count for a content-addressed upload (see storage.py)."""
+    key = db.Column(db.String(255), primary_key=True)  # ab/cd/<sha256>.<ext>
+    size = db.Column(db.Integer, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=1)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class GeoCluster(db.Model):
+    """Issue counts per geohash cell at each cluster precision, for the admin map (see geo.py)."""
+    __table_args__ = (
+        db.Index('ix_geo_cluster_bbox', 'precision', 'center_lat', 'center_lon'),
+    )
+
+    precision = db.Column(db.Integer, primary_key=True)
+    cell = db.Column(db.String(12), primary_key=True)
+    center_lat = db.Column(db.Float, nullable=False)
+    center_lon = db.Column(db.Float, nullable=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    open_count = db.Column(db.Integer, nullable=False, default=0)
+    # Sums of member coordinates; divided by total for the cluster's marker position
+    lat_sum = db.Column(db.Float, nullable=False, default=0.0)
+    lon_sum = db.Column(db.Float, nullable=False, default=0.0)
+
+
+class EventLog(db.Model):
+    """Recent dashboard events, relayed between worker processes by events.DatabaseBackend."""
+    __table_args__ = (
+        db.Index('ix_event_log_created_at', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    type = db.Column(db.String(40), nullable=False)
+    data = db.Column(db.Text, nullable=False)  # JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class FragmentCacheEntry(db.Model):
+    """Rendered issue fragments shared between worker processes by fragment_cache.DatabaseBackend."""
+    __table_args__ = (
+        db.Index('ix_fragment_cache_entry_issue_id', 'issue_id'),
+        db.Index('ix_fragment_cache_entry_expires_at', 'expires_at'),
+    )
+
+    key = db.Column(db.String(255), primary_key=True)
+    issue_id = db.Column(db.Integer, nullable=False)
+    html = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class RateLimitCounter(db.Model):
+    """One fixed window's request count for rate_limit.DatabaseBackend."""
+    __table_args__ = (
+        db.Index('ix_rate_limit_counter_expires_at', 'expires_at'),
+    )
+
+    key = db.Column(db.String(255), primary_key=True)
+    window = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    count = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class SchemaMigration(db.Model):
+    """One row per applied migration (see migrations.py)."""
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
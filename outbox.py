@@ -0,0 +1,194 @@
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from flask_mail import Message
+from sqlalchemy import and_
+
+from extensions import db, mail
+from models import OutboundEmail
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 60 * 60
+# A claimed row whose dispatcher died is picked up again after this long
+CLAIM_LEASE_SECONDS = 5 * 60
+
+_wakeup = threading.Event()
+
+
+def queue_email(recipients: Iterable[str], subject: str, body: str) -> OutboundEmail:
+    """
+    Add an email to the outbox in the current session. The caller commits it
+    together with the change it notifies about; nothing is sent inline.
+    """
+    email = OutboundEmail(
+        recipients=','.join(r for r in recipients if r),
+        subject=subject,
+        body=body,
+        status='pending',
+        next_attempt_at=datetime.utcnow()
+    )
+    db.session.add(email)
+    return email
+
+
+def queue_emails(messages: Iterable[tuple]) -> int:
+    """
+    queue_email for many (recipients, subject, body) messages with one
+    executemany INSERT, e.g. for bulk status updates. Returns the count.
+    """
+    now = datetime.utcnow()
+    rows = [
+        {
+            'recipients': ','.join(r for r in recipients if r),
+            'subject': subject,
+            'body': body,
+            'status': 'pending',
+            'next_attempt_at': now,
+        }
+        for recipients, subject, body in messages
+    ]
+    if rows:
+        db.session.bulk_insert_mappings(OutboundEmail, rows)
+    return len(rows)
+
+
+def notify_dispatcher():
+    """Wake a sleeping in-process dispatcher so freshly committed mail goes out promptly."""
+    _wakeup.set()
+
+
+def backoff_seconds(attempts: int) -> int:
+    return min(BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_SECONDS)
+
+
+def _claim_batch(batch_size: int):
+    """
+    Claim up to batch_size due rows for this dispatcher. Claiming pushes
+    next_attempt_at forward by the lease, so concurrent dispatchers (threads
+    in several workers, or a separate worker process) never send a row twice.
+    """
+    now = datetime.utcnow()
+    due = and_(
+        OutboundEmail.status.in_(('pending', 'sending')),
+        OutboundEmail.next_attempt_at <= now
+    )
+    ids = [
+        row.id for row in
+        db.session.query(OutboundEmail.id)
+        .filter(due)
+        .order_by(OutboundEmail.next_attempt_at)
+        .limit(batch_size)
+    ]
+    if not ids:
+        return []
+
+    token = uuid.uuid4().hex
+    # Re-checking `due` skips rows another dispatcher claimed in the meantime
+    db.session.query(OutboundEmail).filter(OutboundEmail.id.in_(ids), due).update({
+        'status': 'sending',
+        'claim_token': token,
+        'next_attempt_at': now + timedelta(seconds=CLAIM_LEASE_SECONDS)
+    }, synchronize_session=False)
+    db.session.commit()
+
+    return OutboundEmail.query.filter_by(claim_token=token, status='sending').all()
+
+
+def _record_failure(email: OutboundEmail, error: Exception):
+    email.attempts += 1
+    email.last_error = f"{type(error).__name__}: {error}"
+    email.claim_token = None
+    if email.attempts >= MAX_ATTEMPTS:
+        email.status = 'dead'
+        logger.error("Email %s moved to dead letter after %s attempts: %s",
+                     email.id, email.attempts, email.last_error)
+    else:
+        email.status = 'pending'
+        email.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff_seconds(email.attempts))
+
+
+def dispatch_batch(batch_size: int = BATCH_SIZE) -> int:
+    """
+    Send one batch of due emails over a single SMTP connection.
+    Returns the number of emails claimed (sent or failed).
+    """
+    batch = _claim_batch(batch_size)
+    if not batch:
+        return 0
+
+    try:
+        with mail.connect() as conn:
+            for email in batch:
+                try:
+                    conn.send(Message(
+                        subject=email.subject,
+                        recipients=email.recipients.split(','),
+                        body=email.body
+                    ))
+                except Exception as exc:  # noqa: BLE001 - any SMTP error is retried
+                    _record_failure(email, exc)
+                else:
+                    email.status = 'sent'
+                    email.sent_at = datetime.utcnow()
+                    email.claim_token = None
+                    email.last_error = None
+    except Exception as exc:  # noqa: BLE001 - connection-level failure
+        for email in batch:
+            if email.status == 'sending':
+                _record_failure(email, exc)
+
+    db.session.commit()
+    return len(batch)
+
+
+def drain(batch_size: int = BATCH_SIZE) -> int:
+    """Dispatch batches until nothing is due. Returns the number of emails processed."""
+    processed = 0
+    while True:
+        count = dispatch_batch(batch_size)
+        processed += count
+        if count < batch_size:
+            return processed
+
+
+class OutboxDispatcher(threading.Thread):
+    """Background thread that drains the outbox every `interval` seconds or when woken."""
+
+    def __init__(self, app, interval: float = 10.0, batch_size: int = BATCH_SIZE):
+        super().__init__(name='outbox-dispatcher', daemon=True)
+        self.app = app
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        _wakeup.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                with self.app.app_context():
+                    drain(self.batch_size)
+            except Exception:  # noqa: BLE001 - keep the dispatcher alive
+                logger.exception("Outbox dispatch failed")
+            _wakeup.wait(self.interval)
+            _wakeup.clear()
+
+
+def start_dispatcher(app) -> OutboxDispatcher:
+    dispatcher = OutboxDispatcher(
+        app,
+        interval=app.config.get('MAIL_OUTBOX_INTERVAL', 10.0),
+        batch_size=app.config.get('MAIL_OUTBOX_BATCH_SIZE', BATCH_SIZE)
+    )
+    dispatcher.start()
+    return dispatcher
@@ -0,0 +1,147 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import Issue
+
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+@dataclass
+class IssuePage:
+    """One page of issues plus the cursor needed to fetch the next one."""
+    items: List[Issue] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+
+    @property
+    def has_more(self) -> bool:
+        return self.next_cursor is not None
+
+
+def encode_cursor(issue: Issue) -> str:
+    """Encode the (created_at, id) position of an issue as an opaque URL-safe token."""
+    payload = json.dumps([issue.created_at.isoformat(), issue.id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """Decode a cursor produced by encode_cursor; malformed cursors are treated as absent."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, issue_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(issue_id)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+
+
+def clamp_page_size(limit, default: int = DEFAULT_PAGE_SIZE) -> int:
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def _parse_date(value: Optional[str]):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d') if value else None
+    except ValueError:
+        return None
+
+
+def issue_filters_from_args(args) -> dict:
+    """Admin listing filters from query-string args; blank or invalid values are dropped."""
+    filters = {
+        'status': args.get('status') or None,
+        'area': args.get('area') or None,
+        'issue_type': args.get('issue_type') or None,
+        'date_from': args.get('date_from') if _parse_date(args.get('date_from')) else None,
+        'date_to': args.get('date_to') if _parse_date(args.get('date_to')) else None,
+    }
+    return {key: value for key, value in filters.items() if value}
+
+
+def apply_issue_filters(query, filters: dict):
+    if filters.get('status'):
+        query = query.filter(Issue.current_status == filters['status'])
+    if filters.get('area'):
+        query = query.filter(Issue.area == filters['area'])
+    if filters.get('issue_type'):
+        query = query.filter(Issue.issue_type == filters['issue_type'])
+    date_from = _parse_date(filters.get('date_from'))
+    if date_from:
+        query = query.filter(Issue.created_at >= date_from)
+    date_to = _parse_date(filters.get('date_to'))
+    if date_to:
+        # date_to is inclusive of the whole day
+        query = query.filter(Issue.created_at < date_to + timedelta(days=1))
+    return query
+
+
+def issue_listing_query(status: Optional[str] = None, filters: Optional[dict] = None):
+    """
+    Base query for the dashboards. Citizen, status logs and feedback are
+    loaded up front so rendering a page costs a fixed number of queries.
+    """
+    query = Issue.query.options(
+        joinedload(Issue.user),
+        selectinload(Issue.status_logs),
+        selectinload(Issue.feedbacks),
+    )
+    filters = dict(filters or {})
+    if status:
+        filters['status'] = status
+    return apply_issue_filters(query, filters)
+
+
+def iter_issue_pages(query, batch_size: int = DEFAULT_PAGE_SIZE):
+    """Yield every issue matching query as lists of batch_size, newest first, via keyset pages."""
+    cursor = None
+    while True:
+        page = paginate_issues(query, cursor=cursor, limit=batch_size)
+        if page.items:
+            yield page.items
+        if not page.has_more:
+            return
+        cursor = page.next_cursor
+
+
+def keyset_page_query(query, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
+    """
+    The query (or select()) narrowed to the page after `cursor`, newest first,
+    with one extra row to tell whether another page follows.
+    """
+    position = decode_cursor(cursor)
+    if position:
+        created_at, issue_id = position
+        query = query.filter(or_(
+            Issue.created_at < created_at,
+            and_(Issue.created_at == created_at, Issue.id < issue_id),
+        ))
+    return query.order_by(Issue.created_at.desc(), Issue.id.desc()).limit(limit + 1)
+
+
+def issue_page(rows: List[Issue], limit: int) -> IssuePage:
+    """The IssuePage for the rows of a keyset_page_query."""
+    page = IssuePage(items=rows[:limit])
+    if len(rows) > limit:
+        page.next_cursor = encode_cursor(page.items[-1])
+    return page
+
+
+def paginate_issues(query, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE) -> IssuePage:
+    """
+    Keyset pagination over (created_at, id), newest first. Backed by the
+    ix_issue_created_at_id / ix_issue_status_created_at indexes.
+    """
+    return issue_page(keyset_page_query(query, cursor, limit).all(), limit)
@@ -0,0 +1,190 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload, selectinload
+
+from extensions import db
+from instrumentation import span
+from archive import load_archived_issue
+from models import ArchivedFeedback, ArchivedIssue, ArchivedIssueStatusLog, Feedback, Issue, IssueStatusLog, User
+
+
+logger = logging.getLogger(__name__)
+
+# Bump when the PDF layout in utils.generate_issue_pdf changes (2: print variants of the images)
+RENDER_VERSION = 2
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class PDFCache:
+    """
+    Content-addressed on-disk cache of rendered issue reports with
+    size-bounded LRU eviction (file mtime is the recency marker).
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, data: bytes) -> str:
+        path = self.path_for(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+        self.evict()
+        return path
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith('.pdf'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+
+def init_pdf_cache(app) -> PDFCache:
+    cache = PDFCache(
+        app.config.get('PDF_CACHE_DIR') or os.path.join(app.instance_path, 'pdf_cache'),
+        app.config.get('PDF_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+    )
+    app.extensions['pdf_cache'] = cache
+    return cache
+
+
+def _version_query(model, log_model, feedback_model, *columns):
+    last_log_id = select(func.max(log_model.id)).where(log_model.issue_id == model.id).scalar_subquery()
+    last_feedback_id = (
+        select(func.max(feedback_model.id)).where(feedback_model.issue_id == model.id).scalar_subquery()
+    )
+    return select(model.updated_at, last_log_id, last_feedback_id, *columns).select_from(model)
+
+
+def issue_version_query(issue_id: int):
+    """
+    One statement over everything a hot issue's report shows: the issue
+    version, latest status log and feedback ids and the citizen's contact
+    details. Its row is what cache_key_for_version hashes.
+    """
+    return (
+        _version_query(Issue, IssueStatusLog, Feedback, User.name, User.email, User.phone)
+        .outerjoin(User, User.id == Issue.user_id)
+        .where(Issue.id == issue_id)
+    )
+
+
+def archived_version_query(issue_id: int):
+    """issue_version_query for an archived issue, with its user_id in place of the contact details."""
+    return (
+        _version_query(ArchivedIssue, ArchivedIssueStatusLog, ArchivedFeedback, ArchivedIssue.user_id)
+        .where(ArchivedIssue.id == issue_id)
+    )
+
+
+def cache_key_for_version(issue_id: int, updated_at, log_id, feedback_id, name, email, phone) -> str:
+    version = (
+        f"{RENDER_VERSION}:{issue_id}:{updated_at.isoformat() if updated_at else ''}:"
+        f"{log_id}:{feedback_id}:{name}:{email}:{phone}"
+    )
+    return hashlib.sha256(version.encode('utf-8')).hexdigest()
+
+
+def _archived_version(issue_id: int) -> Optional[tuple]:
+    """The issue_version_query row of an archived issue (users stay in the main database, hence two lookups)."""
+    row = db.session.execute(archived_version_query(issue_id)).first()
+    if row is None:
+        return None
+    user = db.session.get(User, row[3])
+    return (*row[:3], user and user.name, user and user.email, user and user.phone)
+
+
+def issue_cache_key(issue_id: int) -> Optional[str]:
+    """
+    Cache key for an issue's report (see issue_version_query). Archived
+    issues are looked up in the archive. Returns None if the issue does not exist.
+    """
+    row = db.session.execute(issue_version_query(issue_id)).first() or _archived_version(issue_id)
+    if row is None:
+        return None
+    return cache_key_for_version(issue_id, *row)
+
+
+def load_issue_for_report(issue_id: int):
+    """The issue with everything its report shows, read through to the archive."""
+    return db.session.get(
+        Issue,
+        issue_id,
+        options=[
+            joinedload(Issue.user),
+            selectinload(Issue.status_logs),
+            selectinload(Issue.feedbacks),
+        ]
+    ) or load_archived_issue(issue_id)
+
+
+def render_cached(cache: PDFCache, issue_id: int, key: Optional[str] = None) -> Optional[str]:
+    """Return the cached report path for an issue, rendering it on a miss."""
+    key = key or issue_cache_key(issue_id)
+    if key is None:
+        return None
+    path = cache.get(key)
+    if path:
+        return path
+    issue = load_issue_for_report(issue_id)
+    if issue is None:
+        return None
+    # ReportLab is loaded on the first render, not when a worker boots
+    from utils import generate_issue_pdf
+    with span('pdf.render'):
+        pdf = generate_issue_pdf(issue).getvalue()
+    return cache.put(key, pdf)
+
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='pdf-warm')
+
+
+def warm_async(app, issue_id: int):
+    """Render an issue's report in the background so the next download is a cache hit."""
+    def _warm():
+        with app.app_context():
+            try:
+                render_cached(app.extensions['pdf_cache'], issue_id)
+            except Exception:  # noqa: BLE001 - warming is best effort
+                logger.exception("Failed to warm PDF cache for issue %s", issue_id)
+            finally:
+                db.session.remove()
+
+    return _executor.submit(_warm)
@@ -0,0 +1,394 @@
+"""
+Admission control: per-endpoint request budgets and concurrency caps.
+
+Budgets limit how often one client may hit an expensive endpoint (logins,
+issue reports, PDF downloads). Each budget is counted per IP address, per
+session or per user. A budget of "10/minute" admits 10 requests per rolling
+minute. It is counted as a sliding window: the current fixed window's count
+plus the previous window's count, weighted by how much of it still overlaps
+the last minute. So a client refills its budget steadily, as with a token
+bucket, and cannot double it at a window boundary. The counters live in this
+process ('memory'), in Redis ('redis') or in the database ('database'); the
+last two are shared by all workers. If Redis or the database cannot be
+reached, those backends fall back to this process's counters rather than
+admitting everyone.
+
+Concurrency caps bound how many PDF renders, bulk exports and image uploads
+one worker runs at once. A request waits briefly for a free slot and then
+gets a 429, so a burst of cache misses cannot queue up every worker thread
+behind ReportLab or Pillow. Every rejection is a 429 with a Retry-After
+header.
+"""
+import asyncio
+import logging
+import math
+import re
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask import current_app, has_request_context, request, session
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from werkzeug.exceptions import TooManyRequests
+
+from extensions import db
+from instrumentation import REGISTRY, Counter
+from models import RateLimitCounter
+
+
+logger = logging.getLogger(__name__)
+
+# "[METHOD] endpoint = scope:count/period, ...; ..." where scope is ip, session or user.
+# RATE_LIMITS uses the same syntax; its entries replace these per method and endpoint
+DEFAULT_RATE_LIMITS = (
+    'POST auth.login = ip:30/minute, user:10/minute;'
+    'POST auth.register = ip:10/hour;'
+    'POST citizen.report_issue = user:10/minute, user:100/day, ip:30/minute;'
+    'POST api.create_issue = user:10/minute, user:100/day, ip:30/minute;'
+    'POST citizen.submit_feedback = session:20/minute, ip:60/minute;'
+    'POST api.create_feedback = user:20/minute, ip:60/minute;'
+    'GET reports.download_issue_pdf = session:30/minute, ip:120/minute;'
+    'GET reports.export_issue_reports = user:5/minute'
+)
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+SCOPES = ('ip', 'session', 'user')
+DEFAULT_MAX_KEYS = 100000
+
+RATE_LIMITED = REGISTRY.register(Counter(
+    'civiccare_rate_limited_total', 'Requests rejected with 429, by endpoint and the budget or cap that was full.',
+    ('endpoint', 'reason')
+))
+
+_BUDGET = re.compile(r'(?P<scope>\w+):(?P<count>\d+)/(?P<period>\w+)')
+
+
+class Budget:
+    def __init__(self, scope: str, count: int, period: int):
+        if scope not in SCOPES:
+            raise ValueError(f"Unknown rate limit scope: {scope}")
+        self.scope = scope
+        self.count = count
+        self.period = period
+
+    def __repr__(self):
+        return f'{self.scope}:{self.count}/{self.period}s'
+
+
+def parse_rate_limits(spec: str) -> Dict[Tuple[Optional[str], str], List[Budget]]:
+    """{(method or None, endpoint): [Budget, ...]} from the DEFAULT_RATE_LIMITS syntax."""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in (spec or '').split(';'))):
+        target, _, budgets = entry.partition('=')
+        words = target.split()
+        if len(words) not in (1, 2):
+            raise ValueError(f"Invalid rate limit target: {target!r}")
+        method, endpoint = (words[0].upper(), words[1]) if len(words) == 2 else (None, words[0])
+        parsed = []
+        for budget in filter(None, (part.strip() for part in budgets.split(','))):
+            match = _BUDGET.fullmatch(budget)
+            if not match:
+                raise ValueError(f"Invalid rate limit budget: {budget!r}")
+            period = match['period'].rstrip('s')
+            if period not in PERIODS:
+                raise ValueError(f"Unknown rate limit period: {match['period']}")
+            parsed.append(Budget(match['scope'], int(match['count']), PERIODS[period]))
+        # An empty budget list ("POST auth.login =") switches the endpoint's limits off
+        limits[(method, endpoint)] = parsed
+    return limits
+
+
+def _retry_after(previous: int, current: int, limit: int, period: int, elapsed: float) -> int:
+    """Seconds until the sliding window has room for one more request."""
+    if limit < 1:
+        # A zero budget closes the endpoint; there is never room, so ask again next window
+        wait = period - elapsed
+    elif current + 1 > limit:
+        # Wait for the next window, then for the current count to slide out far enough
+        wait = (period - elapsed) + period * max(0.0, 1 - (limit - 1) / current)
+    else:
+        wait = period * (1 - (limit - current - 1) / previous) - elapsed
+    return max(1, math.ceil(wait))
+
+
+def _over_budget(previous: int, current: int, limit: int, period: int, elapsed: float) -> bool:
+    """Whether one more request would exceed the budget (current excludes it)."""
+    return previous * (1 - elapsed / period) + current + 1 > limit
+
+
+class MemoryBackend:
+    """Sliding-window counters for this process only."""
+
+    def __init__(self, max_keys: int = DEFAULT_MAX_KEYS):
+        self.max_keys = max_keys
+        # key -> [period, window index, previous window's count, current window's count]
+        self._windows: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._windows)
+
+    def hit(self, key: str, limit: int, period: int, now: float) -> Optional[int]:
+        """Count a request against `key`. Returns None if admitted, else the Retry-After seconds."""
+        index, elapsed = divmod(now, period)
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is None:
+                if len(self._windows) >= self.max_keys:
+                    self._prune(now)
+                entry = self._windows[key] = [period, index, 0, 0]
+            elif entry[1] != index:
+                entry[2] = entry[3] if entry[1] == index - 1 else 0
+                entry[1], entry[3] = index, 0
+            if _over_budget(entry[2], entry[3], limit, period, elapsed):
+                return _retry_after(entry[2], entry[3], limit, period, elapsed)
+            entry[3] += 1
+            return None
+
+    def _prune(self, now: float):
+        for key, (period, index, _, _) in list(self._windows.items()):
+            if now // period > index + 1:
+                del self._windows[key]
+        # Still full of live clients: forget the oldest rather than grow without bound
+        for key in list(self._windows)[:max(0, len(self._windows) - self.max_keys + 1)]:
+            del self._windows[key]
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+
+
+class RedisBackend:
+    """
+    Sliding-window counters in Redis, shared by every worker process. Each
+    window is one INCR'd key that expires after two periods. When Redis
+    fails, requests are counted by the local MemoryBackend instead.
+    """
+
+    def __init__(self, url: str, local: MemoryBackend, prefix: str = 'civiccare:ratelimit:'):
+        import redis  # optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url)
+        self.errors = redis.RedisError
+        self.local = local
+        self.prefix = prefix
+
+    def hit(self, key: str, limit: int, period: int, now: float) -> Optional[int]:
+        index, elapsed = divmod(now, period)
+        current_key = f'{self.prefix}{key}:{int(index)}'
+        try:
+            pipe = self.client.pipeline(transaction=True)
+            pipe.get(f'{self.prefix}{key}:{int(index) - 1}')
+            pipe.incr(current_key)
+            pipe.expire(current_key, period * 2)
+            previous, current, _ = pipe.execute()
+            previous = int(previous or 0)
+            # The INCR counted this request already; take it back if it is turned away
+            if _over_budget(previous, current - 1, limit, period, elapsed):
+                self.client.decr(current_key)
+                return _retry_after(previous, current - 1, limit, period, elapsed)
+            return None
+        except self.errors:
+            logger.warning("Rate limit check in Redis failed; using this process's counters", exc_info=True)
+            return self.local.hit(key, limit, period, now)
+
+    def clear(self):
+        self.local.clear()
+
+
+class DatabaseBackend:
+    """
+    Stand-in for Redis that needs no extra service: the window counts live in
+    the RateLimitCounter table, shared by every worker process. Expired
+    windows are pruned every PRUNE_INTERVAL seconds by whichever process
+    counts next. When the database fails, requests are counted by the local
+    MemoryBackend instead.
+    """
+
+    PRUNE_INTERVAL = 60.0
+
+    def __init__(self, local: MemoryBackend):
+        self.local = local
+        self._next_prune = 0.0
+
+    def hit(self, key: str, limit: int, period: int, now: float) -> Optional[int]:
+        index, elapsed = divmod(now, period)
+        try:
+            try:
+                return self._hit(key, int(index), limit, period, elapsed)
+            except IntegrityError:
+                # Another worker inserted this window's row first; it exists now
+                return self._hit(key, int(index), limit, period, elapsed)
+        except SQLAlchemyError:
+            logger.warning("Rate limit check in the database failed; using this process's counters", exc_info=True)
+            return self.local.hit(key, limit, period, now)
+
+    def _hit(self, key: str, index: int, limit: int, period: int, elapsed: float) -> Optional[int]:
+        table = RateLimitCounter.__table__
+        this_window = (table.c.key == key) & (table.c.window == index)
+        # Own short transaction, independent of the request's session. The UPDATE takes
+        # the row lock, so concurrent requests for one key are counted one at a time
+        with db.engine.begin() as conn:
+            counted = conn.execute(update(table).where(this_window).values(count=table.c.count + 1)).rowcount
+            if not counted:
+                conn.execute(insert(table).values(
+                    key=key, window=index, count=1,
+                    expires_at=datetime.utcnow() + timedelta(seconds=period * 2),
+                ))
+            counts = dict(conn.execute(
+                select(table.c.window, table.c.count).where(table.c.key == key, table.c.window.in_((index - 1, index)))
+            ).all())
+            previous, current = counts.get(index - 1, 0), counts[index]
+            # This request is counted already; take it back if it is turned away
+            if _over_budget(previous, current - 1, limit, period, elapsed):
+                conn.execute(update(table).where(this_window).values(count=table.c.count - 1))
+                return _retry_after(previous, current - 1, limit, period, elapsed)
+            if time.monotonic() >= self._next_prune:
+                self._next_prune = time.monotonic() + self.PRUNE_INTERVAL
+                conn.execute(delete(table).where(table.c.expires_at <= datetime.utcnow()))
+            return None
+
+    def clear(self):
+        self.local.clear()
+
+
+class ConcurrencyLimit:
+    """
+    At most `limit` holders at once in this process; 0 means unlimited. A
+    request waits up to `wait` seconds for a slot, then gets a 429.
+    """
+
+    def __init__(self, name: str, limit: int, wait: float = 0.5, retry_after: int = 5):
+        self.name = name
+        self.limit = limit
+        self.wait = wait
+        self.retry_after = retry_after
+        self._semaphore = threading.BoundedSemaphore(limit) if limit > 0 else None
+
+    def acquire(self, endpoint: Optional[str] = None):
+        if self._semaphore is not None and not self._semaphore.acquire(timeout=self.wait):
+            if endpoint is None:
+                endpoint = (request.endpoint or 'unmatched') if has_request_context() else 'background'
+            RATE_LIMITED.inc(endpoint=endpoint, reason=self.name)
+            raise TooManyRequests(
+                f'The server is busy with other {self.name} requests. Please try again shortly.',
+                retry_after=self.retry_after
+            )
+
+    async def acquire_async(self, endpoint: str):
+        """acquire() for async views: the wait happens in a worker thread rather than on the event loop."""
+        if self._semaphore is not None and not self._semaphore.acquire(blocking=False):
+            await asyncio.to_thread(self.acquire, endpoint)
+
+    def release(self):
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def concurrency_limit(name: str) -> ConcurrencyLimit:
+    """The per-process cap for `name` ('pdf', 'export' or 'image'), for use as a context manager."""
+    return current_app.extensions['rate_limits'].concurrency[name]
+
+
+def hold_while_streaming(name: str, response):
+    """Take a `name` slot until a streamed response is closed (sent, or abandoned by the client)."""
+    limit = concurrency_limit(name)
+    limit.acquire()
+    response.call_on_close(limit.release)
+    return response
+
+
+class RateLimiter:
+    def __init__(self, backend, limits: Dict[Tuple[Optional[str], str], List[Budget]],
+                 concurrency: Dict[str, ConcurrencyLimit]):
+        self.backend = backend
+        self.limits = limits
+        self.concurrency = concurrency
+
+    def budgets(self, method: str, endpoint: Optional[str]) -> List[Budget]:
+        budgets = self.limits.get((method, endpoint))
+        return self.limits.get((None, endpoint), []) if budgets is None else budgets
+
+    @staticmethod
+    def identity(scope: str) -> Optional[str]:
+        """Who a request is counted against for `scope`, or None to skip the budget."""
+        if scope == 'ip':
+            return request.remote_addr
+        if scope == 'session':
+            # Cookie sessions have no id of their own; clearing cookies resets this one,
+            # so session budgets are always paired with an IP budget
+            return session.setdefault('rate_limit_id', secrets.token_urlsafe(12))
+        if 'user_id' in session:
+            return f"id:{session['user_id']}"
+        # Not logged in: login attempts count against the account being tried from this
+        # address, so nobody else can spend a user's budget and lock them out
+        username = request.form.get('username') if request.method == 'POST' else None
+        return f'name:{request.remote_addr}:{username.strip().lower()}' if username else None
+
+    def check(self):
+        """before_request hook: 429 once any of the endpoint's budgets is spent."""
+        self.enforce(request.method, request.endpoint, self.identity)
+
+    def enforce(self, method: str, endpoint: Optional[str], identity: Callable[[str], Optional[str]]):
+        """Count a request against the endpoint's budgets; identity(scope) names the client."""
+        budgets = self.budgets(method, endpoint)
+        if not budgets:
+            return
+        now = time.time()
+        for budget in budgets:
+            client = identity(budget.scope)
+            if client is None:
+                continue
+            key = f'{endpoint}:{budget.scope}:{budget.count}/{budget.period}:{client}'
+            retry_after = self.backend.hit(key, budget.count, budget.period, now)
+            if retry_after is not None:
+                RATE_LIMITED.inc(endpoint=endpoint, reason=budget.scope)
+                raise TooManyRequests(
+                    f'Too many requests. Please try again in {retry_after} seconds.', retry_after=retry_after
+                )
+
+
+def init_rate_limits(app) -> RateLimiter:
+    config = app.config
+    limits = parse_rate_limits(DEFAULT_RATE_LIMITS)
+    limits.update(parse_rate_limits(config.get('RATE_LIMITS')))
+
+    backend_name = config.get('RATE_LIMIT_BACKEND', 'memory')
+    max_keys = config.get('RATE_LIMIT_MAX_KEYS', DEFAULT_MAX_KEYS)
+    if backend_name == 'memory':
+        backend = MemoryBackend(max_keys)
+    elif backend_name == 'redis':
+        backend = RedisBackend(config['RATE_LIMIT_REDIS_URL'], MemoryBackend(max_keys))
+    elif backend_name == 'database':
+        backend = DatabaseBackend(MemoryBackend(max_keys))
+    else:
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend_name}")
+
+    wait = config.get('ADMISSION_WAIT_SECONDS', 0.5)
+    retry_after = config.get('ADMISSION_RETRY_AFTER', 5)
+    concurrency = {
+        name: ConcurrencyLimit(name, config.get(setting, default), wait, retry_after)
+        for name, setting, default in (
+            ('pdf', 'PDF_RENDER_CONCURRENCY', 2),
+            ('export', 'EXPORT_CONCURRENCY', 1),
+            ('image', 'IMAGE_UPLOAD_CONCURRENCY', 4),
+        )
+    }
+    limiter = RateLimiter(backend, limits, concurrency)
+    app.extensions['rate_limits'] = limiter
+    if config.get('RATE_LIMIT_ENABLED', True):
+        app.before_request(limiter.check)
+    if config.get('PROXY_FIX_X_FOR'):
+        # Behind a reverse proxy every request comes from the proxy's address; take the
+        # client's from X-Forwarded-For, trusting that many proxies
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=config['PROXY_FIX_X_FOR'], x_proto=config['PROXY_FIX_X_FOR'])
+    return limiter
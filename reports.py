@@ -0,0 +1,84 @@
+"""
+PDF reports: single-issue downloads (served from the PDF cache) and the
+admin's multi-issue PDF / ZIP export.
+
+ReportLab is only imported when a report is actually rendered (pdf_cache
+and bulk_export load it on first use), so workers that never serve a PDF
+never pay for it.
+"""
+from datetime import datetime
+
+from flask import (
+    Blueprint, abort, current_app, flash, redirect, request, send_file, session, stream_with_context, url_for
+)
+
+from pagination import issue_filters_from_args
+from pdf_cache import issue_cache_key, render_cached
+from rate_limit import concurrency_limit, hold_while_streaming
+
+
+reports = Blueprint('reports', __name__)
+
+
+@reports.route('/admin/reports/export')
+def export_issue_reports():
+    if 'user_id' not in session or session.get('role') != 'admin':
+        flash('Please log in as an admin to access this page.', 'error')
+        return redirect(url_for('auth.login'))
+
+    from bulk_export import exceeds_combined_limit, stream_combined_pdf, stream_issue_zip
+
+    filters = issue_filters_from_args(request.args)
+    stamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+    if request.args.get('format') == 'pdf':
+        limit = current_app.config['COMBINED_PDF_MAX_ISSUES']
+        if limit and exceeds_combined_limit(filters, limit):
+            flash(f'A combined PDF can hold at most {limit} issues. Narrow the filters or export a ZIP instead.',
+                  'error')
+            return redirect(url_for('admin.admin_dashboard', **filters))
+        body, mimetype, filename = stream_combined_pdf(filters), 'application/pdf', f'issues_report_{stamp}.pdf'
+    else:
+        body, mimetype, filename = stream_issue_zip(filters), 'application/zip', f'issues_reports_{stamp}.zip'
+
+    response = current_app.response_class(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    # The export renders in a process pool for as long as it streams, so only a few run at once
+    return hold_while_streaming('export', response)
+
+
+@reports.route('/issue/<int:issue_id>/pdf')
+def download_issue_pdf(issue_id):
+    if 'user_id' not in session:
+        flash('Please log in to download reports.', 'error')
+        return redirect(url_for('auth.login'))
+    # Allow download if user is admin or the issue belongs to the user (but since all issues are shown, allow for now)
+    key = issue_cache_key(issue_id)
+    if key is None:
+        abort(404)
+    if key in request.if_none_match:
+        response = current_app.response_class(status=304)
+        response.set_etag(key)
+        return response
+
+    cache = current_app.extensions['pdf_cache']
+    path = cache.get(key)
+    if path is None:
+        # Cache hits are cheap; only renders wait for one of the per-process slots
+        with concurrency_limit('pdf'):
+            try:
+                path = render_cached(cache, issue_id, key)
+            except Exception:
+                current_app.logger.exception("Error generating PDF for issue %s", issue_id)
+                flash('Error generating PDF report.', 'error')
+                return redirect(url_for('citizen.user_dashboard'))
+
+    response = send_file(
+        path,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=f'issue_{issue_id}_report.pdf',
+        etag=key,
+        conditional=True
+    )
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,156 @@
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import column, func, literal_column, or_, table, text
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+from models import Issue
+from pagination import apply_issue_filters, issue_listing_query
+
+
+FTS_TABLE = 'issue_fts'
+
+# Indexed Issue columns and their BM25 weights (higher = more important)
+FTS_COLUMNS = {
+    'issue_type': 2.0,
+    'area': 3.0,
+    'street': 2.0,
+    'landmark': 2.0,
+    'description': 1.0,
+    'authority_remarks': 1.0,
+    'ai_summary': 0.5,
+}
+
+MAX_RESULTS = 200
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Dropped from queries such as "pothole near school in Adyar" so they do not have to match
+STOPWORDS = {'a', 'an', 'and', 'at', 'by', 'for', 'in', 'is', 'near', 'of', 'on', 'or', 'the', 'to'}
+
+
+def fts_enabled() -> bool:
+    return db.engine.dialect.name == 'sqlite'
+
+
+def ensure_search_index():
+    """
+    Create the FTS5 table over Issue text columns and the triggers that keep
+    it in sync with every INSERT/UPDATE/DELETE on issue. A newly created
+    index is populated from the existing rows. No-op on other databases,
+    which use the LIKE fallback in search_issues().
+    """
+    if not fts_enabled():
+        return
+
+    columns = ', '.join(FTS_COLUMNS)
+    new_values = ', '.join(f'new.{name}' for name in FTS_COLUMNS)
+    old_values = ', '.join(f'old.{name}' for name in FTS_COLUMNS)
+
+    with db.engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': FTS_TABLE}
+        ).first()
+        if exists:
+            return
+
+        try:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                f"{columns}, content='issue', content_rowid='id', "
+                f"tokenize='porter unicode61')"
+            ))
+        except OperationalError:
+            # SQLite built without FTS5; search falls back to LIKE
+            return
+
+        conn.execute(text(
+            f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON issue BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON issue BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) "
+            f"VALUES ('delete', old.id, {old_values}); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF {columns} ON issue BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) "
+            f"VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+        ))
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def search_terms(q: str) -> List[str]:
+    terms = _TOKEN_RE.findall(q or '')
+    return [term for term in terms if term.lower() not in STOPWORDS] or terms
+
+
+def _match_expression(terms: List[str], operator: str) -> str:
+    # Quote every term so user input can never inject FTS5 query syntax; the last is a prefix match
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return f' {operator} '.join(quoted)
+
+
+def _fts_query(base_query, terms: List[str], operator: str):
+    fts = table(FTS_TABLE, column('rowid'))
+    return (
+        base_query
+        .join(fts, fts.c.rowid == Issue.id)
+        .filter(literal_column(FTS_TABLE).op('MATCH')(_match_expression(terms, operator)))
+    )
+
+
+def _fts_has_match(terms: List[str], filters: dict, operator: str) -> bool:
+    # Unranked, so SQLite can stop at the first hit instead of scoring every match
+    query = _fts_query(apply_issue_filters(db.session.query(Issue.id), filters), terms, operator)
+    return query.first() is not None
+
+
+def _fts_search(terms: List[str], filters: dict, limit: int, offset: int, operator: str):
+    rank = func.bm25(literal_column(FTS_TABLE), *FTS_COLUMNS.values()).label('rank')
+    query = (
+        _fts_query(issue_listing_query(filters=filters), terms, operator)
+        .add_columns(rank)
+        .order_by(rank)
+    )
+    return query.offset(offset).limit(limit).all()
+
+
+def _like_search(terms: List[str], filters: dict, limit: int, offset: int):
+    query = issue_listing_query(filters=filters)
+    for term in terms:
+        pattern = f'%{term}%'
+        query = query.filter(or_(*(
+            getattr(Issue, name).ilike(pattern) for name in FTS_COLUMNS
+        )))
+    rows = query.order_by(Issue.created_at.desc(), Issue.id.desc()).offset(offset).limit(limit).all()
+    return [(issue, None) for issue in rows]
+
+
+def search_issues(q: str, filters: Optional[dict] = None, limit: int = 25,
+                  offset: int = 0) -> List[Tuple[Issue, Optional[float]]]:
+    """
+    Ranked full-text search over issue text, combinable with the admin
+    listing filters. Returns (issue, bm25 score) pairs, best match first;
+    every term must match, falling back to any-term matching when that
+    finds nothing. Scores are None on the LIKE fallback.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return []
+    filters = filters or {}
+    limit = max(1, min(limit, MAX_RESULTS))
+
+    if fts_enabled() and db.session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = :name"), {'name': FTS_TABLE}
+    ).first():
+        operator = 'AND'
+        if len(terms) > 1 and not _fts_has_match(terms, filters, 'AND'):
+            operator = 'OR'
+        return [tuple(row) for row in _fts_search(terms, filters, limit, offset, operator)]
+    return _like_search(terms, filters, limit, offset)
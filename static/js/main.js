@@ -4,6 +4,184 @@ document.addEventListener("DOMContentLoaded", () => {
     card.addEventListener("mouseenter", () => card.classList.add("hovered"));
     card.addEventListener("mouseleave", () => card.classList.remove("hovered"));
   });
+
+  // Optional browser geolocation for issue reports: fills lat/lon and selects the nearest area
+  const locateButton = document.getElementById("use-location");
+  const areaSelect = document.getElementById("area");
+  if (locateButton && areaSelect && navigator.geolocation) {
+    const status = document.getElementById("location-status");
+    const areas = JSON.parse(areaSelect.dataset.areaCoordinates || "{}");
+    const distance = (lat1, lon1, lat2, lon2) => {
+      const x = (lon2 - lon1) * Math.cos(((lat1 + lat2) / 2) * Math.PI / 180);
+      return x * x + (lat2 - lat1) * (lat2 - lat1);
+    };
+
+    locateButton.addEventListener("click", () => {
+      status.textContent = "Locating…";
+      navigator.geolocation.getCurrentPosition(
+        (position) => {
+          const { latitude, longitude, accuracy } = position.coords;
+          document.getElementById("latitude").value = latitude.toFixed(6);
+          document.getElementById("longitude").value = longitude.toFixed(6);
+          let nearest = null;
+          Object.entries(areas).forEach(([name, [lat, lon]]) => {
+            if (!nearest || distance(latitude, longitude, lat, lon) < nearest.d) {
+              nearest = { name, d: distance(latitude, longitude, lat, lon) };
+            }
+          });
+          if (nearest && !areaSelect.value) areaSelect.value = nearest.name;
+          status.textContent = `Location captured (±${Math.round(accuracy)} m).`;
+        },
+        () => {
+          status.textContent = "Could not get your location; the selected area will be used.";
+        },
+        { enableHighAccuracy: true, timeout: 10000, maximumAge: 60000 }
+      );
+    });
+  } else if (locateButton) {
+    locateButton.hidden = true;
+  }
+
+  // Confirmation for forms that change many records at once
+  document.querySelectorAll("form[data-confirm]").forEach((form) => {
+    form.addEventListener("submit", (event) => {
+      if (!window.confirm(form.dataset.confirm)) event.preventDefault();
+    });
+  });
+
+  // Live updates: patch the dashboards from the server's event stream instead of reloading
+  const live = document.querySelector("[data-live-events]");
+  if (live && window.EventSource) {
+    const source = new EventSource(live.dataset.liveEvents);
+    const notice = live.querySelector(".live-notice");
+    let unseen = 0;
+
+    const text = (tag, value, className) => {
+      const el = document.createElement(tag);
+      if (className) el.className = className;
+      el.textContent = value;
+      return el;
+    };
+    const flash = (el) => {
+      el.classList.remove("live-updated");
+      void el.offsetWidth; // restart the animation
+      el.classList.add("live-updated");
+    };
+    const pill = (status) => text("span", status, `status-pill status-${status.toLowerCase()}`);
+    const bumpMetric = (name, delta) => {
+      const value = live.querySelector(`[data-metric="${name}"] .metric-value`);
+      if (value && /^\d+$/.test(value.textContent.trim())) {
+        value.textContent = parseInt(value.textContent, 10) + delta;
+        flash(value);
+      }
+    };
+    const announce = () => {
+      if (!notice) return;
+      unseen += 1;
+      notice.textContent = `${unseen} new issue${unseen === 1 ? "" : "s"} reported since this page loaded. `;
+      const reload = text("a", "Show all", "");
+      reload.href = window.location.pathname + window.location.search;
+      notice.appendChild(reload);
+      notice.hidden = false;
+    };
+
+    const adminRow = (issue) => {
+      const row = document.createElement("tr");
+      row.dataset.issueId = issue.id;
+      const id = text("td", `#${issue.id}`);
+      if (issue.duplicate_of_id) {
+        id.append(document.createElement("br"), text("span", `dup. of #${issue.duplicate_of_id}`, "cell-subtext duplicate-note"));
+      }
+      const type = text("td", issue.issue_type);
+      if (issue.department) type.append(document.createElement("br"), text("span", issue.department, "cell-subtext"));
+      const status = document.createElement("td");
+      status.appendChild(pill(issue.status));
+      const actions = document.createElement("td");
+      const manage = text("a", "Reload to manage", "cell-subtext");
+      manage.href = window.location.pathname + window.location.search;
+      actions.appendChild(manage);
+      row.append(id, type, text("td", issue.area), text("td", issue.citizen), status,
+        text("td", (issue.created_at || "").split(",")[0]), actions);
+      return row;
+    };
+
+    source.addEventListener("issue.created", (event) => {
+      const issue = JSON.parse(event.data);
+      const rows = document.getElementById("issue-rows");
+      if (!issue.duplicate_of_id) {
+        bumpMetric("total", 1);
+        bumpMetric(issue.status, 1);
+      }
+      if (rows && live.dataset.liveInsert === "true" && !rows.querySelector(`[data-issue-id="${issue.id}"]`)) {
+        const row = adminRow(issue);
+        rows.prepend(row);
+        flash(row);
+      } else if (!document.querySelector(`[data-issue-id="${issue.id}"]`)) {
+        announce();
+      }
+    });
+
+    const patchIssue = (id, status, remarks, updatedAt) => {
+      document.querySelectorAll(`[data-issue-id="${id}"]`).forEach((el) => {
+        const current = el.querySelector(".status-pill");
+        if (current && status) {
+          const updated = pill(status);
+          current.replaceWith(updated);
+          flash(updated);
+        }
+        const timeline = el.querySelector(".timeline");
+        if (timeline) {
+          const item = document.createElement("div");
+          item.className = "timeline-item";
+          const content = document.createElement("div");
+          content.className = "timeline-content";
+          const title = status || (current && current.textContent) || "";
+          content.append(text("div", title, "timeline-title"), text("div", updatedAt, "timeline-meta"));
+          if (remarks) content.appendChild(text("div", remarks, "timeline-remarks"));
+          item.append(text("div", "", "timeline-dot"), content);
+          timeline.appendChild(item);
+          flash(item);
+        }
+      });
+    };
+
+    source.addEventListener("issue.status_changed", (event) => {
+      const issue = JSON.parse(event.data);
+      if (!issue.duplicate_of_id && issue.previous_status !== issue.status) {
+        bumpMetric(issue.previous_status, -1);
+        bumpMetric(issue.status, 1);
+      }
+      patchIssue(issue.id, issue.status, issue.remarks, issue.updated_at);
+    });
+
+    source.addEventListener("issues.bulk_updated", (event) => {
+      const update = JSON.parse(event.data);
+      if (update.status) {
+        Object.entries(update.previous_counts).forEach(([previous, count]) => {
+          if (previous !== update.status) {
+            bumpMetric(previous, -count);
+            bumpMetric(update.status, count);
+          }
+        });
+      }
+      update.ids.forEach((id) => patchIssue(id, update.status, update.remarks, update.updated_at));
+    });
+
+    source.addEventListener("feedback.submitted", (event) => {
+      const feedback = JSON.parse(event.data);
+      const form = document.querySelector(`[data-issue-id="${feedback.issue_id}"] .feedback-form`);
+      if (form) {
+        const summary = document.createElement("div");
+        summary.className = "feedback-summary";
+        summary.append(text("h4", "Feedback Submitted"), text("p", `Rating: ${feedback.rating}/5`));
+        if (feedback.comments) summary.appendChild(text("p", `Comments: ${feedback.comments}`));
+        form.replaceWith(summary);
+      }
+    });
+
+    // The server fell behind for this page; a reload is cheaper than replaying
+    source.addEventListener("reset", () => window.location.reload());
+  }
 });
 
 
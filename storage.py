@@ -0,0 +1,316 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Optional, Tuple
+
+from flask import send_from_directory, url_for
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import StoredFile
+
+
+CHUNK_SIZE = 64 * 1024
+# Files spooled in memory up to this size before spilling to a temp file (S3 uploads)
+SPOOL_MAX_SIZE = 1024 * 1024
+# Unreferenced objects touched more recently than this are left for the next collection:
+# an upload stores its object before its transaction counts the reference
+GC_GRACE_SECONDS = 3600
+
+
+def shard_key(sha256: str, ext: str) -> str:
+    """Sharded object key: ab/cd/<sha256>.<ext>."""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}.{ext}"
+
+
+def is_legacy_path(value: str) -> bool:
+    """Uploads stored before content addressing hold a path like static/uploads/before_<ts>_<name>."""
+    return value.replace('\\', '/').startswith('static/')
+
+
+def _hash_to_file(stream, fh) -> Tuple[str, int]:
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        fh.write(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class LocalStorage:
+    """
+    Content-addressed store under a directory, served from static_prefix in
+    the Flask static folder or, when static_prefix is None, by the 'uploads'
+    endpoint (see init_storage).
+    """
+
+    def __init__(self, root: str, static_prefix: Optional[str] = 'uploads'):
+        self.root = root
+        self.static_prefix = static_prefix
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        if is_legacy_path(key):
+            return key
+        return os.path.join(self.root, *key.split('/'))
+
+    def save_stream(self, stream, ext: str) -> Tuple[str, int]:
+        """
+        Hash the stream while writing it to a temp file in chunks, then move it
+        to its content address. Returns (key, size); an identical existing
+        object is kept and the new copy discarded.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                sha256, size = _hash_to_file(stream, fh)
+            key = shard_key(sha256, ext)
+            target = self.path(key)
+            if os.path.exists(target):
+                os.remove(tmp_path)
+                # Fresh mtime, so collect_garbage() spares it until the upload counts its reference
+                os.utime(target)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(tmp_path, target)
+            return key, size
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put_file(self, key: str, src_path: str):
+        """Store a locally produced file (e.g. an image variant) under key, consuming src_path."""
+        target = self.path(key)
+        if os.path.abspath(src_path) == os.path.abspath(target):
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.replace(src_path, target)
+        except OSError:
+            # src_path is on another filesystem: copy next to the target, then swap in atomically
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as dst, open(src_path, 'rb') as src:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            os.replace(tmp_path, target)
+            os.remove(src_path)
+
+    def local_path(self, key: str) -> str:
+        return self.path(key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def modified_at(self, key: str) -> Optional[float]:
+        try:
+            return os.path.getmtime(self.path(key))
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def url(self, key: str) -> str:
+        if is_legacy_path(key):
+            return url_for('static', filename=key.replace('\\', '/').split('static/')[-1])
+        if self.static_prefix is None:
+            return url_for('uploads', filename=key)
+        return url_for('static', filename=f"{self.static_prefix}/{key}")
+
+
+class S3Storage:
+    """
+    Content-addressed store in an S3-compatible bucket (AWS, MinIO, or a
+    local moto server as a stand-in). Objects are mirrored into a local
+    cache directory when a file path is needed (image processing, PDFs).
+    """
+
+    def __init__(self, bucket: str, cache_dir: str, endpoint_url: Optional[str] = None,
+                 prefix: str = '', public_url: Optional[str] = None, legacy_root: str = '.'):
+        import boto3  # optional dependency, only needed for this backend
+
+        self.client = boto3.client('s3', endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.public_url = public_url.rstrip('/') if public_url else None
+        self.cache_dir = cache_dir
+        self.legacy_root = legacy_root
+        self._known = set()
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def save_stream(self, stream, ext: str) -> Tuple[str, int]:
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+            sha256, size = _hash_to_file(stream, spool)
+            key = shard_key(sha256, ext)
+            if not (self.exists(key) and self._touch(key)):
+                spool.seek(0)
+                self.client.upload_fileobj(spool, self.bucket, self._object_key(key))
+                self._remember(key)
+        return key, size
+
+    def _touch(self, key: str) -> bool:
+        """Refresh an existing object's LastModified (see collect_garbage); False if it is gone."""
+        object_key = self._object_key(key)
+        try:
+            self.client.copy_object(Bucket=self.bucket, Key=object_key, MetadataDirective='REPLACE',
+                                    CopySource={'Bucket': self.bucket, 'Key': object_key})
+        except self.client.exceptions.ClientError:
+            with self._lock:
+                self._known.discard(key)
+            return False
+        return True
+
+    def put_file(self, key: str, src_path: str):
+        self.client.upload_file(src_path, self.bucket, self._object_key(key))
+        cached = self._cache_path(key)
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        shutil.move(src_path, cached)
+        self._remember(key)
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, *key.split('/'))
+
+    def local_path(self, key: str) -> str:
+        if is_legacy_path(key):
+            return os.path.join(self.legacy_root, key)
+        cached = self._cache_path(key)
+        if not os.path.exists(cached):
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cached))
+            with os.fdopen(fd, 'wb') as fh:
+                self.client.download_fileobj(self.bucket, self._object_key(key), fh)
+            os.replace(tmp_path, cached)
+        return cached
+
+    def _remember(self, key: str):
+        with self._lock:
+            self._known.add(key)
+
+    def exists(self, key: str) -> bool:
+        if is_legacy_path(key):
+            return os.path.exists(os.path.join(self.legacy_root, key))
+        if key in self._known:
+            return True
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except self.client.exceptions.ClientError:
+            return False
+        self._remember(key)
+        return True
+
+    def modified_at(self, key: str) -> Optional[float]:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except self.client.exceptions.ClientError:
+            return None
+        return head['LastModified'].timestamp()
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        with self._lock:
+            self._known.discard(key)
+        try:
+            os.remove(self._cache_path(key))
+        except FileNotFoundError:
+            pass
+
+    def url(self, key: str) -> str:
+        if is_legacy_path(key):
+            return url_for('static', filename=key.replace('\\', '/').split('static/')[-1])
+        if self.public_url:
+            return f"{self.public_url}/{self._object_key(key)}"
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': self._object_key(key)},
+            ExpiresIn=3600
+        )
+
+
+def init_storage(app):
+    backend = app.config.get('STORAGE_BACKEND', 'local')
+    if backend == 's3':
+        storage = S3Storage(
+            bucket=app.config['S3_BUCKET'],
+            endpoint_url=app.config.get('S3_ENDPOINT_URL'),
+            prefix=app.config.get('S3_PREFIX', ''),
+            public_url=app.config.get('S3_PUBLIC_URL'),
+            cache_dir=os.path.join(app.instance_path, 's3_cache'),
+            legacy_root=app.root_path
+        )
+    elif backend == 'local':
+        folder = os.path.abspath(app.config['UPLOAD_FOLDER'])
+        static_prefix = os.path.relpath(folder, app.static_folder).replace(os.sep, '/')
+        if static_prefix == '.' or static_prefix.startswith('..'):
+            # Not inside the static folder, so the static route cannot serve it
+            static_prefix = None
+            app.add_url_rule('/uploads/<path:filename>', 'uploads',
+                             lambda filename: send_from_directory(folder, filename, max_age=365 * 24 * 3600))
+        storage = LocalStorage(folder, static_prefix)
+    else:
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+    app.extensions['storage'] = storage
+    return storage
+
+
+def acquire(key: str, size: int):
+    """Count one more reference to a stored object, in the caller's transaction."""
+    increment = update(StoredFile).where(StoredFile.key == key).values(refcount=StoredFile.refcount + 1)
+    if db.session.execute(increment).rowcount:
+        return
+    try:
+        # Savepoint, so losing the race below does not roll back the caller's transaction
+        with db.session.begin_nested():
+            db.session.execute(insert(StoredFile).values(key=key, size=size, refcount=1))
+    except IntegrityError:
+        # An identical upload inserted the row first
+        db.session.execute(increment)
+
+
+def release(key: Optional[str]):
+    """Drop one reference; objects at zero are removed later by collect_garbage()."""
+    if not key or is_legacy_path(key):
+        return
+    db.session.execute(
+        update(StoredFile)
+        .where(StoredFile.key == key)
+        .values(refcount=StoredFile.refcount - 1)
+    )
+
+
+def collect_garbage(storage, derived_keys=lambda key: (), grace: float = GC_GRACE_SECONDS) -> int:
+    """
+    Delete unreferenced objects (and their derived files) not touched for
+    `grace` seconds. Returns the number removed.
+    """
+    removed = 0
+    orphans = [key for (key,) in db.session.query(StoredFile.key).filter(StoredFile.refcount <= 0)]
+    for orphan in orphans:
+        modified_at = storage.modified_at(orphan)
+        if modified_at is not None and time.time() - modified_at < grace:
+            # Possibly stored again by an upload that has not counted its reference yet
+            continue
+        # Conditional delete so an upload that re-acquired the object meanwhile keeps it
+        deleted = db.session.query(StoredFile).filter(
+            StoredFile.key == orphan, StoredFile.refcount <= 0
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        if deleted:
+            for key in (orphan, *derived_keys(orphan)):
+                storage.delete(key)
+            removed += 1
+    return removed
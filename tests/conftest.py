@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+# The application modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app(tmp_path):
+    """The application on a fresh, migrated SQLite database, without background threads."""
+    from app import create_app
+    from migrations import migrate
+
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'PDF_CACHE_DIR': str(tmp_path / 'pdf_cache'),
+        'MAIL_OUTBOX_THREAD': False,
+        'SLA_SWEEP_THREAD': False,
+        'ARCHIVE_THREAD': False,
+        'RATE_LIMIT_ENABLED': False,
+        'EVENTS_BACKEND': 'memory',
+        'ASSET_FINGERPRINTING': False,
+        'MAIL_SUPPRESS_SEND': True,
+    })
+    with app.app_context():
+        migrate()
+        yield app
+
+
+@pytest.fixture
+def user(app):
+    from extensions import db
+    from models import User
+
+    user = User(username='citizen', password_hash='x', role='user', email='citizen@example.com')
+    db.session.add(user)
+    db.session.commit()
+    return user
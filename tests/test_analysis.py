@@ -0,0 +1,27 @@
+from analysis import KeywordAutomaton
+
+
+def test_matches_start_at_word_boundaries():
+    automaton = KeywordAutomaton({'flood': 'flood'})
+
+    assert automaton.find('street flooding near the school') == ['flood']
+    assert automaton.find('bloodflood on the road') == []
+
+
+def test_finds_every_phrase_in_order_of_occurrence():
+    automaton = KeywordAutomaton({'pothole': 'road', 'open drain': 'drain', 'drain': 'drain-short'})
+
+    assert automaton.find('open drain next to a pothole') == ['drain', 'drain-short', 'road']
+
+
+def test_overlapping_phrases_share_the_boundary_rule():
+    automaton = KeywordAutomaton({'he': 'he', 'she': 'she', 'hers': 'hers'})
+
+    assert automaton.find('ushers') == []
+    assert automaton.find('she hers') == ['she', 'he', 'hers']
+
+
+def test_phrases_are_normalised():
+    automaton = KeywordAutomaton({'Garbage Dump': 'garbage'})
+
+    assert automaton.find('garbage dump at the corner') == ['garbage']
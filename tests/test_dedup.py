@@ -0,0 +1,83 @@
+from dedup import DUPLICATE_THRESHOLD, DuplicateIndex, issue_signature, minhash, shingles, similarity
+
+POTHOLE = 'Huge pothole in the middle of the road near the bus stop, two-wheelers keep falling'
+ROAD = 'Potholes / Road Damage'
+
+
+def _signature(text):
+    return minhash(shingles(text))
+
+
+def test_identical_text_is_fully_similar():
+    assert similarity(_signature(POTHOLE), _signature(POTHOLE)) == 1.0
+
+
+def test_case_punctuation_and_filler_words_are_ignored():
+    assert shingles('The POTHOLE, near the school!') == shingles('pothole school')
+
+
+def test_rephrased_report_clears_the_threshold():
+    rephrased = 'Huge pothole in middle of road near bus stop; two wheelers keep falling'
+
+    assert similarity(_signature(POTHOLE), _signature(rephrased)) >= DUPLICATE_THRESHOLD
+
+
+def test_unrelated_report_stays_below_the_threshold():
+    unrelated = 'Garbage has not been collected for a week and stray dogs spread it around'
+
+    assert similarity(_signature(POTHOLE), _signature(unrelated)) < DUPLICATE_THRESHOLD
+
+
+def _issue(user, description, area='Adyar', issue_type=ROAD, status='Pending'):
+    from extensions import db
+    from models import Issue
+
+    issue = Issue(user_id=user.id, issue_type=issue_type, description=description, area=area,
+                  current_status=status)
+    issue.dedup_signature = issue_signature(issue)
+    db.session.add(issue)
+    db.session.commit()
+    return issue
+
+
+def _report(user, description, area='Adyar', issue_type=ROAD):
+    from models import Issue
+
+    return Issue(user_id=user.id, issue_type=issue_type, description=description, area=area)
+
+
+def test_find_duplicate_matches_within_the_partition(user):
+    original = _issue(user, POTHOLE)
+    index = DuplicateIndex()
+
+    match = index.find_duplicate(_report(user, POTHOLE + '!'))
+
+    assert match is not None and match[0] == original.id and match[1] >= DUPLICATE_THRESHOLD
+    assert index.find_duplicate(_report(user, POTHOLE, area='Guindy')) is None
+    assert index.find_duplicate(_report(user, POTHOLE, issue_type='Other')) is None
+
+
+def test_find_duplicate_respects_the_threshold(user):
+    _issue(user, POTHOLE)
+    index = DuplicateIndex()
+
+    assert index.find_duplicate(_report(user, POTHOLE), threshold=1.01) is None
+
+
+def test_resolved_issues_are_not_matched(user):
+    _issue(user, POTHOLE, status='Resolved')
+
+    assert DuplicateIndex().find_duplicate(_report(user, POTHOLE)) is None
+
+
+def test_issue_resolved_after_indexing_is_dropped(user):
+    from extensions import db
+
+    original = _issue(user, POTHOLE)
+    index = DuplicateIndex()
+    index.sync()
+    original.current_status = 'Resolved'
+    db.session.commit()
+
+    assert index.find_duplicate(_report(user, POTHOLE)) is None
+    assert len(index) == 0
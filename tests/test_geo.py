@@ -0,0 +1,35 @@
+import pytest
+
+from geo import decode_geohash, encode_geohash, neighbors
+
+
+def test_encode_known_cell():
+    assert encode_geohash(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+
+
+@pytest.mark.parametrize('lat, lon', [(13.0827, 80.2707), (-33.8688, 151.2093), (0.0, 0.0), (89.9, -179.9)])
+def test_decode_round_trips_within_the_cell(lat, lon):
+    cell = encode_geohash(lat, lon, 9)
+    centre_lat, centre_lon, lat_err, lon_err = decode_geohash(cell)
+
+    assert abs(centre_lat - lat) <= lat_err
+    assert abs(centre_lon - lon) <= lon_err
+    assert encode_geohash(centre_lat, centre_lon, 9) == cell
+
+
+def test_precision_is_a_prefix():
+    assert encode_geohash(13.0827, 80.2707, 9).startswith(encode_geohash(13.0827, 80.2707, 5))
+
+
+def test_neighbors_surround_the_cell():
+    cell = encode_geohash(13.0827, 80.2707, 6)
+    lat, lon, lat_err, lon_err = decode_geohash(cell)
+    cells = neighbors(cell)
+
+    assert len(cells) == len(set(cells)) == 9
+    assert cells[4] == cell
+    for other in cells:
+        other_lat, other_lon, _, _ = decode_geohash(other)
+        assert len(other) == len(cell)
+        assert abs(other_lat - lat) == pytest.approx(2 * lat_err, abs=1e-9) or other_lat == pytest.approx(lat)
+        assert abs(other_lon - lon) == pytest.approx(2 * lon_err, abs=1e-9) or other_lon == pytest.approx(lon)
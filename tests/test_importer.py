@@ -0,0 +1,72 @@
+import io
+from datetime import datetime
+
+import pytest
+
+from importer import ImportRowError, _issue_fields, iter_records
+
+NOW = datetime(2024, 1, 1, 12, 0)
+
+
+def test_valid_row():
+    fields = _issue_fields({
+        'description': ' Deep pothole ', 'area': 'adyar', 'status': 'in progress',
+        'category': 'street light not working', 'created_at': '2023-06-01T10:00:00+05:30', 'legacy_id': 'A-1',
+    }, NOW)
+
+    assert fields.description == 'Deep pothole'
+    assert fields.area == 'Adyar'
+    assert fields.current_status == 'In Progress'
+    assert fields.issue_type == 'Street Light Not Working'
+    # Converted to naive UTC
+    assert fields.created_at == datetime(2023, 6, 1, 4, 30)
+    assert fields.reference == 'A-1'
+
+
+def test_defaults():
+    fields = _issue_fields({'complaint': 'Broken light', 'area': 'Adyar', 'category': 'Streetlight repair'}, NOW)
+
+    assert fields.current_status == 'Pending'
+    assert fields.created_at == NOW
+    # Unknown legacy categories are filed under 'Other'
+    assert fields.issue_type == 'Other'
+
+
+@pytest.mark.parametrize('date, expected', [
+    ('2023-06-01 10:15', datetime(2023, 6, 1, 10, 15)),
+    ('01/06/2023', datetime(2023, 6, 1)),
+    ('01-06-2023', datetime(2023, 6, 1)),
+])
+def test_legacy_date_formats(date, expected):
+    assert _issue_fields({'description': 'x', 'area': 'Adyar', 'date': date}, NOW).created_at == expected
+
+
+@pytest.mark.parametrize('record, reason', [
+    ({'area': 'Adyar'}, 'description is required'),
+    ({'description': '   ', 'area': 'Adyar'}, 'description is required'),
+    ({'description': 'x', 'area': 'Atlantis'}, "unknown area 'Atlantis'"),
+    ({'description': 'x', 'area': 'Adyar', 'status': 'Lost'}, "unknown status 'Lost'"),
+    ({'description': 'x', 'area': 'Adyar', 'created_at': 'yesterday'}, "unrecognised date 'yesterday'"),
+])
+def test_invalid_rows(record, reason):
+    with pytest.raises(ImportRowError, match=reason):
+        _issue_fields(record, NOW)
+
+
+def test_jsonl_records_report_unparseable_lines():
+    stream = io.StringIO('{"description": "a"}\n\nnot json\n[1, 2]\n')
+    records = list(iter_records(stream, 'jsonl'))
+
+    assert records[0] == (1, {'description': 'a'})
+    assert [(line, str(error)) for line, error in records[1:]] == [(3, 'not valid JSON'), (4, 'not a JSON object')]
+
+
+def test_csv_records_carry_line_numbers():
+    stream = io.StringIO('description,area\nPothole,Adyar\nDrain,Guindy\n')
+
+    assert [line for line, _ in iter_records(stream, 'csv')] == [2, 3]
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        list(iter_records(io.StringIO(''), 'xml'))
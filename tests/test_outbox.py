@@ -0,0 +1,76 @@
+from datetime import datetime
+
+import pytest
+
+import outbox
+from extensions import db
+from models import OutboundEmail
+from outbox import BACKOFF_BASE_SECONDS, BACKOFF_MAX_SECONDS, MAX_ATTEMPTS, backoff_seconds, dispatch_batch, queue_email
+
+
+def test_backoff_doubles_up_to_the_cap():
+    assert [backoff_seconds(attempts) for attempts in (0, 1, 2, 3)] == [
+        BACKOFF_BASE_SECONDS, BACKOFF_BASE_SECONDS, 2 * BACKOFF_BASE_SECONDS, 4 * BACKOFF_BASE_SECONDS
+    ]
+    assert backoff_seconds(50) == BACKOFF_MAX_SECONDS
+
+
+def _queued():
+    email = queue_email(['admin@example.com', ''], 'Subject', 'Body')
+    db.session.commit()
+    return email
+
+
+class _FailingConnection:
+    def __enter__(self):
+        raise ConnectionRefusedError('SMTP server down')
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def test_sends_due_email(app):
+    email = _queued()
+
+    assert email.recipients == 'admin@example.com'
+    assert dispatch_batch() == 1
+    assert email.status == 'sent' and email.sent_at is not None and email.claim_token is None
+
+
+def test_failure_is_retried_with_backoff(app, monkeypatch):
+    monkeypatch.setattr(outbox.mail, 'connect', _FailingConnection)
+    email = _queued()
+
+    assert dispatch_batch() == 1
+    assert email.status == 'pending'
+    assert email.attempts == 1
+    assert email.last_error == 'ConnectionRefusedError: SMTP server down'
+    assert email.next_attempt_at > datetime.utcnow()
+    # Not due again until the backoff has passed
+    assert dispatch_batch() == 0
+
+
+def test_dead_letter_after_max_attempts(app, monkeypatch):
+    monkeypatch.setattr(outbox.mail, 'connect', _FailingConnection)
+    email = _queued()
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        email.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+        assert dispatch_batch() == 1
+        assert email.attempts == attempt
+    assert email.status == 'dead'
+
+    email.next_attempt_at = datetime.utcnow()
+    db.session.commit()
+    assert dispatch_batch() == 0
+    assert OutboundEmail.query.filter_by(status='dead').count() == 1
+
+
+@pytest.mark.parametrize('status', ['sent', 'dead'])
+def test_finished_email_is_not_claimed(app, status):
+    email = _queued()
+    email.status = status
+    db.session.commit()
+
+    assert dispatch_batch() == 0
@@ -0,0 +1,24 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from pagination import clamp_page_size, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trips():
+    issue = SimpleNamespace(created_at=datetime(2024, 5, 1, 9, 30, 15, 123456), id=42)
+    cursor = encode_cursor(issue)
+
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == (issue.created_at, 42)
+
+
+@pytest.mark.parametrize('cursor', [None, '', 'not-a-cursor', '!!!', 'WzFd', 'eyJhIjoxfQ'])
+def test_malformed_cursors_are_absent(cursor):
+    assert decode_cursor(cursor) is None
+
+
+@pytest.mark.parametrize('limit, expected', [('10', 10), (0, 1), (-5, 1), (1000, 100), ('ten', 25), (None, 25)])
+def test_page_size_is_clamped(limit, expected):
+    assert clamp_page_size(limit) == expected
@@ -5,29 +5,9 @@ from io import BytesIO
 from typing import Optional
 import os
 
+from flask import current_app
 
-def ai_analyze_issue(issue_type: str, description: str) -> str:
-    """
-    Simple rule-based AI-style analysis summary.
-    In a real system, this could call an external ML/NLP service.
-    """
-    severity = "Moderate"
-    priority = "Medium"
-
-    desc_lower = description.lower()
-    if "urgent" in desc_lower or "immediately" in desc_lower:
-        severity = "High"
-        priority = "High"
-    if "school" in desc_lower or "hospital" in desc_lower:
-        priority = "High"
-
-    return (
-        f"Automated analysis for issue type '{issue_type}':\n"
-        f"- Estimated severity: {severity}\n"
-        f"- Suggested resolution priority: {priority}\n"
-        f"- Notes: Location and citizen description indicate that field\n"
-        f"  inspection by the respective civic department is recommended."
-    )
+from images import best_image_path
 
 
 def _draw_wrapped_text(c, text: str, x: float, y: float, max_width: float, line_height: float):
@@ -48,6 +28,14 @@ def _draw_wrapped_text(c, text: str, x: float, y: float, max_width: float, line_
     return y
 
 
+def report_image_path(image: Optional[str]) -> Optional[str]:
+    """
+    Local file to embed for a stored upload: the downscaled JPEG print variant
+    when available instead of the full-size original.
+    """
+    return best_image_path(current_app.extensions['storage'], image, 'print')
+
+
 def _maybe_draw_image(c, image_path: Optional[str], x: float, y: float, width: float, height: float):
     if image_path and os.path.exists(image_path):
         try:
@@ -57,10 +45,22 @@ def _maybe_draw_image(c, image_path: Optional[str], x: float, y: float, width: f
             pass
 
 
-def generate_issue_pdf(issue) -> bytes:
-    """Generate a government-style PDF report for a given issue."""
+def generate_issue_pdf(issue, resolve_images: bool = True) -> bytes:
+    """
+    Generate a government-style PDF report for a given issue. With
+    resolve_images=False the issue's image fields are already local file
+    paths (detached snapshots rendered outside the app context).
+    """
     buffer = BytesIO()
     c = canvas.Canvas(buffer, pagesize=A4)
+    draw_issue_report(c, issue, resolve_images)
+    c.save()
+    buffer.seek(0)
+    return buffer
+
+
+def draw_issue_report(c, issue, resolve_images: bool = True):
+    """Draw the report pages for one issue onto an open canvas."""
     width, height = A4
 
     margin = 20 * mm
@@ -171,8 +171,11 @@ def generate_issue_pdf(issue) -> bytes:
     img_height = 80 * mm
     img_width = (width / 2) - (1.5 * margin)
 
-    _maybe_draw_image(c, issue.before_image, margin, y - img_height, img_width, img_height)
-    _maybe_draw_image(c, issue.after_image, width / 2, y - img_height, img_width, img_height)
+    before_image, after_image = issue.before_image, issue.after_image
+    if resolve_images:
+        before_image, after_image = report_image_path(before_image), report_image_path(after_image)
+    _maybe_draw_image(c, before_image, margin, y - img_height, img_width, img_height)
+    _maybe_draw_image(c, after_image, width / 2, y - img_height, img_width, img_height)
 
     # Footer
     c.setFont("Helvetica", 8)
@@ -183,9 +186,6 @@ def generate_issue_pdf(issue) -> bytes:
     )
 
     c.showPage()
-    c.save()
-    buffer.seek(0)
-    return buffer
 
 
 
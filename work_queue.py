@@ -0,0 +1,187 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import and_
+
+from analysis import KeywordAutomaton, normalize_text
+from constants import ISSUE_SLA_HOURS
+from extensions import db
+from models import Issue, User
+from outbox import notify_dispatcher, queue_email
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLA_HOURS = 120
+
+# Hours an issue moves up the queue, i.e. how much earlier its virtual deadline is
+SEVERITY_CREDIT_HOURS = {'Low': 0, 'Moderate': 12, 'High': 48}
+PRIORITY_CREDIT_HOURS = {'Low': 0, 'Medium': 12, 'High': 36}
+PROXIMITY_CREDIT_HOURS = 24
+
+SENSITIVE_PLACES = ('school', 'hospital', 'college', 'clinic', 'anganwadi', 'maternity')
+
+OPEN_STATUSES = ('Pending', 'In Progress')
+
+BATCH_SIZE = 500
+
+_proximity = KeywordAutomaton({place: place for place in SENSITIVE_PLACES})
+
+
+def sla_hours(issue_type: str) -> int:
+    return ISSUE_SLA_HOURS.get(issue_type, DEFAULT_SLA_HOURS)
+
+
+def near_sensitive_place(*texts: Optional[str]) -> bool:
+    return bool(_proximity.find(normalize_text(' '.join(t for t in texts if t))))
+
+
+def queue_columns(issue) -> dict:
+    """
+    SLA deadline and queue rank for an issue.
+
+    queue_rank is a virtual deadline: the SLA deadline pulled earlier by
+    credits for severity, priority and proximity to schools/hospitals.
+    Every open issue ages at the same rate, so ordering by it gives the
+    same answer at any moment and it only changes when the issue does,
+    which lets the queue be served from an index. Closed issues and
+    linked duplicates leave the queue (rank NULL).
+    """
+    created_at = issue.created_at or datetime.utcnow()
+    due = created_at + timedelta(hours=sla_hours(issue.issue_type))
+    if issue.duplicate_of_id or (issue.current_status or 'Pending') not in OPEN_STATUSES:
+        return {'sla_due_at': None if issue.duplicate_of_id else due, 'queue_rank': None}
+
+    credit = (
+        SEVERITY_CREDIT_HOURS.get(issue.severity, 0)
+        + PRIORITY_CREDIT_HOURS.get(issue.priority, 0)
+        + (PROXIMITY_CREDIT_HOURS if near_sensitive_place(issue.description, issue.street, issue.landmark) else 0)
+    )
+    return {'sla_due_at': due, 'queue_rank': due - timedelta(hours=credit)}
+
+
+def refresh_queue_fields(issue):
+    """Recompute an issue's queue position in the current session, e.g. after a status change."""
+    for name, value in queue_columns(issue).items():
+        setattr(issue, name, value)
+
+
+def next_issues(area: Optional[str] = None, limit: int = 10) -> List[Issue]:
+    """
+    The next open issues to work on, most urgent first, optionally for one
+    area. A range scan of ix_issue_queue_area / ix_issue_queue_rank.
+    """
+    query = Issue.query.filter(Issue.queue_rank.isnot(None))
+    if area:
+        query = query.filter(Issue.area == area)
+    return query.order_by(Issue.queue_rank, Issue.id).limit(limit).all()
+
+
+def rebuild_queue(batch_size: int = BATCH_SIZE) -> int:
+    """Recompute SLA deadlines and queue ranks for every issue in id-ordered batches."""
+    rebuilt = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.session.query(
+                Issue.id, Issue.issue_type, Issue.created_at, Issue.current_status,
+                Issue.duplicate_of_id, Issue.severity, Issue.priority,
+                Issue.description, Issue.street, Issue.landmark
+            )
+            .filter(Issue.id > last_id)
+            .order_by(Issue.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return rebuilt
+        db.session.bulk_update_mappings(Issue, [{'id': row.id, **queue_columns(row)} for row in rows])
+        db.session.commit()
+        rebuilt += len(rows)
+        last_id = rows[-1].id
+
+
+def sweep_sla_breaches(now: Optional[datetime] = None, batch_size: int = BATCH_SIZE) -> List[int]:
+    """
+    Flag open issues whose SLA deadline has passed and email the admins one
+    summary. Each issue is flagged once (sla_breached_at); the scan only
+    touches the partial ix_issue_sla_open index. Returns the flagged ids.
+    """
+    now = now or datetime.utcnow()
+    overdue = and_(
+        Issue.queue_rank.isnot(None),
+        Issue.sla_breached_at.is_(None),
+        Issue.sla_due_at < now
+    )
+    ids = [
+        row.id for row in
+        db.session.query(Issue.id)
+        .filter(overdue)
+        .order_by(Issue.sla_due_at)
+        .limit(batch_size)
+    ]
+    if not ids:
+        return []
+
+    # Conditional claim, as in outbox._claim_batch: another sweeper (the reloader's other
+    # process, or `flask sla-sweep` next to the app) may have flagged some of them meanwhile
+    db.session.query(Issue).filter(Issue.id.in_(ids), overdue).update(
+        {'sla_breached_at': now}, synchronize_session=False
+    )
+    breached = (
+        Issue.query
+        .filter(Issue.id.in_(ids), Issue.sla_breached_at == now)
+        .order_by(Issue.sla_due_at)
+        .all()
+    )
+    if not breached:
+        db.session.commit()
+        return []
+
+    admins = [email for (email,) in db.session.query(User.email).filter(User.role == 'admin', User.email.isnot(None))]
+    if admins:
+        lines = '\n'.join(
+            f"- #{issue.id} {issue.issue_type} in {issue.area} ({issue.current_status}), "
+            f"due {issue.sla_due_at:%d %b %Y %H:%M} UTC"
+            for issue in breached
+        )
+        queue_email(
+            admins,
+            subject=f"{len(breached)} issue(s) breached their SLA - Chennai CivicCare AI",
+            body=f"The following issues are past their resolution SLA:\n\n{lines}\n\nRegards,\nChennai CivicCare AI"
+        )
+    # The claim and the summary email commit together
+    db.session.commit()
+    notify_dispatcher()
+    return [issue.id for issue in breached]
+
+
+class SLASweeper(threading.Thread):
+    """Background thread that runs sweep_sla_breaches every `interval` seconds."""
+
+    def __init__(self, app, interval: float = 300.0):
+        super().__init__(name='sla-sweeper', daemon=True)
+        self.app = app
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                with self.app.app_context():
+                    while len(sweep_sla_breaches()) == BATCH_SIZE:
+                        pass
+            except Exception:  # noqa: BLE001 - keep the sweeper alive
+                logger.exception("SLA sweep failed")
+            self._stop_event.wait(self.interval)
+
+
+def start_sla_sweeper(app) -> SLASweeper:
+    sweeper = SLASweeper(app, interval=app.config.get('SLA_SWEEP_INTERVAL', 300.0))
+    sweeper.start()
+    return sweeper